@@ -1,19 +1,169 @@
-from google import genai
+import json
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import numpy as np
 from config import config
 from logger import logger
+from decision_cache import DecisionCache
+from rate_limiter import AdaptiveRateLimiter
+
+# Gemini calls still running after their deadline keep a worker busy, so allow a few at once
+AI_WORKERS = 4
+# Batch approval requests per cycle: the batch plus one retry of the symbols it left out
+BATCH_ATTEMPTS = 2
+
+class AIDeadlineExceeded(Exception):
+    """
+    Raised when Gemini has not answered within the call's deadline. `pending` is True when the call
+    is still running (its on_late callback may fire), False when it was never sent.
+    """
+    def __init__(self, message, pending=False):
+        super().__init__(message)
+        self.pending = pending
+
+class LatencyStats:
+    """Latency of the last `window` Gemini calls per call type (breakout, batch, news) and missed deadlines."""
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._calls = {}
+        self._timeouts = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind, seconds):
+        with self._lock:
+            self._samples.setdefault(kind, deque(maxlen=self.window)).append(seconds)
+            self._calls[kind] = self._calls.get(kind, 0) + 1
+
+    def timeout(self, kind):
+        with self._lock:
+            self._timeouts[kind] = self._timeouts.get(kind, 0) + 1
+
+    def stats(self, reset=False):
+        """
+        {kind: {'calls', 'timeouts', 'p50_ms', 'p90_ms', 'p99_ms'}}. Percentiles cover the rolling
+        window; calls/timeouts count since the last reset.
+        """
+        with self._lock:
+            result = {}
+            for kind in set(self._samples) | set(self._timeouts):
+                samples = self._samples.get(kind)
+                p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000 if samples else (0.0, 0.0, 0.0)
+                result[kind] = {
+                    'calls': self._calls.get(kind, 0),
+                    'timeouts': self._timeouts.get(kind, 0),
+                    'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99,
+                }
+            if reset:
+                self._calls, self._timeouts = {}, {}
+        return result
+
+def _is_quota_error(e):
+    err_str = str(e)
+    return "429" in err_str or "quota" in err_str.lower()
 
 class AIAdvisor:
     def __init__(self):
+        self._client = None
+        self.latency = LatencyStats()
         if config.gemini_api_key:
-            self.client = genai.Client(api_key=config.gemini_api_key)
             self.model_name = 'gemini-2.5-flash-lite'
             self.active = True
+            self.decisions = DecisionCache()
+            self.limiter = AdaptiveRateLimiter(config.ai_min_interval_sec, config.ai_max_interval_sec)
+            self._executor = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix="ai")
             logger.info("AI Advisor (Gemini) initialized.")
         else:
             self.active = False
             logger.warning("AI Advisor disabled (No API key). Will auto-approve.")
 
+    @property
+    def client(self):
+        """Gemini client, created on the first AI request (google-genai is slow to import)."""
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=config.gemini_api_key)
+        return self._client
+
+    def _call(self, kind, prompt, request_config):
+        """One Gemini request, spaced by the adaptive limiter. Runs on an AI worker thread."""
+        self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            if request_config:
+                response = self.client.models.generate_content(model=self.model_name, contents=prompt, config=request_config)
+            else:
+                response = self.client.models.generate_content(model=self.model_name, contents=prompt)
+        except Exception as e:
+            if _is_quota_error(e):
+                self.limiter.penalize()
+            raise
+        finally:
+            self.latency.record(kind, time.monotonic() - started)
+        self.limiter.success()
+        return response
+
+    def request(self, kind, prompt, deadline, request_config=None, on_late=None, on_late_error=None):
+        """
+        Sends a Gemini request from the AI worker threads and waits at most `deadline` seconds for
+        the response (limiter wait included). Raises AIDeadlineExceeded when it is late: a request
+        already sent keeps running and `on_late(response)` is called if it succeeds after all
+        (`on_late_error(exc)` if it fails), one still queued behind other calls is cancelled. Nothing is sent when the limiter's backoff
+        alone outlasts the deadline. Errors from Gemini itself are raised as before.
+        """
+        # Under a 429 backoff the call could only answer late while still spending quota
+        if self.limiter.wait_time() >= deadline:
+            self.latency.timeout(kind)
+            raise AIDeadlineExceeded(f"Gemini {kind} call not sent: request spacing backoff exceeds its {deadline:g}s deadline")
+        future = self._executor.submit(self._call, kind, prompt, request_config)
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeout:
+            self.latency.timeout(kind)
+            if future.cancel():
+                raise AIDeadlineExceeded(f"Gemini {kind} call exceeded its {deadline:g}s deadline before it was sent")
+            if on_late is not None:
+                future.add_done_callback(lambda f: _deliver_late(kind, f, on_late, on_late_error))
+            raise AIDeadlineExceeded(f"Gemini {kind} call exceeded its {deadline:g}s deadline", pending=True)
+
+    def _cache_decision(self, cache_key, text):
+        # Simple parsing (only real decisions are cached, never errors or quota vetoes)
+        approved = "DECISION: BUY" in text.strip().upper()
+        self.decisions.put(cache_key, approved, text)
+        return approved, text
+
+    def _deadline_decision(self, symbol):
+        """What a breakout approval counts as when Gemini misses the deadline (AI_DEADLINE_POLICY)."""
+        policy = config.ai_deadline_policy
+        if policy == 'approve':
+            logger.warning(f"[{symbol}] Gemini missed the {config.ai_deadline_sec:g}s deadline. Auto-approved (policy: approve).")
+            return True, "AI deadline exceeded. Auto-approved."
+        if policy == 'cache':
+            cached = self.decisions.latest(symbol)
+            if cached is not None:
+                logger.warning(f"[{symbol}] Gemini missed the {config.ai_deadline_sec:g}s deadline. "
+                               f"Using the last cached decision ({'BUY' if cached[0] else 'WAIT'}).")
+                return cached
+        logger.warning(f"[{symbol}] Gemini missed the {config.ai_deadline_sec:g}s deadline. Auto-veto.")
+        return False, "AI deadline exceeded. Auto-veto."
+
+    def _history_text(self, symbol):
+        """The bot's recent trades on `symbol` (plus its 7-day ledger stats) for the prompt."""
+        from database import get_recent_performance
+        recent_trades = get_recent_performance(symbol)
+        if not recent_trades:
+            return "No recent trade history."
+        history_text = "\n".join([f"- Trade: {t['time_str']} | Profit: {t['profit_pct']}%" for t in recent_trades])
+        import trade_ledger
+        week = trade_ledger.stats('7d', symbol)
+        if week['trades']:
+            streak = f"{week['streak']} wins" if week['streak'] > 0 else f"{-week['streak']} losses"
+            history_text += (f"\n- Last 7 days: {week['trades']} trades | Win rate: {week['win_rate']:.0%} | "
+                             f"Net PNL: {week['net_pnl']:,.0f} KRW | Current streak: {streak}")
+        return history_text
+
     def analyze_breakout(self, symbol, current_price, target_price, k_value, volume_rank, rsi):
         """
         Asks Gemini whether the breakout is valid given the context.
@@ -22,11 +172,14 @@ class AIAdvisor:
             # If no API key, we blindly trust the mathematical breakout
             return True, "No AI configured. Auto-approved."
 
-        from database import get_recent_performance
-        recent_trades = get_recent_performance(symbol)
-        history_text = "No recent trade history."
-        if recent_trades:
-            history_text = "\n".join([f"- Trade: {t['time_str']} | Profit: {t['profit_pct']}%" for t in recent_trades])
+        # 같은 15분봉 안에서 비슷한 상황(목표가 대비 거리/RSI 구간)이면 이전 판단 재사용 → API 호출 없음
+        cache_key = self.decisions.key(symbol, current_price, target_price, rsi)
+        cached = self.decisions.get(cache_key)
+        if cached is not None:
+            logger.info(f"[{symbol}] Reusing cached AI decision ({'BUY' if cached[0] else 'WAIT'}) for this 15m candle.")
+            return cached
+
+        history_text = self._history_text(symbol)
 
         prompt = f"""
 You are an expert cryptocurrency trading assistant.
@@ -53,26 +206,196 @@ Instructions:
         """
         
         try:
-            logger.info(f"Asking Gemini AI for approval on {symbol}... (Adding 2s delay to prevent API Rate Limit)")
-            time.sleep(2)  # Artificial delay to cool down API requests
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            text = response.text.strip().upper()
-            
-            # Simple parsing
-            if "DECISION: BUY" in text:
-                return True, response.text
-            else:
-                return False, response.text
-                
+            logger.info(f"Asking Gemini AI for approval on {symbol}...")
+            # 마감 시간을 넘긴 응답도 도착하면 캐시에 저장 → 다음 사이클에서 재사용
+            response = self.request('breakout', prompt, config.ai_deadline_sec,
+                                    on_late=lambda late: self._cache_decision(cache_key, late.text))
+            return self._cache_decision(cache_key, response.text)
+
+        except AIDeadlineExceeded:
+            return self._deadline_decision(symbol)
         except Exception as e:
             err_str = str(e)
-            if "429" in err_str or "quota" in err_str.lower():
+            if _is_quota_error(e):
                 logger.error("Gemini API Quota Exceeded (429). Waiting for reset (Free Tier limitation).")
                 return False, "Rate Limit Exceeded. Auto-veto to protect quota."
             else:
                 short_err = err_str.splitlines()[0] if err_str else "Unknown Error"
                 logger.error(f"Gemini API Error: {short_err}")
                 return False, f"API Error: {short_err}"
+
+    def analyze_breakouts(self, candidates, k_value):
+        """
+        Batch approval for every breakout candidate of a cycle in one request.
+        `candidates` is [(rank index, symbol, current_price, target_price, rsi)]; returns
+        {symbol: (approved, context)}. Cached decisions are served without asking. Symbols the
+        response leaves out or describes with invalid JSON are asked again together in one more
+        batch, so a cycle waits at most BATCH_ATTEMPTS deadlines however many candidates it has;
+        symbols still undecided then are vetoed.
+        """
+        if not self.active:
+            return {symbol: (True, "No AI configured. Auto-approved.") for _, symbol, _, _, _ in candidates}
+
+        results = {}
+        pending = []
+        for idx, symbol, current_price, target_price, rsi in candidates:
+            cache_key = self.decisions.key(symbol, current_price, target_price, rsi)
+            cached = self.decisions.get(cache_key)
+            if cached is not None:
+                logger.info(f"[{symbol}] Reusing cached AI decision ({'BUY' if cached[0] else 'WAIT'}) for this 15m candle.")
+                results[symbol] = cached
+            else:
+                pending.append((idx, symbol, current_price, target_price, rsi, cache_key))
+        if not pending:
+            return results
+        if len(pending) == 1:
+            idx, symbol, current_price, target_price, rsi, _ = pending[0]
+            results[symbol] = self.analyze_breakout(symbol, current_price, target_price, k_value, idx + 1, rsi)
+            return results
+
+        decisions = {}
+        asking = pending
+        for attempt in range(BATCH_ATTEMPTS):
+            try:
+                decisions.update(self._ask_batch(asking, k_value))
+            except AIDeadlineExceeded:
+                # Asking again would only stall the cycle longer
+                results.update({symbol: self._deadline_decision(symbol) for _, symbol, *_ in asking})
+                asking = []
+                break
+            except Exception as e:
+                if _is_quota_error(e):
+                    logger.error("Gemini API Quota Exceeded (429). Waiting for reset (Free Tier limitation).")
+                    results.update({symbol: (False, "Rate Limit Exceeded. Auto-veto to protect quota.") for _, symbol, *_ in asking})
+                    asking = []
+                    break
+                err_str = str(e)
+                short_err = err_str.splitlines()[0] if err_str else "Unknown Error"
+                logger.error(f"Gemini API Error on batch approval: {short_err}")
+            asking = [candidate for candidate in asking if candidate[1] not in decisions]
+            if not asking:
+                break
+            if attempt + 1 < BATCH_ATTEMPTS:
+                logger.warning(f"No valid decision for {[c[1] for c in asking]} in the batch response. Asking for them again in one request.")
+        for _, symbol, *_ in asking:
+            logger.warning(f"[{symbol}] No valid AI decision after {BATCH_ATTEMPTS} batch requests. Auto-veto.")
+            results[symbol] = (False, "No valid AI decision. Auto-veto.")
+        results.update(decisions)
+        return results
+
+    def _ask_batch(self, pending, k_value):
+        """
+        One batch request for `pending` [(idx, symbol, current_price, target_price, rsi, cache_key)].
+        Returns {symbol: (approved, context)} for the valid entries (all cached); a late response is
+        still cached when it arrives. Request errors and AIDeadlineExceeded are raised.
+        """
+        blocks = []
+        for idx, symbol, current_price, target_price, rsi, _ in pending:
+            blocks.append(f"""[{symbol}]
+- Rank by 24h Volume on {config.active_exchange}: Top {idx + 1}
+- Current Price: {current_price:,} KRW
+- 15m VBD Target Breakout Price: {target_price:,} KRW (K={k_value})
+- Current 60m RSI: {rsi:.2f}
+- Recent trade history for this bot:
+{self._history_text(symbol)}""")
+        candidates_text = "\n\n".join(blocks)
+
+        prompt = f"""
+You are an expert cryptocurrency trading assistant.
+We are using the Volatility Breakout (VBD) strategy on a 15-minute timeframe on {config.active_exchange}. 
+The prices of the coins below have just crossed their 15-minute breakout targets.
+
+{candidates_text}
+
+Judge every coin on its own. Given its volume rank, momentum AND the bot's past successes/failures with that specific coin, do you authorize a BUY?
+
+Instructions:
+1. Briefly analyze the provided metrics of each coin.
+2. If a coin's Trade History shows repeated consecutive losses (e.g., multiple negative PNLs today), YOU MUST VETO THAT TRADE to prevent bleeding money on a deceptive trending coin.
+3. [PUMP & DUMP AWARENESS]: If a coin has skyrocketed in a very short time (e.g., RSI is extremely high), it may be a Pump & Dump. If you suspect it's a trap, YOU MUST VETO THAT TRADE.
+4. Answer with JSON only: {{"decisions": [{{"symbol": "<ticker as given>", "decision": "BUY" or "WAIT", "reason": "<one sentence>"}}]}}, one entry per coin.
+        """
+
+        symbols = [symbol for _, symbol, _, _, _, _ in pending]
+
+        def cache_batch(response):
+            decisions = parse_batch_decisions(response.text, symbols)
+            for _, symbol, _, _, _, cache_key in pending:
+                if symbol in decisions:
+                    self.decisions.put(cache_key, *decisions[symbol])
+            return decisions
+
+        logger.info(f"Asking Gemini AI for approval on {len(symbols)} candidates in one request: {symbols}")
+        response = self.request('batch', prompt, config.ai_deadline_sec,
+                                request_config={'response_mime_type': 'application/json', 'response_schema': BATCH_DECISION_SCHEMA},
+                                on_late=cache_batch)
+        return cache_batch(response)
+
+def _deliver_late(kind, future, on_late, on_error=None):
+    """
+    Done-callback for a request that missed its deadline: hands a successful late response to
+    `on_late`, or the exception to `on_error` when the call or `on_late` failed.
+    """
+    try:
+        on_late(future.result())
+        logger.info(f"Late Gemini {kind} response arrived and was stored.")
+    except Exception as e:
+        logger.error(f"Late Gemini {kind} call failed: {e}")
+        if on_error is not None:
+            try:
+                on_error(e)
+            except Exception as handler_error:
+                logger.error(f"Failed to handle late Gemini {kind} error: {handler_error}")
+
+# Gemini structured output schema for analyze_breakouts (checked again by parse_batch_decisions)
+BATCH_DECISION_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'decisions': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'symbol': {'type': 'STRING'},
+                    'decision': {'type': 'STRING', 'enum': ['BUY', 'WAIT']},
+                    'reason': {'type': 'STRING'},
+                },
+                'required': ['symbol', 'decision', 'reason'],
+            },
+        },
+    },
+    'required': ['decisions'],
+}
+
+def parse_batch_decisions(text, symbols):
+    """
+    Validates a batch response against BATCH_DECISION_SCHEMA. Returns {symbol: (approved, context)}
+    for the entries that are well formed and name one of `symbols` exactly once; everything else is
+    left out so the caller can fall back for those symbols.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        logger.warning("Gemini batch response is not valid JSON.")
+        return {}
+    entries = data.get('decisions') if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        logger.warning("Gemini batch response has no 'decisions' list.")
+        return {}
+
+    wanted = set(symbols)
+    decisions = {}
+    duplicates = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        symbol, decision, reason = entry.get('symbol'), entry.get('decision'), entry.get('reason')
+        if symbol not in wanted or decision not in ('BUY', 'WAIT') or not isinstance(reason, str):
+            continue
+        if symbol in decisions:
+            duplicates.add(symbol)
+        decisions[symbol] = (decision == 'BUY', f"{reason}\nDECISION: {decision}")
+    # Conflicting answers for one symbol are as good as none
+    for symbol in duplicates:
+        del decisions[symbol]
+    return decisions
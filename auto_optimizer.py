@@ -1,14 +1,40 @@
 import os
-import csv
-import glob
+import time
+import random
+import itertools
+import threading
 from datetime import datetime, timezone, timedelta
 from logger import logger
 from config import config
+import trade_ledger
 
 KST = timezone(timedelta(hours=9))
-TRADE_DIR = "trades"
 ENV_FILE = ".env"
 
+# Scheduled optimizer runs (KST); a sweep always finishes before the next one
+OPTIMIZER_SLOTS = ("09:00", "21:00")
+
+# Parameter grid for the sweep (rsi_max 101 = RSI filter off)
+SWEEP_GRID = {
+    'k': (0.3, 0.4, 0.5, 0.6, 0.7, 0.8),
+    'trailing_stop_pct': (0.01, 0.015, 0.02, 0.025, 0.03, 0.035),
+    'hard_stop_pct': (0.02, 0.025, 0.03, 0.04),
+    'rsi_max': (65, 70, 75, 80, 101),
+}
+SWEEP_ENV_KEYS = {
+    'k': 'VBD_K',
+    'trailing_stop_pct': 'TRAILING_STOP_PCT',
+    'hard_stop_pct': 'HARD_STOP_PCT',
+    'rsi_max': 'RSI_MAX',
+}
+SWEEP_MIN_TRADES = 10      # fewer trades over all symbols = not enough evidence
+SWEEP_APPLY_MARGIN = 0.002 # robust score must beat the current setting by this much
+SWEEP_CHUNK = 8            # combinations per worker task
+INDICATOR_WARMUP_SEC = 2 * 86400  # history loaded before the first window so RSI is warm
+
+# Set by the optimizer thread once .env holds new parameters; the scan loop reloads config between cycles
+_params_pending = threading.Event()
+
 def update_env_variable(key, new_value):
     """Updates a specific key-value pair in the .env file."""
     try:
@@ -36,48 +62,44 @@ def update_env_variable(key, new_value):
         logger.error(f"Failed to update {ENV_FILE}: {e}")
         return False
 
+def apply_pending_params():
+    """Loads parameters the optimizer wrote to .env into config. Call between scan cycles, never during one."""
+    if not _params_pending.is_set():
+        return False
+    _params_pending.clear()
+    config.reload()
+    logger.info(f"✅ Optimizer parameters loaded: VBD_K={config.vbd_k}, TRAILING_STOP_PCT={config.trailing_stop_pct}, "
+                f"HARD_STOP_PCT={config.hard_stop_pct}, RSI_MAX={config.rsi_max}")
+    return True
+
 def analyze_recent_trades():
-    """Analyzes the trades from the last 3 days to determine if we should optimize."""
-    csv_files = glob.glob(os.path.join(TRADE_DIR, "*.csv"))
-    if not csv_files:
+    """Reads the last 3 days of trades from the trade ledger's rolling window to determine if we should optimize."""
+    stats = trade_ledger.stats('3d')
+    total_trades = stats['trades']
+    if not total_trades:
         logger.info("No trade history found. Skipping auto-optimization.")
         return None
 
-    # Sort files by name (which is date), get up to 3 most recent
-    csv_files.sort(reverse=True)
-    recent_files = csv_files[:3]
-    
-    total_trades = 0
-    winning_trades = 0
-    total_net_pnl = 0.0
-
-    for file_path in recent_files:
-        try:
-            with open(file_path, mode='r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    net_pnl_str = row.get('Net PNL KRW', '0')
-                    try:
-                        net_pnl = float(net_pnl_str)
-                        total_trades += 1
-                        total_net_pnl += net_pnl
-                        if net_pnl > 0:
-                            winning_trades += 1
-                    except ValueError:
-                        pass
-        except Exception as e:
-            logger.error(f"Error reading {file_path}: {e}")
-
     if total_trades < 3:
         logger.info(f"Not enough trades ({total_trades}) in the last 3 days to optimize. Needs at least 3.")
         return None
 
-    win_rate = winning_trades / total_trades
+    win_rate = stats['win_rate']
+    total_net_pnl = stats['net_pnl']
     logger.info(f"📊 Auto-Optimizer Stats | Trades: {total_trades} | Win Rate: {win_rate:.2%} | Net PNL: {total_net_pnl:.0f} KRW")
     
     return win_rate, total_net_pnl
 
-def run_optimizer():
+def run_optimizer(exchange_api=None):
+    """Runs the configured optimizer mode; sweep / walk-forward fall back to the hill-climb when the candle store is empty."""
+    if config.optimizer_mode == "sweep" and run_parameter_sweep(exchange_api) is not None:
+        return
+    if config.optimizer_mode == "walk_forward" and \
+            run_walk_forward(exchange_api, deadline=_scheduled_deadline(), apply=True) is not None:
+        return
+    run_hill_climb()
+
+def run_hill_climb():
     """Runs the optimization logic and updates parameters if necessary."""
     logger.info("🤖 Starting Auto-Optimizer Analysis...")
     stats = analyze_recent_trades()
@@ -126,11 +148,334 @@ def run_optimizer():
         changed = True
 
     if changed:
-        config.reload() # Tell config to reload from .env immediately
-        logger.info("✅ Auto-Optimization Complete. New parameters loaded into bot memory.")
+        _params_pending.set() # 스캔 사이클 사이에 메인 루프가 config 에 반영
+        logger.info("✅ Auto-Optimization Complete. New parameters take effect from the next scan cycle.")
     else:
         logger.info("🔒 Parameters hit safety limits. No changes applied.")
 
+# ===================================================================
+# Parameter sweep: backtest a grid of (K, trailing stop, hard stop, RSI cutoff) on the candle store
+# ===================================================================
+_worker_data = {}
+
+def _load_series(exchange_name, symbols, start):
+    """Indicator cache: PrecomputedSeries of every symbol with enough stored 15m candles, BTC 4h trend mask included."""
+    from candle_store import CandleStore
+    from backtest_engine import PrecomputedSeries, btc_trend_mask
+    store = CandleStore()
+    btc = store.load(exchange_name, 'BTC/KRW', '15m', start=start)
+    series = {}
+    for symbol in symbols:
+        candles = store.load(exchange_name, symbol, '15m', start=start)
+        if candles is None or len(candles['close']) < 100:
+            continue
+        mask = None
+        if btc is not None and len(btc['timestamp']):
+            mask = btc_trend_mask(candles['timestamp'], btc['timestamp'], btc['open'], btc['close'])
+        series[symbol] = PrecomputedSeries(candles['timestamp'], candles['open'], candles['high'], candles['low'],
+                                           candles['close'], entry_mask=mask, symbol=symbol)
+    return series
+
+def _init_sweep_worker(exchange_name, symbols, start, fear_greed):
+    """Pool initializer: builds the indicator cache once per worker process; every task only slices it."""
+    _worker_data.clear()
+    _worker_data['series'] = _load_series(exchange_name, symbols, start)
+    _worker_data['fear_greed'] = fear_greed
+
+def _windows(window):
+    series = _worker_data['series'].values()
+    return [s.window(*window) for s in series] if window else list(series)
+
+def _backtest_combo(combo, windows):
+    """One combination on every (windowed) series; the fear-market hard stop keeps its ratio to the normal one."""
+    params = dict(zip(SWEEP_GRID, combo))
+    fear_ratio = config.hard_stop_fear_pct / config.hard_stop_pct if config.hard_stop_pct else 1.0
+    params['hard_stop_fear_pct'] = params['hard_stop_pct'] * fear_ratio
+    return [s.backtest(fear_greed=_worker_data['fear_greed'], **params) for s in windows if len(s) >= 2]
+
+def _evaluate_combos(combos, window=None):
+    """Backtests each combination on every loaded symbol (inside `window` = (start, end) if given). Returns [(combo, score, trades)]."""
+    import numpy as np
+    windows = _windows(window)
+    results = []
+    for combo in combos:
+        backtests = _backtest_combo(combo, windows)
+        returns = [r.total_return for r in backtests]
+        trades = sum(r.n_trades for r in backtests)
+        if not returns or trades < SWEEP_MIN_TRADES:
+            results.append((combo, None, trades))
+            continue
+        # Robust across symbols: penalise settings that only work on one or two coins
+        score = float(np.mean(returns) - 0.5 * np.std(returns))
+        results.append((combo, score, trades))
+    return results
+
+def _evaluate_out_of_sample(combo, window):
+    """Metrics of one combination over `window`: mean return per symbol, trades, win rate, mean max drawdown."""
+    import numpy as np
+    backtests = _backtest_combo(combo, _windows(window))
+    trade_returns = np.concatenate([r.returns for r in backtests]) if backtests else np.array([])
+    return {
+        'return': float(np.mean([r.total_return for r in backtests])) if backtests else 0.0,
+        'trades': len(trade_returns),
+        'win_rate': float(np.mean(trade_returns > 0)) if len(trade_returns) else 0.0,
+        'max_drawdown': float(np.mean([r.max_drawdown for r in backtests])) if backtests else 0.0,
+    }
+
+def _next_slot_time(now=None):
+    """Epoch time of the next scheduled optimizer slot (KST)."""
+    now = now or datetime.now(KST)
+    slots = []
+    for day in (0, 1):
+        for slot in OPTIMIZER_SLOTS:
+            hour, minute = map(int, slot.split(':'))
+            at = (now + timedelta(days=day)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if at > now + timedelta(minutes=1):
+                slots.append(at)
+    return min(slots).timestamp()
+
+def _scheduled_deadline(budget_sec=None):
+    """Wall-clock budget of a scheduled run, cut one minute before the next optimizer slot."""
+    budget_sec = config.optimizer_budget_sec if budget_sec is None else budget_sec
+    return min(time.time() + budget_sec, _next_slot_time() - 60)
+
+def _robust_scores(scores):
+    """Grid mode: averages each setting's score with its evaluated one-step neighbours (prefers plateaus over spikes)."""
+    index = {name: {v: i for i, v in enumerate(values)} for name, values in SWEEP_GRID.items()}
+    names = list(SWEEP_GRID)
+    robust = {}
+    for combo, score in scores.items():
+        neighbourhood = [score]
+        for d, name in enumerate(names):
+            i = index[name].get(combo[d])
+            if i is None:
+                continue  # off-grid (the current .env setting)
+            for j in (i - 1, i + 1):
+                if 0 <= j < len(SWEEP_GRID[name]):
+                    neighbour = combo[:d] + (SWEEP_GRID[name][j],) + combo[d + 1:]
+                    if neighbour in scores:
+                        neighbourhood.append(scores[neighbour])
+        robust[combo] = sum(neighbourhood) / len(neighbourhood)
+    return robust
+
+def _rank(results, samples):
+    """[(combo, robust score)] best first, from [(combo, score, trades)] (settings without enough trades dropped)."""
+    scores = {combo: score for combo, score, _ in results if score is not None}
+    robust = _robust_scores(scores) if not samples else scores
+    return sorted(robust.items(), key=lambda x: x[1], reverse=True)
+
+def _current_combo():
+    return (config.vbd_k, config.trailing_stop_pct, config.hard_stop_pct, config.rsi_max)
+
+def _candidate_combos(samples):
+    """The grid (or a random sample of it) with the current setting first."""
+    current = _current_combo()
+    combos = list(itertools.product(*SWEEP_GRID.values()))
+    random.shuffle(combos)  # a budget cut still leaves an even spread over the grid
+    if samples and samples < len(combos):
+        combos = combos[:samples]
+    return [current] + [c for c in combos if c != current]
+
+def _sweep_symbols(exchange_api=None):
+    """Top stored symbols for the optimizer, incrementally synced first when an exchange API is given."""
+    from candle_store import CandleStore
+    exchange_name = config.active_exchange
+    store = CandleStore()
+    symbols = store.top_by_volume(exchange_name, '15m', limit=config.coin_count)
+    if symbols and exchange_api is not None:
+        # Incremental: only the bars since the last sync, at discovery priority so stops keep their budget
+        from rate_limiter import budget, PRIORITY_DISCOVERY
+        with budget.priority(PRIORITY_DISCOVERY):
+            store.sync_all(exchange_api, exchange_name, '15m', symbols=symbols + ['BTC/KRW'])
+    return store, exchange_name, symbols
+
+def _sweep_pool(exchange_name, symbols, start, fear_greed, workers):
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_sweep_worker, initargs=(exchange_name, symbols, start, fear_greed))
+
+def _run_tasks(executor, tasks, deadline=None):
+    """Runs {key: (fn, *args)} on the pool until every task is done or `deadline` passes. Returns ({key: result}, unfinished)."""
+    from concurrent.futures import wait, FIRST_COMPLETED
+    futures = {executor.submit(*task): key for key, task in tasks.items()}
+    pending = set(futures)
+    results = {}
+    while pending and (deadline is None or time.time() < deadline):
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[futures[future]] = future.result()
+    return results, len(pending)
+
+def _apply_combo(combo):
+    """Writes a sweep setting to .env (HARD_STOP_FEAR_PCT keeps its ratio to HARD_STOP_PCT); config picks it up between scan cycles."""
+    params = dict(zip(SWEEP_GRID, combo))
+    fear_ratio = config.hard_stop_fear_pct / config.hard_stop_pct if config.hard_stop_pct else 1.0
+    for name, value in params.items():
+        update_env_variable(SWEEP_ENV_KEYS[name], str(value))
+    update_env_variable('HARD_STOP_FEAR_PCT', str(round(params['hard_stop_pct'] * fear_ratio, 4)))
+    _params_pending.set()
+    return params
+
+def run_parameter_sweep(exchange_api=None, samples=None, workers=None, budget_sec=None, fear_greed=50):
+    """
+    Backtests SWEEP_GRID (or a random sample of `samples` combinations) on the last
+    OPTIMIZER_LOOKBACK_DAYS of 15m candles of the top stored symbols, spread over a process pool.
+    Stops at the wall-clock budget or before the next optimizer slot, whichever is sooner, and
+    writes the best robust setting to .env when it beats the current one.
+    Returns the applied/best parameters, or None when there is no candle history to test on.
+    """
+    started = time.time()
+    samples = config.optimizer_samples if samples is None else samples
+    workers = workers or config.optimizer_workers or os.cpu_count() or 1
+    deadline = _scheduled_deadline(budget_sec)
+
+    store, exchange_name, symbols = _sweep_symbols(exchange_api)
+    if not symbols:
+        logger.info("No stored candles for the parameter sweep (run: python candle_store.py). Using hill-climb.")
+        return None
+
+    current = _current_combo()
+    combos = _candidate_combos(samples)
+    chunks = [combos[i:i + SWEEP_CHUNK] for i in range(0, len(combos), SWEEP_CHUNK)]
+
+    logger.info(f"🤖 Parameter sweep: {len(combos)} settings × {len(symbols)} symbols, {workers} workers, "
+                f"{max(0, deadline - started):.0f}s budget")
+    window = (time.time() - config.optimizer_lookback_days * 86400, None)
+    executor = _sweep_pool(exchange_name, symbols, window[0] - INDICATOR_WARMUP_SEC, fear_greed, workers)
+    try:
+        done, unfinished = _run_tasks(executor, {i: (_evaluate_combos, chunk, window) for i, chunk in enumerate(chunks)}, deadline)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if unfinished:
+        logger.warning(f"Parameter sweep hit its time budget: {unfinished * SWEEP_CHUNK} settings not evaluated.")
+
+    results = [r for chunk_results in done.values() for r in chunk_results]
+    raw = {combo: score for combo, score, _ in results}
+    trades = {combo: n for combo, _, n in results}
+    ranked = _rank(results, samples)
+    if not ranked:
+        logger.info("Parameter sweep produced no setting with enough trades. Parameters unchanged.")
+        return {}
+    for combo, score in ranked[:5]:
+        logger.info(f"  {dict(zip(SWEEP_GRID, combo))} robust={score:+.4f} raw={raw[combo]:+.4f} trades={trades[combo]}")
+
+    best, best_score = ranked[0]
+    current_score = dict(ranked).get(current)
+    elapsed = time.time() - started
+    if current_score is not None and best_score < current_score + SWEEP_APPLY_MARGIN:
+        logger.info(f"🔒 Current parameters are within {SWEEP_APPLY_MARGIN} of the best ({elapsed:.0f}s). No changes applied.")
+        return dict(zip(SWEEP_GRID, current))
+
+    params = _apply_combo(best)
+    logger.info(f"✅ Parameter sweep applied {params} (robust score {best_score:+.4f}, {elapsed:.0f}s).")
+    return params
+
+# ===================================================================
+# Walk-forward: fit on a training window, score on the unseen window right after it, roll forward
+# ===================================================================
+def run_walk_forward(exchange_api=None, days=None, train_days=None, test_days=None, samples=None, workers=None,
+                     deadline=None, fear_greed=50, apply=False):
+    """
+    For every fold the grid is fitted on `train_days` of 15m candles and the winner is then scored on
+    the following `test_days`, which the fit never saw; folds roll forward by `test_days` over the last
+    `days` of stored history. The current setting is scored on the same test windows as the baseline.
+    Workers build the indicator cache (PrecomputedSeries) once for the whole history and only slice it per fold.
+
+    With apply=True the setting fitted on the most recent `train_days` is written to .env, but only when
+    the walk-forward picks beat the fixed current setting out of sample.
+    Returns {'folds', 'oos_return', 'baseline_return', 'params'}, or None when there is no candle history.
+    """
+    import numpy as np
+    started = time.time()
+    days = days or config.walk_forward_days
+    train_sec = (train_days or config.walk_forward_train_days) * 86400
+    test_sec = (test_days or config.walk_forward_test_days) * 86400
+    samples = config.optimizer_samples if samples is None else samples
+    workers = workers or config.optimizer_workers or os.cpu_count() or 1
+
+    store, exchange_name, symbols = _sweep_symbols(exchange_api)
+    last = [store.last_timestamp(exchange_name, s, '15m') for s in symbols]
+    if not symbols or not any(last):
+        logger.info("No stored candles for the walk-forward optimizer (run: python candle_store.py). Using hill-climb.")
+        return None
+    end = max(t for t in last if t) + 900
+    start = end - days * 86400
+    folds = []
+    t = start + train_sec
+    while t + test_sec <= end:
+        folds.append(((t - train_sec, t), (t, t + test_sec)))
+        t += test_sec
+    if not folds:
+        logger.warning(f"Walk-forward needs more than {(train_sec + test_sec) / 86400:.0f} days of history; have {days}.")
+        return None
+
+    current = _current_combo()
+    combos = _candidate_combos(samples)
+    chunks = [combos[i:i + SWEEP_CHUNK] for i in range(0, len(combos), SWEEP_CHUNK)]
+    fits = [train for train, _ in folds] + [(end - train_sec, end)]  # last fit = the setting to apply
+    logger.info(f"🤖 Walk-forward: {len(folds)} folds ({train_sec / 86400:.0f}d train / {test_sec / 86400:.0f}d test) × "
+                f"{len(combos)} settings × {len(symbols)} symbols, {workers} workers")
+
+    executor = _sweep_pool(exchange_name, symbols, start - INDICATOR_WARMUP_SEC, fear_greed, workers)
+    try:
+        tasks = {(f, c): (_evaluate_combos, chunk, window) for f, window in enumerate(fits) for c, chunk in enumerate(chunks)}
+        done, unfinished = _run_tasks(executor, tasks, deadline)
+        picks = {}
+        for f in range(len(fits)):
+            ranked = _rank([r for (fold, _), res in done.items() if fold == f for r in res], samples)
+            if ranked:
+                picks[f] = ranked[0]
+        tasks = {}
+        for f, (_, test) in enumerate(folds):
+            if f in picks:
+                tasks[(f, 'pick')] = (_evaluate_out_of_sample, picks[f][0], test)
+                tasks[(f, 'current')] = (_evaluate_out_of_sample, current, test)
+        oos, unfinished_oos = _run_tasks(executor, tasks, deadline)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if unfinished or unfinished_oos:
+        logger.warning(f"Walk-forward hit its time budget: {unfinished + unfinished_oos} tasks not evaluated.")
+
+    day = lambda ts: datetime.fromtimestamp(ts, KST).strftime('%m-%d')
+    report = []
+    for f, (train, test) in enumerate(folds):
+        pick, baseline = oos.get((f, 'pick')), oos.get((f, 'current'))
+        if pick is None or baseline is None:
+            continue
+        params = dict(zip(SWEEP_GRID, picks[f][0]))
+        report.append({'train': train, 'test': test, 'params': params, 'in_sample': picks[f][1],
+                       'out_of_sample': pick, 'baseline': baseline})
+        logger.info(f"  Fold {f + 1}: train {day(train[0])}~{day(train[1])} → {params} (IS {picks[f][1]:+.4f}) | "
+                    f"OOS {day(test[0])}~{day(test[1])}: {pick['return']:+.2%}, {pick['trades']} trades, "
+                    f"win {pick['win_rate']:.0%}, MDD {pick['max_drawdown']:.1%} | current {baseline['return']:+.2%}")
+    if not report:
+        logger.info("Walk-forward produced no fold with enough trades. Parameters unchanged.")
+        return {'folds': [], 'oos_return': 0.0, 'baseline_return': 0.0, 'params': None}
+
+    compound = lambda key: float(np.prod([1 + r[key]['return'] for r in report]) - 1)
+    oos_return, baseline_return = compound('out_of_sample'), compound('baseline')
+    final = picks.get(len(fits) - 1)
+    result = {'folds': report, 'oos_return': oos_return, 'baseline_return': baseline_return,
+              'params': dict(zip(SWEEP_GRID, final[0])) if final else None}
+    logger.info(f"📈 Walk-forward out-of-sample: {oos_return:+.2%} vs current setting {baseline_return:+.2%} "
+                f"over {len(report)} folds ({time.time() - started:.0f}s). Latest fit: {result['params']}")
+
+    if apply and final and final[0] != current:
+        if oos_return >= baseline_return + SWEEP_APPLY_MARGIN:
+            params = _apply_combo(final[0])
+            logger.info(f"✅ Walk-forward applied {params}.")
+        else:
+            logger.info("🔒 Walk-forward picks did not beat the current setting out of sample. No changes applied.")
+    return result
+
 if __name__ == "__main__":
-    # Test run
-    run_optimizer()
+    # usage: python auto_optimizer.py                       (scheduled run, as the bot does it)
+    #        python auto_optimizer.py --walk-forward [days] (study only, nothing written to .env)
+    import sys
+    if "--walk-forward" in sys.argv:
+        args = [a for a in sys.argv[1:] if not a.startswith('--')]
+        run_walk_forward(days=int(args[0]) if args else None)
+    else:
+        run_optimizer()
@@ -0,0 +1,317 @@
+import numpy as np
+from config import config
+
+# Live stop rules (main.manage_position)
+PROFIT_LOCK_PCT = 0.03        # +3% 이상 수익 → 트레일링 1.5%
+PROFIT_LOCK_TRAILING = 0.015
+PROFIT_PROTECT_PCT = 0.06     # +6% 이상 수익 → 트레일링 1%
+PROFIT_PROTECT_TRAILING = 0.01
+FEAR_GREED_FEAR_LEVEL = 40   # F&G ≤ 40 이면 HARD_STOP_FEAR_PCT 적용
+TIME_STOP_SEC = 43200         # 12시간
+BTC_TREND_SEC = 14400         # UniverseIndicators.trend_changes: BTC 4h 봉
+BTC_DUMP_PCT = -0.03          # 직전 4h 종가 대비 -3% 이하면 알트 매수 보류
+COOLDOWN_SEC = 10800          # 매도 후 3시간 재진입 금지
+
+EXIT_TRAILING = 0
+EXIT_HARD = 1
+EXIT_TIME = 2
+EXIT_END = 3
+EXIT_REASONS = ("TRAILING", "HARD", "TIME", "END")
+
+def breakout_targets(open_, high, low, k):
+    """UniverseIndicators.breakout_candidates' target for every bar at once: open + (prev high - prev low) * k (NaN on bar 0)."""
+    targets = np.full(len(open_), np.nan)
+    targets[1:] = open_[1:] + (high[:-1] - low[:-1]) * k
+    return targets
+
+def hourly_rsi(timestamps, close, length=14):
+    """
+    1h Wilder RSI as the live scan (UniverseIndicators) sees it from inside each (shorter) bar: completed hours
+    plus the current bar's close as the forming hour's close, so there is no look-ahead.
+    """
+    import pandas as pd
+
+    ts = np.asarray(timestamps, dtype=np.int64)
+    close = np.asarray(close, dtype=float)
+    hour = ts // 3600
+    # Last close of every hour, then Wilder averages (RMA == ewm(alpha=1/length, adjust=False)) per hour
+    last_of_hour = np.flatnonzero(np.append(hour[1:] != hour[:-1], True))
+    hour_close = close[last_of_hour]
+    delta = np.diff(hour_close, prepend=np.nan)
+    gains = pd.Series(np.where(delta > 0, delta, 0.0))
+    losses = pd.Series(np.where(delta < 0, -delta, 0.0))
+    avg_gain = gains.ewm(alpha=1 / length, adjust=False, min_periods=length).mean().to_numpy()
+    avg_loss = losses.ewm(alpha=1 / length, adjust=False, min_periods=length).mean().to_numpy()
+
+    # Index of the previous completed hour for every bar, then one Wilder step with the bar's close
+    prev_hour = np.searchsorted(hour[last_of_hour], hour, side='left') - 1
+    valid = prev_hour >= 0
+    prev = np.clip(prev_hour, 0, None)
+    d = close - hour_close[prev]
+    gain = (avg_gain[prev] * (length - 1) + np.maximum(d, 0)) / length
+    loss = (avg_loss[prev] * (length - 1) + np.maximum(-d, 0)) / length
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+    rsi[~valid | np.isnan(gain)] = np.nan
+    return rsi
+
+def btc_trend_change(timestamps, btc_timestamps, btc_open, btc_close):
+    """
+    BTC's change at each bar's open against the close of the last completed 4h candle
+    (UniverseIndicators.trend_changes for every bar). NaN for bars without BTC data.
+    """
+    btc_ts = np.asarray(btc_timestamps, dtype=np.int64)
+    btc_open = np.asarray(btc_open, dtype=float)
+    btc_close = np.asarray(btc_close, dtype=float)
+    bucket = btc_ts // BTC_TREND_SEC
+    # Close of every completed 4h candle = close of its last bar
+    last_of_bucket = np.flatnonzero(np.append(bucket[1:] != bucket[:-1], True))
+    prev_bucket = np.searchsorted(bucket[last_of_bucket], bucket, side='left') - 1
+    prev_close = btc_close[last_of_bucket][np.clip(prev_bucket, 0, None)]
+    btc_return = np.where(prev_bucket >= 0, btc_open / prev_close - 1, np.nan)
+
+    j = np.searchsorted(btc_ts, np.asarray(timestamps, dtype=np.int64), side='right') - 1
+    change = np.full(len(j), np.nan)
+    valid = j >= 0
+    change[valid] = btc_return[j[valid]]
+    return change
+
+def btc_trend_mask(timestamps, btc_timestamps, btc_open, btc_close, drop_pct=BTC_DUMP_PCT):
+    """
+    The live BTC dump filter for every bar: False where BTC, at the bar's open, is `drop_pct` or more
+    below the close of the last completed 4h candle. Bars without BTC data stay True (live fails open).
+    """
+    return ~(btc_trend_change(timestamps, btc_timestamps, btc_open, btc_close) <= drop_pct)
+
+class PrecomputedSeries:
+    """
+    Parameter-independent run_backtest inputs of one symbol (float arrays, previous-bar ranges,
+    1h RSI, BTC trend mask), computed once over the whole history and sliced per window, so
+    indicators at a window's start keep their warm-up and parameter sweeps only redo the exits.
+    """
+    def __init__(self, timestamps, open_, high, low, close, rsi=None, entry_mask=None, symbol=None):
+        self.symbol = symbol
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.open = np.array(open_, dtype=float)
+        self.high = np.array(high, dtype=float)
+        self.low = np.array(low, dtype=float)
+        self.close = np.array(close, dtype=float)
+        self.prev_range = np.full(len(self.close), np.nan)
+        self.prev_range[1:] = self.high[:-1] - self.low[:-1]
+        self.rsi = hourly_rsi(self.timestamps, self.close) if rsi is None else np.asarray(rsi, dtype=float)
+        self.entry_mask = None if entry_mask is None else np.asarray(entry_mask, dtype=bool)
+
+    def __len__(self):
+        return len(self.close)
+
+    def window(self, start=None, end=None):
+        """Views of the bars with start <= timestamp < end (epoch seconds)."""
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, start, side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self.timestamps, end, side='left'))
+        part = object.__new__(PrecomputedSeries)
+        part.symbol = self.symbol
+        for name in ('timestamps', 'open', 'high', 'low', 'close', 'prev_range', 'rsi'):
+            setattr(part, name, getattr(self, name)[lo:hi])
+        part.entry_mask = None if self.entry_mask is None else self.entry_mask[lo:hi]
+        return part
+
+    def backtest(self, **params):
+        """run_backtest over this series with the precomputed inputs."""
+        return run_backtest(self.timestamps, self.open, self.high, self.low, self.close, rsi=self.rsi,
+                            entry_mask=self.entry_mask, prev_range=self.prev_range, symbol=self.symbol, **params)
+
+class BacktestResult:
+    """Closed trades of one backtest run plus summary statistics (returns are net of fees)."""
+    def __init__(self, symbol, timestamps, entry_idx, exit_idx, entry_price, exit_price, exit_reason, fee_rate):
+        self.symbol = symbol
+        self.timestamps = timestamps
+        self.entry_idx = np.asarray(entry_idx, dtype=np.int64)
+        self.exit_idx = np.asarray(exit_idx, dtype=np.int64)
+        self.entry_price = np.asarray(entry_price, dtype=float)
+        self.exit_price = np.asarray(exit_price, dtype=float)
+        self.exit_reason = np.asarray(exit_reason, dtype=np.int8)
+        self.returns = (self.exit_price * (1 - fee_rate)) / (self.entry_price * (1 + fee_rate)) - 1
+
+    @property
+    def n_trades(self):
+        return len(self.returns)
+
+    @property
+    def win_rate(self):
+        return float(np.mean(self.returns > 0)) if self.n_trades else 0.0
+
+    @property
+    def equity(self):
+        """Compounded equity after each trade, starting from 1.0."""
+        return np.cumprod(1 + self.returns)
+
+    @property
+    def total_return(self):
+        return float(self.equity[-1] - 1) if self.n_trades else 0.0
+
+    @property
+    def max_drawdown(self):
+        if not self.n_trades:
+            return 0.0
+        equity = np.concatenate(([1.0], self.equity))
+        return float(np.max(1 - equity / np.maximum.accumulate(equity)))
+
+    def summary(self):
+        reasons = {name: int(np.sum(self.exit_reason == code)) for code, name in enumerate(EXIT_REASONS)}
+        return {
+            'symbol': self.symbol,
+            'trades': self.n_trades,
+            'win_rate': self.win_rate,
+            'total_return': self.total_return,
+            'avg_return': float(np.mean(self.returns)) if self.n_trades else 0.0,
+            'max_drawdown': self.max_drawdown,
+            'exits': reasons,
+        }
+
+def run_backtest(timestamps, open_, high, low, close, k=None, trailing_stop_pct=None, fear_greed=50,
+                 rsi=None, rsi_max=None, entry_mask=None, fee_rate=0.0005, slippage=0.0,
+                 hard_stop_pct=None, hard_stop_fear_pct=None,
+                 time_stop_sec=TIME_STOP_SEC, cooldown_sec=COOLDOWN_SEC, prev_range=None, symbol=None,
+                 entry_on_close=False):
+    """
+    Simulates the live VBD entry + Phase A exits on one symbol's OHLCV arrays (timestamps in epoch seconds).
+
+    Entry: the first bar whose high reaches the breakout target, filled at max(open, target),
+    skipped while `rsi` ≥ `rsi_max`, while `entry_mask` is False or during the post-sell cooldown.
+    With `entry_on_close` the entry is instead the first bar that closes at or above the target,
+    filled at that close (the price a scan between candles sees, overshoot included).
+    Exits, checked from the bar after entry: the adaptive trailing stop on the running high
+    (tightened by the profit at the bar's low), the F&G-dependent hard stop, both filled at
+    min(open, stop level), else the time stop at the open of the first bar past `time_stop_sec`.
+    `fear_greed` is a scalar or one score per bar. `prev_range` (high - low of the previous bar, see
+    PrecomputedSeries) skips recomputing the breakout ranges.
+
+    Exits are computed for every breakout bar at once as NumPy matrices; Python only walks the
+    chain of trades actually taken (one step per trade).
+    """
+    ts = np.asarray(timestamps, dtype=np.int64)
+    open_ = np.asarray(open_, dtype=float)
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+    k = config.vbd_k if k is None else k
+    trailing_stop_pct = config.trailing_stop_pct if trailing_stop_pct is None else trailing_stop_pct
+    rsi_max = config.rsi_max if rsi_max is None else rsi_max
+    hard_stop_pct = config.hard_stop_pct if hard_stop_pct is None else hard_stop_pct
+    hard_stop_fear_pct = config.hard_stop_fear_pct if hard_stop_fear_pct is None else hard_stop_fear_pct
+
+    if prev_range is None:
+        targets = breakout_targets(open_, high, low, k)
+    else:
+        targets = open_ + np.asarray(prev_range, dtype=float) * k
+    signal = (targets > 0) & ((close if entry_on_close else high) >= targets)
+    if rsi is not None:
+        # Live falls back to RSI 50 when there is not enough history, so NaN never blocks an entry
+        signal &= ~(np.asarray(rsi, dtype=float) >= rsi_max)
+    if entry_mask is not None:
+        signal &= np.asarray(entry_mask, dtype=bool)
+    fills = (close if entry_on_close else np.maximum(open_, targets)) * (1 + slippage)
+    fg = np.broadcast_to(np.asarray(fear_greed, dtype=float), (n,))
+    hard_pct = np.where(fg <= FEAR_GREED_FEAR_LEVEL, hard_stop_fear_pct, hard_stop_pct)
+
+    candidates = np.flatnonzero(signal)
+    if not len(candidates):
+        return BacktestResult(symbol, ts, [], [], [], [], [], fee_rate)
+    exit_idx, exit_price, reason = _exits(candidates, fills[candidates], ts, open_, high, low, close,
+                                          hard_pct, trailing_stop_pct, time_stop_sec)
+    exit_price = exit_price * (1 - slippage)
+
+    # Next tradable candidate after each candidate's exit (position closed + cooldown over)
+    candidate_ts = ts[candidates]
+    next_candidate = np.maximum(np.searchsorted(candidates, exit_idx + 1),
+                                np.searchsorted(candidate_ts, ts[exit_idx] + cooldown_sec))
+    taken = []
+    j = 0
+    while j < len(candidates):
+        taken.append(j)
+        j = next_candidate[j]
+
+    return BacktestResult(symbol, ts, candidates[taken], exit_idx[taken], fills[candidates[taken]],
+                          exit_price[taken], reason[taken], fee_rate)
+
+def _first_stop(entries, prices, lengths, width, high, low, hard_pct, trailing_stop_pct, chunk_cells=2_000_000):
+    """
+    First bar (offset from entry + 1) where the trailing or hard stop fires, scanning at most `width` bars,
+    as one (entries × width) matrix per chunk. Returns (stopped, offset, stop level, is_trailing).
+    Bars carry no intrabar order, so the conservative one is assumed: the low comes before the high.
+    A bar's low is tested against the stop under the running high of the earlier bars (and the
+    profit tightening is judged at that low); its own high lifts the stop from the next bar on.
+    """
+    n = len(low)
+    offsets = np.arange(width)
+    stopped = np.zeros(len(entries), dtype=bool)
+    first = np.zeros(len(entries), dtype=np.int64)
+    stop_level = np.zeros(len(entries))
+    is_trailing = np.zeros(len(entries), dtype=bool)
+    rows = max(chunk_cells // width, 1)
+    for c in range(0, len(entries), rows):
+        part = slice(c, c + rows)
+        price = prices[part, None]
+        valid = offsets < lengths[part, None]
+        idx = np.minimum(entries[part, None] + 1 + offsets, n - 1)
+
+        highest = np.maximum.accumulate(np.where(valid, np.maximum(high[idx], price), price), axis=1)
+        # 저가 먼저: 이 봉의 고가는 다음 봉부터 손절선에 반영
+        highest[:, 1:] = highest[:, :-1].copy()
+        highest[:, 0] = price[:, 0]
+        lows = low[idx]
+        profit = (lows - price) / price
+        trailing = np.where(profit >= PROFIT_PROTECT_PCT, PROFIT_PROTECT_TRAILING,
+                            np.where(profit >= PROFIT_LOCK_PCT, PROFIT_LOCK_TRAILING, trailing_stop_pct))
+        trail_level = highest * (1 - trailing)
+        hard_level = price * (1 - hard_pct[idx])
+        level = np.maximum(trail_level, hard_level)
+        hit = valid & (lows <= level)
+
+        f = hit.argmax(axis=1)
+        r = np.arange(len(f))
+        stopped[part] = hit[r, f]
+        first[part] = f
+        stop_level[part] = level[r, f]
+        is_trailing[part] = trail_level[r, f] >= hard_level[r, f]
+    return stopped, first, stop_level, is_trailing
+
+def _exits(entries, prices, ts, open_, high, low, close, hard_pct, trailing_stop_pct, time_stop_sec, quick_width=8):
+    """
+    Exit bar, price and reason for a position opened at every entry in `entries`.
+    Most stops fire within a few bars, so every entry is first scanned over `quick_width` bars
+    and only the unresolved ones are rescanned up to the time stop.
+    """
+    n = len(close)
+    time_idx = np.searchsorted(ts, ts[entries] + time_stop_sec, side='right')
+    lengths = np.minimum(time_idx, n) - (entries + 1)
+    width = max(int(lengths.max()), 1)
+
+    stopped, first, stop_level, is_trailing = _first_stop(
+        entries, prices, lengths, min(quick_width, width), high, low, hard_pct, trailing_stop_pct)
+    again = np.flatnonzero(~stopped & (lengths > quick_width))
+    if len(again) and width > quick_width:
+        result = _first_stop(entries[again], prices[again], lengths[again], width, high, low, hard_pct, trailing_stop_pct)
+        stopped[again], first[again], stop_level[again], is_trailing[again] = result
+
+    stop_bar = np.minimum(entries + 1 + first, n - 1)
+    # No price stop: time stop at the open of the first bar past the limit, or still open at the end of data
+    timed = time_idx < n
+    fallback_bar = np.where(timed, time_idx, n - 1)
+    fallback_price = np.where(timed, open_[np.minimum(time_idx, n - 1)], close[n - 1])
+
+    exit_idx = np.where(stopped, stop_bar, fallback_bar)
+    exit_price = np.where(stopped, np.minimum(open_[stop_bar], stop_level), fallback_price)
+    reason = np.where(stopped, np.where(is_trailing, EXIT_TRAILING, EXIT_HARD),
+                      np.where(timed, EXIT_TIME, EXIT_END)).astype(np.int8)
+    return exit_idx, exit_price, reason
+
+def run_backtest_frame(df, **kwargs):
+    """run_backtest on an OHLCV DataFrame (exchange_api.fetch_ohlcv layout or a pyupbit frame indexed by time)."""
+    if 'timestamp' in df.columns:
+        times = df['timestamp'].values
+    else:
+        times = df.index.values
+    ts = np.asarray(times).astype('datetime64[s]').astype(np.int64)
+    return run_backtest(ts, df['open'].values, df['high'].values, df['low'].values, df['close'].values, **kwargs)
@@ -0,0 +1,257 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from config import config
+from logger import logger
+import database
+import trade_ledger
+
+SCORER_MODEL_FILE = "candidate_scorer.json"
+# Model inputs, in coefficient order
+FEATURES = ('overshoot_pct', 'rsi', 'volume_rank', 'symbol_pnl_7d_pct', 'btc_trend_pct')
+TRAIN_DAYS = 60           # candle store history simulated for training
+SYMBOL_PNL_WINDOW_SEC = 7 * 86400
+VOLUME_RANK_WINDOW_SEC = 86400  # 24h traded value, as the live top-volume scan
+STABLECOINS = ('USDT', 'USDC')    # never in the live scan universe
+L2_PENALTY = 1.0
+NEWTON_STEPS = 25
+
+def candidate_features(price, target, rsi, rank, symbol_pnl_pct, btc_change):
+    """Scorer inputs of one breakout candidate as {name: value}; also stored with the trade it opens."""
+    return {
+        'overshoot_pct': float((price / target - 1) * 100) if target else 0.0,
+        'rsi': float(rsi),
+        'volume_rank': int(rank),
+        'symbol_pnl_7d_pct': float(symbol_pnl_pct),
+        'btc_trend_pct': 0.0 if btc_change is None or math.isnan(btc_change) else float(btc_change * 100),
+    }
+
+class CandidateScorer:
+    """
+    Local fast path in front of the AI approval: a logistic model of P(win) for a breakout
+    candidate, trained offline (python candidate_scorer.py) and reloaded when the model file
+    changes. triage() approves candidates at or above SCORER_APPROVE_PROB, vetoes those at or below
+    SCORER_VETO_PROB and leaves the band in between for AIAdvisor. Without a trained model every
+    candidate goes to the AI, as before.
+    """
+    def __init__(self, path=SCORER_MODEL_FILE):
+        self.path = path
+        self.model = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self.model = self._mtime = None
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.path, 'r') as f:
+                model = json.load(f)
+            if tuple(model['features']) != FEATURES:
+                raise ValueError(f"trained on {model['features']}")
+            self.model = model
+            logger.info(f"Candidate scorer loaded ({model['samples']} samples, trained {model['trained_at']}).")
+        except Exception as e:
+            self.model = None
+            logger.warning(f"Ignoring unusable candidate scorer {self.path}: {e}")
+
+    def score(self, features):
+        """P(win) for a candidate_features() dict, or None without a model."""
+        model = self.model
+        if model is None:
+            return None
+        z = model['intercept']
+        for name, coef in zip(FEATURES, model['coef']):
+            z += coef * features[name]
+        return 1 / (1 + math.exp(-max(-50.0, min(50.0, z))))
+
+    def triage(self, candidates, btc_change):
+        """
+        Splits Phase C candidates [(idx, symbol, price, target, rsi)] into
+        ({symbol: (approved, context)} decided locally, [candidates left for the AI], {symbol: features}).
+        `btc_change` is BTC's change against its last 4h close.
+        """
+        with self._lock:
+            self._refresh()
+        decided, borderline, features = {}, [], {}
+        for candidate in candidates:
+            idx, symbol, price, target, rsi = candidate
+            symbol_pnl = trade_ledger.stats('7d', symbol)['net_pct']
+            features[symbol] = candidate_features(price, target, rsi, idx + 1, symbol_pnl, btc_change)
+            p = self.score(features[symbol])
+            if p is not None and p >= config.scorer_approve_prob:
+                decided[symbol] = (True, f"Local scorer P(win)={p:.2f}\nDECISION: BUY")
+            elif p is not None and p <= config.scorer_veto_prob:
+                decided[symbol] = (False, f"Local scorer P(win)={p:.2f}\nDECISION: WAIT")
+            else:
+                borderline.append(candidate)
+                continue
+            logger.info(f"[{symbol}] Local scorer P(win)={p:.2f} → {'BUY' if decided[symbol][0] else 'WAIT'} without AI.")
+        if decided:
+            logger.info(f"Local scorer decided {len(decided)} of {len(candidates)} candidates; {len(borderline)} go to the AI.")
+        return decided, borderline, features
+
+# ===================================================================
+# Offline training
+# ===================================================================
+def volume_ranks(store, exchange_name, start):
+    """
+    {symbol: rank at each of its bars} over every stored symbol, ranked by traded KRW value over the
+    24h before the bar (1 = most traded), as get_top_volume_coins ranked the universe at the time.
+    """
+    rolling = {}
+    for symbol in store.symbols(exchange_name, '15m'):
+        if symbol in config.blacklist or symbol.split('/')[0] in STABLECOINS:
+            continue
+        candles = store.load(exchange_name, symbol, '15m', start=start - VOLUME_RANK_WINDOW_SEC)
+        if candles is None or not len(candles['timestamp']):
+            continue
+        ts = np.asarray(candles['timestamp'])
+        value = np.concatenate(([0.0], np.cumsum(candles['close'] * candles['volume'])))
+        since = np.searchsorted(ts, ts - VOLUME_RANK_WINDOW_SEC, side='right')
+        rolling[symbol] = (ts, value[1:] - value[since])
+    if not rolling:
+        return {}
+    symbols = list(rolling)
+    grid = np.unique(np.concatenate([ts for ts, _ in rolling.values()]))
+    # Each symbol's last known 24h value at every grid time; -inf before its first candle
+    values = np.full((len(symbols), len(grid)), -np.inf)
+    for row, symbol in enumerate(symbols):
+        ts, traded = rolling[symbol]
+        last = np.searchsorted(ts, grid, side='right') - 1
+        values[row, last >= 0] = traded[last[last >= 0]]
+    ranks = np.empty(values.shape, dtype=np.int64)
+    np.put_along_axis(ranks, np.argsort(-values, axis=0, kind='stable'), np.arange(1, len(symbols) + 1)[:, None], axis=0)
+    return {symbol: ranks[row, np.searchsorted(grid, rolling[symbol][0])] for row, symbol in enumerate(symbols)}
+
+def candle_samples(days=None, exchange_name=None):
+    """
+    (rows, labels) from VBD trades simulated on the candle store with the live K / RSI cutoff and the
+    BTC dump filter: entry features as the live scan would have seen them, label = net return > 0.
+    A trade enters at the first 15m close above the target (a scan sees the price after the breakout,
+    so the overshoot varies as it does live) and only while the symbol ranked among the COIN_COUNT
+    most traded coins of the preceding 24h, with that rank as its volume_rank.
+    """
+    from candle_store import CandleStore
+    from backtest_engine import PrecomputedSeries, btc_trend_change, BTC_DUMP_PCT
+    exchange_name = exchange_name or config.active_exchange
+    start = time.time() - (days or TRAIN_DAYS) * 86400
+    store = CandleStore()
+    ranks = volume_ranks(store, exchange_name, start)
+    btc = store.load(exchange_name, 'BTC/KRW', '15m', start=start)
+    rows, labels = [], []
+    for symbol, symbol_ranks in ranks.items():
+        candles = store.load(exchange_name, symbol, '15m', start=start)
+        if candles is None or len(candles['close']) < 100:
+            continue
+        ts = candles['timestamp']
+        rank = symbol_ranks[-len(ts):]
+        if btc is not None and len(btc['timestamp']):
+            change = btc_trend_change(ts, btc['timestamp'], btc['open'], btc['close'])
+        else:
+            change = np.full(len(ts), np.nan)
+        series = PrecomputedSeries(ts, candles['open'], candles['high'], candles['low'], candles['close'],
+                                   entry_mask=~(change <= BTC_DUMP_PCT) & (rank <= config.coin_count), symbol=symbol)
+        result = series.backtest(k=config.vbd_k, rsi_max=config.rsi_max, entry_on_close=True)
+        entry = result.entry_idx
+        target = series.open[entry] + series.prev_range[entry] * config.vbd_k
+        entry_ts = series.timestamps[entry]
+        exit_ts = series.timestamps[result.exit_idx]
+        for j in range(len(entry)):
+            # Trades of one symbol never overlap, so every earlier trade closed before this entry
+            recent = exit_ts[:j] > entry_ts[j] - SYMBOL_PNL_WINDOW_SEC
+            symbol_pnl = float(result.returns[:j][recent].sum() * 100)
+            rsi = 50.0 if np.isnan(series.rsi[entry[j]]) else series.rsi[entry[j]]
+            features = candidate_features(result.entry_price[j], target[j], rsi, rank[entry[j]], symbol_pnl, change[entry[j]])
+            rows.append([features[name] for name in FEATURES])
+            labels.append(bool(result.returns[j] > 0))
+    return rows, labels
+
+def ledger_samples():
+    """(rows, labels) from recorded trades that stored their entry features, label = net PnL > 0."""
+    rows, labels = [], []
+    for trade in database.load_history():
+        features = trade.get('features')
+        if features and all(name in features for name in FEATURES):
+            rows.append([features[name] for name in FEATURES])
+            labels.append(trade['net_pnl_krw'] > 0)
+    return rows, labels
+
+def fit_logistic(rows, labels, l2=L2_PENALTY, steps=NEWTON_STEPS):
+    """
+    L2-regularised logistic regression by Newton's method on standardised features.
+    Returns (intercept, coefficients) on the raw feature scale.
+    """
+    X = np.asarray(rows, dtype=float)
+    y = np.asarray(labels, dtype=float)
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = np.column_stack([np.ones(len(X)), (X - mean) / scale])
+    penalty = np.full(Z.shape[1], l2)
+    penalty[0] = 0.0  # the intercept is not shrunk
+    w = np.zeros(Z.shape[1])
+    for _ in range(steps):
+        p = 1 / (1 + np.exp(-Z @ w))
+        grad = Z.T @ (p - y) + penalty * w
+        hess = (Z * (p * (1 - p))[:, None]).T @ Z + np.diag(penalty)
+        step = np.linalg.solve(hess, grad)
+        w -= step
+        if np.max(np.abs(step)) < 1e-8:
+            break
+    coef = w[1:] / scale
+    return float(w[0] - coef @ mean), coef
+
+def train(days=None, path=SCORER_MODEL_FILE):
+    """Fits the scorer on simulated and recorded trades and writes it to `path`. Returns the model (None if not enough data)."""
+    rows, labels = candle_samples(days)
+    ledger_rows, ledger_labels = ledger_samples()
+    rows += ledger_rows
+    labels += ledger_labels
+    if len(labels) < config.scorer_min_samples or len(set(labels)) < 2:
+        logger.info(f"Candidate scorer: {len(labels)} trades (need {config.scorer_min_samples} with wins and losses). Not trained.")
+        return None
+
+    intercept, coef = fit_logistic(rows, labels)
+    X = np.asarray(rows, dtype=float)
+    y = np.asarray(labels, dtype=bool)
+    p = 1 / (1 + np.exp(-(X @ coef + intercept)))
+    approve, veto = p >= config.scorer_approve_prob, p <= config.scorer_veto_prob
+    band_rate = lambda mask: f"{np.mean(y[mask]):.0%}" if mask.any() else "-"
+    logger.info(f"Candidate scorer: {len(y)} trades ({len(ledger_labels)} from the ledger), base win rate {np.mean(y):.0%}. "
+                f"Auto-approve {np.mean(approve):.0%} (win {band_rate(approve)}), auto-veto {np.mean(veto):.0%} "
+                f"(win {band_rate(veto)}), AI {np.mean(~approve & ~veto):.0%}.")
+
+    model = {
+        'features': list(FEATURES),
+        'coef': coef.tolist(),
+        'intercept': intercept,
+        'samples': len(labels),
+        'ledger_samples': len(ledger_labels),
+        'win_rate': float(np.mean(y)),
+        'trained_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(model, f, indent=2)
+    os.replace(tmp_path, path)
+    return model
+
+scorer = CandidateScorer()
+
+def triage(candidates, btc_change):
+    return scorer.triage(candidates, btc_change)
+
+if __name__ == "__main__":
+    # usage: python candidate_scorer.py [days]   (refresh the candle store first: python candle_store.py)
+    train(days=int(sys.argv[1]) if len(sys.argv) > 1 else None)
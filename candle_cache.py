@@ -0,0 +1,179 @@
+import time
+import threading
+from collections import deque
+from config import config
+from logger import logger
+from rate_limiter import RequestShed
+
+# Candle length in seconds for every timeframe alias used across the bot
+TIMEFRAME_SECONDS = {
+    '1m': 60, '3m': 180, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, 'minute60': 3600, '2h': 7200, '4h': 14400, '6h': 21600,
+    '1d': 86400, 'day': 86400,
+}
+TIMEFRAME_ALIASES = {'minute60': '1h', 'day': '1d'}
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+class _CandleSeries:
+    """Closed candles of one (symbol, timeframe) in a fixed-size ring buffer, plus the forming candle."""
+    def __init__(self, capacity):
+        self.closed = deque(maxlen=capacity)
+        self.forming = None
+        self.forming_fetched_at = 0.0
+        self.next_boundary = 0.0
+        # True once a fetch returned fewer candles than asked: the exchange has no older history
+        self.exhausted = False
+
+class CandleCache:
+    """
+    Per-(exchange, symbol, timeframe) OHLCV cache with candle-boundary invalidation.
+    Closed candles never change, so after the first download only the forming candle is
+    re-fetched (at most every `forming_ttl` seconds). Once a candle boundary passes, a small
+    incremental request appends the newly closed candles to the ring buffer.
+
+    `fetcher(symbol, timeframe, limit)` must return rows of
+    (timestamp_sec, open, high, low, close, volume), the last row being the forming candle.
+    Listeners added with on_close(listener) get listener(key, timeframe, rows) with every batch of
+    newly closed candles, in order, so incremental indicators never re-read the chart.
+    """
+    def __init__(self, exchange_name, fetcher, key_func=None, capacity=None, forming_ttl=None):
+        self.exchange_name = exchange_name
+        self._fetcher = fetcher
+        self._key_func = key_func or (lambda symbol: symbol)
+        self.capacity = capacity or config.candle_cache_size
+        self.forming_ttl = config.candle_forming_ttl_sec if forming_ttl is None else forming_ttl
+        self._series = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.hits = 0
+        self.misses = 0
+        self.incremental = 0
+        self.forming_refreshes = 0
+
+    def on_close(self, listener):
+        self._listeners.append(listener)
+
+    def get(self, symbol, timeframe, limit):
+        """Returns the last `limit` candles (forming candle included) as a DataFrame, or None."""
+        rows = self.rows(symbol, timeframe, limit)
+        return self._to_frame(rows) if rows else None
+
+    def rows(self, symbol, timeframe, limit):
+        """get() without the DataFrame: the last `limit` candles as row tuples, or None."""
+        timeframe = TIMEFRAME_ALIASES.get(timeframe, timeframe)
+        tf_sec = TIMEFRAME_SECONDS.get(timeframe)
+        if tf_sec is None:
+            return self._fetch(symbol, timeframe, limit)
+
+        key = (self.exchange_name, self._key_func(symbol), timeframe)
+        # One in-flight fetch per key: concurrent scan workers asking for the same chart wait and then hit
+        with self._key_lock(key):
+            with self._lock:
+                series = self._series.get(key)
+            now = time.time()
+
+            if series is None or (len(series.closed) + 1 < limit and not series.exhausted):
+                # Cold miss (or more history requested than cached): full download
+                rows = self._fetch(symbol, timeframe, min(limit, self.capacity + 1))
+                if not rows:
+                    return None
+                series = _CandleSeries(self.capacity)
+                series.exhausted = len(rows) < limit
+                closed = self._merge(series, rows, tf_sec, now)
+                with self._lock:
+                    self._series[key] = series
+                    self.misses += 1
+            elif now >= series.next_boundary:
+                # One or more candles closed since the last fetch: download only those plus the forming one
+                missed = int((now - series.next_boundary) // tf_sec) + 2
+                rows = self._fetch(symbol, timeframe, min(missed, self.capacity + 1))
+                if not rows:
+                    return None
+                with self._lock:
+                    closed = self._merge(series, rows, tf_sec, now)
+                    self.incremental += 1
+            elif now - series.forming_fetched_at > self.forming_ttl:
+                rows = self._fetch(symbol, timeframe, 1)
+                if not rows:
+                    return None
+                with self._lock:
+                    closed = self._merge(series, rows, tf_sec, now)
+                    self.forming_refreshes += 1
+            else:
+                closed = None
+                with self._lock:
+                    self.hits += 1
+
+            # Still under the key lock, so listeners see each key's candles exactly once and in order
+            if closed:
+                for listener in self._listeners:
+                    listener(key[1], timeframe, closed)
+
+            with self._lock:
+                rows = list(series.closed)[-(limit - 1):] if limit > 1 else []
+                rows.append(series.forming)
+            return rows
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _fetch(self, symbol, timeframe, limit):
+        try:
+            return self._fetcher(symbol, timeframe, limit)
+        except RequestShed:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching OHLCV for {symbol} ({timeframe}): {e}")
+            return None
+
+    def _merge(self, series, rows, tf_sec, now):
+        """
+        Appends newly closed candles to the ring buffer and replaces the forming candle.
+        Returns the newly closed rows.
+        """
+        closed = []
+        last_closed_ts = series.closed[-1][0] if series.closed else None
+        if series.forming is not None and rows[0][0] > series.forming[0]:
+            # The old forming candle closed but is not in this response: keep its last known values
+            if last_closed_ts is None or series.forming[0] > last_closed_ts:
+                closed.append(series.forming)
+                last_closed_ts = series.forming[0]
+        for row in rows[:-1]:
+            if last_closed_ts is None or row[0] > last_closed_ts:
+                closed.append(row)
+                last_closed_ts = row[0]
+        series.closed.extend(closed)
+        series.forming = rows[-1]
+        series.forming_fetched_at = now
+        # Next close on the candle grid (exchanges skip candles without trades, so step past `now`)
+        boundary = series.forming[0] + tf_sec
+        if boundary <= now:
+            boundary += ((now - boundary) // tf_sec + 1) * tf_sec
+        series.next_boundary = boundary
+        return closed
+
+    def _to_frame(self, rows):
+        import pandas as pd  # deferred: stop checks never need a DataFrame
+        df = pd.DataFrame(rows, columns=OHLCV_COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        return df
+
+    def stats(self, reset=False):
+        """Returns hit/miss counters. `requests` is the number of chart calls actually made."""
+        with self._lock:
+            result = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'incremental': self.incremental,
+                'forming_refreshes': self.forming_refreshes,
+                'requests': self.misses + self.incremental + self.forming_refreshes,
+            }
+            if reset:
+                self.hits = self.misses = self.incremental = self.forming_refreshes = 0
+        return result
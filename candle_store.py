@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import numpy as np
+from config import config
+from logger import logger
+from candle_cache import OHLCV_COLUMNS, TIMEFRAME_SECONDS, TIMEFRAME_ALIASES
+
+COLUMN_DTYPES = {
+    'timestamp': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+}
+
+def symbol_key(symbol):
+    """'BTC/KRW' (Coinone/ccxt) or 'KRW-BTC' (Upbit) → 'BTC_KRW', the store's directory name."""
+    if '/' in symbol:
+        base, quote = symbol.split('/')
+    else:
+        quote, base = symbol.split('-')
+    return f"{base}_{quote}"
+
+class CandleStore:
+    """
+    On-disk columnar OHLCV history: one .npy file per column under
+    <root>/<EXCHANGE>/<timeframe>/<BASE_QUOTE>/. Only closed candles are stored, so stored
+    rows never change and sync() only downloads bars newer than the last stored timestamp.
+    load() memory-maps the columns, so backtests read months of candles without copying them.
+    """
+    def __init__(self, root=None):
+        self.root = root or config.candle_store_dir
+
+    def _path(self, exchange_name, symbol, timeframe):
+        timeframe = TIMEFRAME_ALIASES.get(timeframe, timeframe)
+        return os.path.join(self.root, exchange_name, timeframe, symbol_key(symbol))
+
+    def symbols(self, exchange_name, timeframe):
+        """Stored symbols for one exchange/timeframe, as 'BASE/QUOTE'."""
+        timeframe = TIMEFRAME_ALIASES.get(timeframe, timeframe)
+        directory = os.path.join(self.root, exchange_name, timeframe)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name.replace('_', '/') for name in os.listdir(directory)
+                      if os.path.exists(os.path.join(directory, name, 'timestamp.npy')))
+
+    def load(self, exchange_name, symbol, timeframe, start=None, end=None):
+        """
+        Returns {column: read-only memmap} for candles with start <= timestamp < end (epoch seconds),
+        or None when nothing is stored. Slices of a memmap are views: nothing is copied into memory.
+        """
+        path = self._path(exchange_name, symbol, timeframe)
+        ts_file = os.path.join(path, 'timestamp.npy')
+        if not os.path.exists(ts_file):
+            return None
+        columns = {col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode='r') for col in OHLCV_COLUMNS}
+        # timestamp.npy is written last, so its length is the number of complete rows
+        ts = columns['timestamp']
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side='left'))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, end, side='left'))
+        return {col: arr[lo:hi] for col, arr in columns.items()}
+
+    def last_timestamp(self, exchange_name, symbol, timeframe):
+        columns = self.load(exchange_name, symbol, timeframe)
+        if columns is None or not len(columns['timestamp']):
+            return None
+        return int(columns['timestamp'][-1])
+
+    def append(self, exchange_name, symbol, timeframe, rows):
+        """Appends rows of (timestamp_sec, open, high, low, close, volume) newer than the stored data."""
+        last = self.last_timestamp(exchange_name, symbol, timeframe)
+        rows = sorted((r for r in rows if last is None or r[0] > last), key=lambda r: r[0])
+        if not rows:
+            return 0
+        path = self._path(exchange_name, symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+        stored = len(np.load(os.path.join(path, 'timestamp.npy'), mmap_mode='r')) if last is not None else 0
+
+        # Columns are rewritten whole (atomic rename); timestamp goes last so a crash never exposes partial rows.
+        # The old column is read into memory, not memory-mapped: Windows refuses to replace a mapped file
+        for i, col in reversed(list(enumerate(OHLCV_COLUMNS))):
+            new = np.array([r[i] for r in rows], dtype=COLUMN_DTYPES[col])
+            if stored:
+                data = np.concatenate((np.load(os.path.join(path, f"{col}.npy"))[:stored], new))
+            else:
+                data = new
+            tmp_file = os.path.join(path, f"{col}.tmp.npy")
+            np.save(tmp_file, data)
+            os.replace(tmp_file, os.path.join(path, f"{col}.npy"))
+        return len(rows)
+
+    def sync(self, api, exchange_name, symbol, timeframe, since=None):
+        """
+        Downloads the closed candles missing since the last stored bar (or since `since`, default
+        CANDLE_STORE_HISTORY_DAYS ago, for a new symbol), paging backwards with api._fetch_candles(..., to=).
+        Returns the number of candles added.
+        """
+        tf_sec = TIMEFRAME_SECONDS[TIMEFRAME_ALIASES.get(timeframe, timeframe)]
+        now = time.time()
+        last = self.last_timestamp(exchange_name, symbol, timeframe)
+        if since is None:
+            since = now - config.candle_store_history_days * 86400
+        page = api.CANDLE_PAGE_SIZE
+
+        collected = []
+        to = None
+        while True:
+            rows = api._fetch_candles(symbol, timeframe, page, to=to)
+            if not rows:
+                break
+            oldest = rows[0][0]
+            exhausted = len(rows) < page
+            # Keep closed candles only: the newest row is still forming until its interval ends
+            collected.extend(r for r in rows if r[0] + tf_sec <= now and r[0] >= since and (last is None or r[0] > last))
+            if exhausted or oldest <= since or (last is not None and oldest <= last):
+                break
+            to = oldest
+
+        added = self.append(exchange_name, symbol, timeframe, collected)
+        if added:
+            logger.info(f"[CandleStore] {exchange_name} {symbol} {timeframe}: +{added} candles.")
+        return added
+
+    def sync_all(self, api, exchange_name, timeframe, symbols=None):
+        """Syncs every KRW market the exchange lists (or `symbols`). Returns {symbol: candles added}."""
+        symbols = symbols or api.markets.symbols()
+        added = {}
+        for symbol in symbols:
+            try:
+                added[symbol] = self.sync(api, exchange_name, symbol, timeframe)
+            except Exception as e:
+                logger.error(f"[CandleStore] Failed to sync {symbol} {timeframe}: {e}")
+        return added
+
+    def top_by_volume(self, exchange_name, timeframe, limit=10, days=1):
+        """Stored symbols ranked by traded KRW value over the last `days` of stored candles (offline)."""
+        ranking = []
+        for symbol in self.symbols(exchange_name, timeframe):
+            last = self.last_timestamp(exchange_name, symbol, timeframe)
+            if last is None:
+                continue
+            columns = self.load(exchange_name, symbol, timeframe, start=last - days * 86400)
+            ranking.append((symbol, float(np.dot(columns['close'], columns['volume']))))
+        ranking.sort(key=lambda x: x[1], reverse=True)
+        return [symbol for symbol, _ in ranking[:limit]]
+
+if __name__ == "__main__":
+    # usage: python candle_store.py [UPBIT|COINONE] [timeframe] [symbol ...]
+    from exchange_api import CoinoneAPI, UpbitAPI
+    exchange_name = sys.argv[1].upper() if len(sys.argv) > 1 else config.active_exchange
+    timeframe = sys.argv[2] if len(sys.argv) > 2 else '15m'
+    api = UpbitAPI() if exchange_name == "UPBIT" else CoinoneAPI()
+    start = time.time()
+    added = CandleStore().sync_all(api, exchange_name, timeframe, symbols=sys.argv[3:] or None)
+    print(f"Synced {len(added)} {exchange_name} markets ({timeframe}): +{sum(added.values())} candles in {time.time() - start:.1f}s")
@@ -29,6 +29,20 @@ class Config:
         # Max number of positions to hold concurrently
         self.max_positions = int(os.getenv("MAX_POSITIONS", "5"))
         self.top_coins_refresh_min = int(os.getenv("TOP_COINS_REFRESH_MIN", "10"))
+        # Max symbols scanned in parallel during Phase C (network-bound lookups)
+        self.scan_concurrency = max(1, int(os.getenv("SCAN_CONCURRENCY", "8")))
+        # Max age (seconds) of the per-cycle bulk price snapshot before a lookup re-fetches it
+        self.price_snapshot_max_age_sec = float(os.getenv("PRICE_SNAPSHOT_MAX_AGE_SEC", "15"))
+        # OHLCV candle cache: closed candles kept per (symbol, timeframe), forming candle re-fetch interval
+        self.candle_cache_size = int(os.getenv("CANDLE_CACHE_SIZE", "200"))
+        self.candle_forming_ttl_sec = float(os.getenv("CANDLE_FORMING_TTL_SEC", "20"))
+        # Closed candles downloaded once per (symbol, timeframe) to seed the incremental RSI
+        self.rsi_seed_candles = int(os.getenv("RSI_SEED_CANDLES", "500"))
+        # Market metadata (tick bands, quantity step, minimum order) disk cache lifetime
+        self.market_cache_ttl_hours = float(os.getenv("MARKET_CACHE_TTL_HOURS", "24"))
+        # Local columnar candle store for backtests / optimizer (synced incrementally from the exchange)
+        self.candle_store_dir = os.getenv("CANDLE_STORE_DIR", "candles")
+        self.candle_store_history_days = int(os.getenv("CANDLE_STORE_HISTORY_DAYS", "90"))
         
         # Blacklisted coins to completely ignore (e.g. "MYX/KRW,RIVER/KRW")
         blacklist_str = os.getenv("BLACKLIST_COINS", "MYX/KRW,XRP/KRW,RIVER/KRW")
@@ -39,6 +53,71 @@ class Config:
         self.vbd_k = float(os.getenv("VBD_K", "0.5"))
         # Trailing stop: Default to 2% (0.02)
         self.trailing_stop_pct = float(os.getenv("TRAILING_STOP_PCT", "0.02"))
+        # Hard stop below entry: normal / fearful market (F&G ≤ 40)
+        self.hard_stop_pct = float(os.getenv("HARD_STOP_PCT", "0.03"))
+        self.hard_stop_fear_pct = float(os.getenv("HARD_STOP_FEAR_PCT", "0.02"))
+        # Skip breakouts whose 1h RSI is at or above this (overbought, top-chasing)
+        self.rsi_max = float(os.getenv("RSI_MAX", "75"))
+
+        # Auto-optimizer: "sweep" (parameter grid backtested on the candle store), "walk_forward"
+        # (grid fitted on rolling train windows, scored out of sample) or "hill_climb" (trade ledger win rate)
+        self.optimizer_mode = os.getenv("OPTIMIZER_MODE", "sweep").lower()
+        self.optimizer_lookback_days = int(os.getenv("OPTIMIZER_LOOKBACK_DAYS", "14"))
+        # Wall-clock budget of one sweep; it also always stops before the next scheduled optimizer run
+        self.optimizer_budget_sec = float(os.getenv("OPTIMIZER_BUDGET_SEC", "1800"))
+        # 0 = evaluate the full grid, N = random sample of N combinations
+        self.optimizer_samples = int(os.getenv("OPTIMIZER_SAMPLES", "0"))
+        # 0 = one worker process per CPU core
+        self.optimizer_workers = int(os.getenv("OPTIMIZER_WORKERS", "0"))
+        # Walk-forward: history covered, train window fitted per fold, unseen test window scored after it
+        self.walk_forward_days = int(os.getenv("WALK_FORWARD_DAYS", "60"))
+        self.walk_forward_train_days = int(os.getenv("WALK_FORWARD_TRAIN_DAYS", "14"))
+        self.walk_forward_test_days = int(os.getenv("WALK_FORWARD_TEST_DAYS", "3"))
+
+        # AI breakout decision cache: lifetime, max entries, price-to-target distance (%) and RSI bucket widths
+        self.ai_cache_ttl_sec = float(os.getenv("AI_CACHE_TTL_SEC", "900"))
+        self.ai_cache_size = int(os.getenv("AI_CACHE_SIZE", "500"))
+        self.ai_cache_distance_bucket_pct = float(os.getenv("AI_CACHE_DISTANCE_BUCKET_PCT", "0.5"))
+        self.ai_cache_rsi_bucket = float(os.getenv("AI_CACHE_RSI_BUCKET", "5"))
+        # Gemini call deadlines (breakout approval / news check) and what a late breakout answer counts as:
+        # veto | approve | cache (last cached decision for the symbol, veto if none)
+        self.ai_deadline_sec = float(os.getenv("AI_DEADLINE_SEC", "8"))
+        self.ai_news_deadline_sec = float(os.getenv("AI_NEWS_DEADLINE_SEC", "20"))
+        self.ai_deadline_policy = os.getenv("AI_DEADLINE_POLICY", "veto").lower()
+        # Local candidate scorer: P(win) at/above which a candidate is bought and at/below which it is
+        # vetoed without asking Gemini (the band in between goes to the AI); trades needed to train it
+        self.scorer_approve_prob = float(os.getenv("SCORER_APPROVE_PROB", "0.65"))
+        self.scorer_veto_prob = float(os.getenv("SCORER_VETO_PROB", "0.3"))
+        self.scorer_min_samples = int(os.getenv("SCORER_MIN_SAMPLES", "100"))
+        # Gemini request spacing: starts at the minimum, doubles on every 429, recovers on success
+        self.ai_min_interval_sec = float(os.getenv("AI_MIN_INTERVAL_SEC", "2"))
+        self.ai_max_interval_sec = float(os.getenv("AI_MAX_INTERVAL_SEC", "60"))
+
+        # News panic check: RSS/Atom feeds merged per poll (comma separated), poll interval and headlines judged.
+        # Feeds are fetched with conditional GET; Gemini is only asked when the headline set changes, and at most
+        # once per NEWS_MIN_REASK_MIN (news calls share the breakout calls' Gemini quota)
+        self.news_feeds = [url.strip() for url in os.getenv(
+            "NEWS_FEEDS", "https://www.coindesk.com/arc/outboundfeeds/rss/,https://cointelegraph.com/rss").split(",") if url.strip()]
+        self.news_check_min = max(1, int(os.getenv("NEWS_CHECK_MIN", "15")))
+        self.news_headlines = int(os.getenv("NEWS_HEADLINES", "10"))
+        self.news_min_reask_min = float(os.getenv("NEWS_MIN_REASK_MIN", "60"))
+
+        # Shared pooled HTTP client: (connect, read) timeouts, retries on 429/5xx, connections kept per host
+        self.http_connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+        self.http_read_timeout = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+        self.http_max_retries = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+        self.http_pool_size = int(os.getenv("HTTP_POOL_SIZE", "20"))
+        # Share of each endpoint group's request budget kept free for stop checks and orders
+        self.rate_discovery_reserve = float(os.getenv("RATE_DISCOVERY_RESERVE", "0.3"))
+
+        # Real-time websocket market stream (ticks drive the Phase A stop checks)
+        self.market_stream_enabled = os.getenv("MARKET_STREAM_ENABLED", "True").lower() in ("true", "1", "t")
+        # Optional override, e.g. ws://127.0.0.1:8765 for the local replay server
+        self.market_stream_url = os.getenv("MARKET_STREAM_URL", "")
+        # Optional JSONL file that records every raw stream message (replayable offline)
+        self.market_stream_record_path = os.getenv("MARKET_STREAM_RECORD_PATH", "")
+        # Also subscribe to the order book channel (recorded for orderbook_replay execution studies; not used for trading)
+        self.market_stream_orderbook = os.getenv("MARKET_STREAM_ORDERBOOK", "False").lower() in ("true", "1", "t")
             
         self.dry_run = os.getenv("DRY_RUN", "True").lower() in ("true", "1", "t")
 
@@ -60,5 +139,8 @@ class Config:
         load_dotenv(override=True)
         self.vbd_k = float(os.getenv("VBD_K", str(self.vbd_k)))
         self.trailing_stop_pct = float(os.getenv("TRAILING_STOP_PCT", str(self.trailing_stop_pct)))
+        self.hard_stop_pct = float(os.getenv("HARD_STOP_PCT", str(self.hard_stop_pct)))
+        self.hard_stop_fear_pct = float(os.getenv("HARD_STOP_FEAR_PCT", str(self.hard_stop_fear_pct)))
+        self.rsi_max = float(os.getenv("RSI_MAX", str(self.rsi_max)))
 
 config = Config()
@@ -1,84 +1,347 @@
 import json
 import os
+import time
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
 from logger import logger
+from trade_logger import ESTIMATED_FEE_RATE, estimate_pnl
 
-DB_FILE = "history.json"
+DB_FILE = "history.db"
+# Pre-SQLite history (last 100 trades, rewritten on every sell): imported once, then renamed
+LEGACY_HISTORY_FILE = "history.json"
 
-def load_history():
-    if not os.path.exists(DB_FILE):
-        return []
+_conn = None
+_conn_path = None
+_db_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    ts REAL NOT NULL,
+    buy_price REAL NOT NULL,
+    sell_price REAL NOT NULL,
+    profit_pct REAL NOT NULL,
+    amount REAL NOT NULL,
+    time_str TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_symbol_ts ON trades (symbol, ts);
+"""
+# v2: estimated round-trip fee and net PnL per trade (trade_ledger), time index for rolling windows
+_SCHEMA_V2 = """
+ALTER TABLE trades ADD COLUMN fee_krw REAL NOT NULL DEFAULT 0;
+ALTER TABLE trades ADD COLUMN net_pnl_krw REAL NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS trades_ts ON trades (ts);
+"""
+# v3: candidate features at entry (JSON, candidate_scorer training data); NULL for older trades
+_SCHEMA_V3 = """
+ALTER TABLE trades ADD COLUMN features TEXT;
+"""
+_COLUMNS = "symbol, ts, buy_price, sell_price, profit_pct, amount, time_str, fee_krw, net_pnl_krw, features"
+_INSERT = f"INSERT INTO trades ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+def _connect():
+    """Shared connection to DB_FILE (reopened if DB_FILE changes). Call with _db_lock held."""
+    global _conn, _conn_path
+    if _conn is not None and _conn_path == DB_FILE:
+        return _conn
+    _close_locked()
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL: appends never rewrite the file and readers don't block the writer
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        with conn:
+            conn.executescript(_SCHEMA)
+            _migrate_legacy_history(conn)
+            conn.execute("PRAGMA user_version = 1")
+    if version < 2:
+        with conn:
+            conn.executescript(_SCHEMA_V2)
+            conn.execute("UPDATE trades SET fee_krw = (buy_price + sell_price) * amount * ?, "
+                         "net_pnl_krw = (sell_price - buy_price) * amount - (buy_price + sell_price) * amount * ?",
+                         (ESTIMATED_FEE_RATE, ESTIMATED_FEE_RATE))
+            conn.execute("PRAGMA user_version = 2")
+    if version < 3:
+        with conn:
+            conn.executescript(_SCHEMA_V3)
+            conn.execute("PRAGMA user_version = 3")
+    _conn, _conn_path = conn, DB_FILE
+    return conn
+
+def _migrate_legacy_history(conn):
+    legacy = os.path.join(os.path.dirname(DB_FILE), LEGACY_HISTORY_FILE)
+    if not os.path.exists(legacy):
+        return
+    try:
+        with open(legacy, 'r') as f:
+            history = json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading legacy trade history {legacy}: {e}")
+        return
+    rows = []
+    for i, t in enumerate(history):
+        try:
+            ts = time.mktime(time.strptime(t['time_str'], "%Y-%m-%d %H:%M:%S"))
+        except (KeyError, ValueError):
+            ts = float(i)  # keeps file order for records without a usable time
+        rows.append((t['symbol'], ts, t['buy_price'], t['sell_price'], t['profit_pct'], t['amount'], t.get('time_str', '')))
+    # fee / net PnL are filled in by the v2 step
+    conn.executemany("INSERT INTO trades (symbol, ts, buy_price, sell_price, profit_pct, amount, time_str) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    os.replace(legacy, legacy + ".migrated")
+    logger.info(f"Migrated {len(rows)} trades from {legacy} into {DB_FILE}.")
+
+def _close_locked():
+    global _conn, _conn_path
+    if _conn is not None:
+        _conn.close()
+    _conn = _conn_path = None
+
+def close():
+    """Closes the trade history connection (reopened on the next call)."""
+    with _db_lock:
+        _close_locked()
+
+def load_history(limit=None):
+    """All recorded trades (or the last `limit`), oldest first."""
     try:
-        with open(DB_FILE, 'r') as f:
-            return json.load(f)
+        with _db_lock:
+            conn = _connect()
+            if limit is None:
+                rows = conn.execute(f"SELECT {_COLUMNS} FROM trades ORDER BY ts, id").fetchall()
+            else:
+                rows = conn.execute(f"SELECT {_COLUMNS} FROM trades ORDER BY ts DESC, id DESC LIMIT ?", (limit,)).fetchall()[::-1]
+        return [_to_record(row) for row in rows]
     except Exception as e:
         logger.error(f"Error loading trade history DB: {e}")
         return []
 
-def save_history(data):
+def _to_record(row):
+    record = dict(row)
+    record['timestamp'] = record.pop('ts')
+    if record['features'] is not None:
+        record['features'] = json.loads(record['features'])
+    return record
+
+def load_trades_since(since):
+    """Trades with timestamp >= `since` (epoch seconds), oldest first (served by the ts index)."""
     try:
-        with open(DB_FILE, 'w') as f:
-            json.dump(data, f, indent=4)
+        with _db_lock:
+            rows = _connect().execute(f"SELECT {_COLUMNS} FROM trades WHERE ts >= ? ORDER BY ts, id", (since,)).fetchall()
+        return [_to_record(row) for row in rows]
     except Exception as e:
-        logger.error(f"Error saving trade history DB: {e}")
+        logger.error(f"Error loading trade history DB: {e}")
+        return []
 
-def record_trade(symbol, buy_price, sell_price, amount):
-    """Records a completed trade into the history DB."""
-    history = load_history()
-    
+def record_trade(symbol, buy_price, sell_price, amount, features=None):
+    """
+    Records a completed trade into the history DB (one indexed INSERT; history is kept in full).
+    `features` is the candidate's entry snapshot (candidate_scorer.FEATURES), if the buy recorded one.
+    Returns the stored record, or None when it could not be written. Use trade_ledger.record_trade,
+    which also keeps the rolling statistics and the daily CSV.
+    """
     profit_pct = ((sell_price - buy_price) / buy_price) * 100
-    
-    trade_record = {
+    _, fee_krw, net_pnl_krw, _ = estimate_pnl(buy_price, sell_price, amount)
+    now = time.time()
+    time_str = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        with _db_lock:
+            conn = _connect()
+            with conn:
+                conn.execute(_INSERT, (symbol, now, buy_price, sell_price, round(profit_pct, 2), amount, time_str,
+                                       fee_krw, net_pnl_krw, json.dumps(features) if features else None))
+    except Exception as e:
+        logger.error(f"Error saving trade history DB: {e}")
+        return None
+    logger.debug(f"Recorded trade for {symbol}: {profit_pct:.2f}%")
+    return {
         "symbol": symbol,
+        "timestamp": now,
         "buy_price": buy_price,
         "sell_price": sell_price,
         "profit_pct": round(profit_pct, 2),
         "amount": amount,
-        "timestamp": os.environ.get('TZ', 'KST') # Basic timestamp string
+        "time_str": time_str,
+        "fee_krw": fee_krw,
+        "net_pnl_krw": net_pnl_krw,
+        "features": features or None,
     }
-    
-    import datetime
-    trade_record["time_str"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    history.append(trade_record)
-    
-    # Keep only the last 100 trades to prevent file bloat
-    if len(history) > 100:
-        history = history[-100:]
-        
-    save_history(history)
-    logger.debug(f"Recorded trade for {symbol}: {profit_pct:.2f}%")
 
 def get_recent_performance(symbol, limit=5):
-    """Returns the last 'limit' trades for a specific symbol."""
-    history = load_history()
-    symbol_trades = [t for t in history if t.get("symbol") == symbol]
-    return symbol_trades[-limit:]
+    """Returns the last 'limit' trades for a specific symbol, oldest first (served by the (symbol, ts) index)."""
+    try:
+        with _db_lock:
+            rows = _connect().execute(
+                f"SELECT {_COLUMNS} FROM trades WHERE symbol = ? ORDER BY ts DESC, id DESC LIMIT ?",
+                (symbol, limit)).fetchall()
+        return [_to_record(row) for row in reversed(rows)]
+    except Exception as e:
+        logger.error(f"Error loading trade history DB: {e}")
+        return []
 
 # ===================================================================
 # Open Position Persistence (V4)
 # Saves/loads currently held positions to prevent buy_price loss on restart.
 # ===================================================================
 POSITIONS_FILE = "open_positions.json"
+# Journal lines appended before they are folded into POSITIONS_FILE
+JOURNAL_COMPACT_LINES = 200
 
-def save_open_positions(positions_dict):
-    """Saves the current open positions dictionary to a JSON file."""
+def _fsync_dir(path):
+    """Makes a rename in `path`'s directory durable (not supported on Windows, where it is skipped)."""
     try:
-        with open(POSITIONS_FILE, 'w') as f:
-            json.dump(positions_dict, f, indent=4)
-    except Exception as e:
-        logger.error(f"Error saving open positions: {e}")
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class PositionJournal:
+    """
+    Open positions as a snapshot (`path`, the original open_positions.json format) plus an
+    append-only journal (`path`.journal) of per-symbol changes, one JSON line each, fsynced.
+    save() appends only the symbols that changed since the last write, so an unchanged state
+    writes nothing; inside batch() the saves of the batching thread are coalesced into one append
+    when the batch ends, while saves from other threads (the order manager's fills) are written at once.
+    Every JOURNAL_COMPACT_LINES lines the state is written to a temp file, fsynced and renamed
+    over the snapshot, then the journal is emptied. A crash at any point leaves either the old or
+    the new snapshot plus journal lines that re-apply cleanly; a torn last line is ignored.
+    """
+    def __init__(self, path, compact_lines=JOURNAL_COMPACT_LINES):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_lines = compact_lines
+        self._persisted = None  # state on disk, loaded on first use
+        self._journal_lines = 0
+        # Batch depth and pending save per thread: a batch only holds back its own thread's saves
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Rebuilds the positions dict from the snapshot and the journal."""
+        with self._lock:
+            state = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        data = json.load(f)
+                    if isinstance(data, dict):
+                        state = data
+                except Exception as e:
+                    logger.error(f"Error loading open positions: {e}")
+            lines = 0
+            torn = False
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, 'r') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            logger.warning(f"Ignoring torn entry at the end of {self.journal_path}.")
+                            torn = True
+                            break
+                        if 'del' in entry:
+                            state.pop(entry['del'], None)
+                        else:
+                            state[entry['set']] = entry['position']
+                        lines += 1
+            self._persisted = {symbol: dict(pos) for symbol, pos in state.items()}
+            self._journal_lines = lines
+            if torn:
+                # Later appends would land on the torn line: fold the good part into the snapshot now
+                self.compact()
+            return state
+
+    def save(self, positions):
+        if getattr(self._local, 'depth', 0):
+            self._local.pending = positions
+            return
+        with self._lock:
+            self._write(positions)
+
+    @contextmanager
+    def batch(self):
+        """Coalesces every save() this thread makes inside the block into a single journal append at its end."""
+        local = self._local
+        local.depth = getattr(local, 'depth', 0) + 1
+        try:
+            yield self
+        finally:
+            local.depth -= 1
+            if not local.depth:
+                pending, local.pending = getattr(local, 'pending', None), None
+                if pending is not None:
+                    with self._lock:
+                        self._write(pending)
+
+    def _write(self, positions):
+        if self._persisted is None:
+            self.load()
+        # dict() copies in one step, so a concurrent open_position can't change it mid-diff
+        positions = dict(positions)
+        entries = [{'del': symbol} for symbol in self._persisted if symbol not in positions]
+        entries += [{'set': symbol, 'position': pos} for symbol, pos in positions.items()
+                    if self._persisted.get(symbol) != pos]
+        if not entries:
+            return
+        try:
+            with open(self.journal_path, 'a') as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            logger.error(f"Error saving open positions: {e}")
+            return
+        self._persisted = {symbol: dict(pos) for symbol, pos in positions.items()}
+        self._journal_lines += len(entries)
+        if self._journal_lines >= self.compact_lines:
+            self.compact()
+
+    def compact(self):
+        """Folds the journal into the snapshot: temp file + fsync + atomic rename, then an empty journal."""
+        with self._lock:
+            if self._persisted is None:
+                self.load()
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(self._persisted, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                _fsync_dir(self.path)
+                # Replaying the old journal over the new snapshot is harmless, so a crash here loses nothing
+                with open(self.journal_path, 'w') as f:
+                    os.fsync(f.fileno())
+                self._journal_lines = 0
+            except Exception as e:
+                logger.error(f"Error compacting open positions journal: {e}")
+
+_journal = None
+
+def _positions_journal():
+    global _journal
+    if _journal is None or _journal.path != POSITIONS_FILE:
+        _journal = PositionJournal(POSITIONS_FILE)
+    return _journal
+
+def save_open_positions(positions_dict):
+    """Journals the positions that changed since the last save (nothing is written when none did)."""
+    _positions_journal().save(positions_dict)
 
 def load_open_positions():
-    """Loads previously saved open positions from a JSON file."""
-    if not os.path.exists(POSITIONS_FILE):
-        return {}
-    try:
-        with open(POSITIONS_FILE, 'r') as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                return data
-            return {}
-    except Exception as e:
-        logger.error(f"Error loading open positions: {e}")
-        return {}
+    """Loads previously saved open positions (snapshot + journal)."""
+    return _positions_journal().load()
 
+def positions_batch():
+    """Context manager: this thread's save_open_positions() calls inside it are written once, when it exits."""
+    return _positions_journal().batch()
@@ -0,0 +1,97 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from config import config
+from logger import logger
+
+AI_CACHE_FILE = "ai_decision_cache.json"
+# Breakouts are judged on the 15m chart, so a decision never outlives its candle
+DECISION_PERIOD_SEC = 900
+
+class DecisionCache:
+    """
+    AI breakout decisions keyed on (symbol, 15m candle, price-to-target distance bucket, RSI bucket),
+    so a coin that stays above its target with about the same context is not asked about again.
+    Entries expire after AI_CACHE_TTL_SEC; beyond AI_CACHE_SIZE entries the least recently used
+    one is dropped. The cache is saved to `path` (temp file + rename) after every new decision and
+    loaded on start, so a restart doesn't spend quota on decisions it already has.
+    """
+    def __init__(self, path=AI_CACHE_FILE, ttl=None, max_entries=None, distance_bucket_pct=None, rsi_bucket=None):
+        self.path = path
+        self.ttl = config.ai_cache_ttl_sec if ttl is None else ttl
+        self.max_entries = max_entries or config.ai_cache_size
+        self.distance_bucket = (config.ai_cache_distance_bucket_pct if distance_bucket_pct is None else distance_bucket_pct) / 100
+        self.rsi_bucket = rsi_bucket or config.ai_cache_rsi_bucket
+        self._entries = OrderedDict()  # key -> (approved, context, created_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def key(self, symbol, current_price, target_price, rsi):
+        period = int(time.time() // DECISION_PERIOD_SEC)
+        distance = math.floor((current_price / target_price - 1) / self.distance_bucket) if target_price else 0
+        return f"{symbol}|{period}|{distance}|{int(rsi // self.rsi_bucket)}"
+
+    def get(self, key):
+        """Returns (approved, context) for a live entry, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[2] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def latest(self, symbol):
+        """(approved, context) of the newest live decision on `symbol` in any candle or bucket, else None."""
+        prefix = f"{symbol}|"
+        now = time.time()
+        with self._lock:
+            entries = [entry for key, entry in self._entries.items()
+                       if key.startswith(prefix) and now - entry[2] <= self.ttl]
+        if not entries:
+            return None
+        newest = max(entries, key=lambda entry: entry[2])
+        return newest[0], newest[1]
+
+    def put(self, key, approved, context):
+        with self._lock:
+            self._entries[key] = (approved, context, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable AI decision cache {self.path}: {e}")
+            return
+        now = time.time()
+        # Saved oldest-used first, so the LRU order survives the restart
+        for key, approved, context, created_at in data:
+            if now - created_at <= self.ttl:
+                self._entries[key] = (approved, context, created_at)
+
+    def _save(self):
+        """Writes every entry, oldest-used first. Call with the lock held."""
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump([[key, *entry] for key, entry in self._entries.items()], f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save AI decision cache: {e}")
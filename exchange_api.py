@@ -1,27 +1,79 @@
-import ccxt
-import pyupbit
-import math
 import time
-import pandas as pd
+import threading
+import calendar
 from config import config
 from logger import logger
+from candle_cache import CandleCache
+from indicators import UniverseIndicators
+from http_client import http
+from order_manager import OrderManager
+from market_registry import MarketRegistry
+from rate_limiter import budget, RequestShed, PRIORITY_CRITICAL
+
+class PriceSnapshot:
+    """
+    Per-cycle bulk price table shared by every phase of scan_and_trade.
+    One bulk ticker request fills the table for the whole KRW market, and every
+    price lookup is served from memory until the snapshot is older than `max_age` seconds.
+    """
+    def __init__(self, bulk_fetcher, key_func=None, max_age=None):
+        self._bulk_fetcher = bulk_fetcher
+        self._key_func = key_func or (lambda symbol: symbol)
+        self.max_age = config.price_snapshot_max_age_sec if max_age is None else max_age
+        self._prices = {}
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        return (time.time() - self.updated_at) > self.max_age
+
+    def refresh(self, force=False):
+        """Takes a new bulk snapshot. Skipped while the current one is fresh, unless force=True."""
+        with self._lock:
+            if not force and not self.is_stale():
+                return True
+            try:
+                prices = self._bulk_fetcher()
+            except Exception as e:
+                logger.error(f"Error fetching bulk price snapshot: {e}")
+                return False
+            if not prices:
+                return False
+            self._prices = prices
+            self.updated_at = time.time()
+            return True
+
+    def get(self, symbol):
+        """Returns the snapshot price for `symbol`, or None if it is unlisted or no fresh snapshot is available."""
+        if self.is_stale() and not self.refresh():
+            return None
+        return self._prices.get(self._key_func(symbol))
+
+    def put(self, symbol, price):
+        """Writes back a price fetched outside the bulk request (forced single-symbol refresh)."""
+        if price:
+            self._prices[self._key_func(symbol)] = price
 
 class CoinoneAPI:
     def __init__(self):
         """Initializes the ccxt Coinone object with credentials if available."""
+        import ccxt  # only the active exchange's client library is imported
         exchange_class = getattr(ccxt, 'coinone')
         self.exchange = exchange_class({
             'apiKey': config.access_key,
             'secret': config.secret_key,
             'enableRateLimit': True,
+            # Share the pooled keep-alive session with our own REST calls to the same host
+            'session': http.session_for('api.coinone.co.kr'),
         })
-        
-        # Load markets
-        try:
-            self.exchange.load_markets()
-            logger.info("Initialized Coinone API connection (CCXT).")
-        except Exception as e:
-            logger.error(f"Failed to connect to Coinone: {e}")
+        # ccxt loads its market list on the first call that needs it, so startup makes no network request
+        logger.info("Initialized Coinone API connection (CCXT).")
+
+        self.prices = PriceSnapshot(self._fetch_all_prices)
+        self.candles = CandleCache('COINONE', self._fetch_candles)
+        self.universe = UniverseIndicators(self.candles, self._fetch_candles, self.CANDLE_PAGE_SIZE)
+        self.markets = MarketRegistry('COINONE', self._fetch_markets)
+        self.orders = OrderManager(self)
 
     def fetch_balance(self, ticker="KRW"):
         """Fetches the available balance for a specific ticker (e.g. 'KRW', 'BTC')."""
@@ -30,236 +82,238 @@ class CoinoneAPI:
             return 100000.0 if ticker == "KRW" else 0.0
             
         try:
+            budget.charge('exchange')
             balance = self.exchange.fetch_balance()
             if ticker in balance:
                 return balance[ticker]['free']
             return 0.0
+        except RequestShed:
+            raise
         except Exception as e:
             logger.error(f"Error fetching balance for {ticker}: {e}")
             return 0.0
 
-    def fetch_current_price(self, symbol):
-        """Fetches the current ticker price. Symbol format: 'BTC/KRW'"""
+    def fetch_all_balances(self):
+        """Every currency balance in one request: {'free': {'KRW': ..., 'BTC': ...}, 'total': {...}}."""
+        if config.dry_run:
+            return {'free': {'KRW': 100000.0}, 'total': {'KRW': 100000.0}}
+        budget.charge('exchange')
+        balance = self.exchange.fetch_balance()
+        return {'free': balance.get('free', {}), 'total': balance.get('total', {})}
+
+    def _fetch_all_prices(self):
+        """One bulk request for every Coinone ticker. Returns {'BTC/KRW': last_price, ...}"""
+        budget.charge('quotation')
+        tickers = self.exchange.fetch_tickers()
+        return {sym: t['last'] for sym, t in tickers.items() if t.get('last')}
+
+    def fetch_current_price(self, symbol, force_refresh=False):
+        """
+        Returns the current ticker price from the per-cycle bulk snapshot. Symbol format: 'BTC/KRW'
+        force_refresh=True bypasses the snapshot with a live single-symbol request (stop checks, order chasing).
+        """
+        if not force_refresh:
+            price = self.prices.get(symbol)
+            if price:
+                return price
+
         try:
+            budget.charge('quotation')
             ticker = self.exchange.fetch_ticker(symbol)
+            self.prices.put(symbol, ticker['last'])
             return ticker['last']
+        except RequestShed:
+            raise
         except Exception as e:
             logger.error(f"Error fetching price for {symbol}: {e}")
             return None
 
     def fetch_ohlcv(self, symbol, timeframe='1d', limit=2):
         """
-        Fetches OHLCV data. 
-        Coinone CCXT fetch_ohlcv() is not supported yet, so we use their native Public REST API.
+        Fetches OHLCV data through the candle cache (only the forming candle is re-downloaded).
         Returns a Pandas DataFrame.
         """
-        try:
-            # symbol format: 'BTC/KRW'
-            if '/' not in symbol:
-                return None
-            base, quote = symbol.split('/')
-            
-            # Map ccxt timeframe to Coinone interval string
-            # Coinone supports: 1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 1d, 1w, 1M
-            interval_map = {'day': '1d', '1d': '1d', '1h': '1h', 'minute60': '1h', '15m': '15m'}
-            interval = interval_map.get(timeframe, '1d')
-            
-            import requests
-            url = f"https://api.coinone.co.kr/public/v2/chart/{quote}/{base}?interval={interval}"
-            response = requests.get(url)
-            data = response.json()
-            
-            if data.get('result') != 'success':
-                logger.error(f"Coinone API Error fetching OHLCV: {data.get('error_msg')}")
-                return None
-                
-            chart_data = data['chart'][-limit:]
-            
-            df = pd.DataFrame(chart_data)
-            # Coinone returns string numbers, so we convert them
-            for col in ['open', 'high', 'low', 'close', 'target_volume']:
-                df[col] = df[col].astype(float)
-                
-            df.rename(columns={'target_volume': 'volume'}, inplace=True)
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            
-            return df
-        except Exception as e:
-            logger.error(f"Error fetching OHLCV for {symbol}: {e}")
+        return self.candles.get(symbol, timeframe, limit)
+
+    # Max candles per chart request (candle_store pages through history with `to`)
+    CANDLE_PAGE_SIZE = 500
+
+    def _fetch_candles(self, symbol, timeframe, limit, to=None):
+        """
+        Coinone CCXT fetch_ohlcv() is not supported yet, so we use their native Public REST API.
+        Returns rows of (timestamp_sec, open, high, low, close, volume), oldest first.
+        `to` (epoch seconds) returns the candles that started before it instead of the latest ones.
+        """
+        # symbol format: 'BTC/KRW'
+        if '/' not in symbol:
             return None
+        base, quote = symbol.split('/')
+        
+        # Map ccxt timeframe to Coinone interval string
+        # Coinone supports: 1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 1d, 1w, 1M
+        interval_map = {'day': '1d', '1d': '1d', '1h': '1h', 'minute60': '1h', '15m': '15m', '4h': '4h', '1m': '1m'}
+        interval = interval_map.get(timeframe, '1d')
+        
+        # size: only download the candles we need instead of the whole chart
+        url = f"https://api.coinone.co.kr/public/v2/chart/{quote}/{base}"
+        params = {'interval': interval, 'size': min(limit, self.CANDLE_PAGE_SIZE)}
+        if to is not None:
+            params['timestamp'] = int(to) * 1000 - 1
+        response = http.get(url, params=params, endpoint="coinone.chart", group="chart")
+        data = response.json()
+        
+        if data.get('result') != 'success':
+            logger.error(f"Coinone API Error fetching OHLCV: {data.get('error_msg')}")
+            return None
+        
+        # Coinone returns string numbers, so we convert them
+        rows = [
+            (int(c['timestamp']) // 1000, float(c['open']), float(c['high']), float(c['low']),
+             float(c['close']), float(c['target_volume']))
+            for c in data['chart']
+        ]
+        if to is not None:
+            rows = [r for r in rows if r[0] < to]
+        rows.sort(key=lambda r: r[0])
+        return rows[-limit:]
+
+    def _fetch_markets(self):
+        """Coinone public market list: quantity step and minimum order value per KRW market."""
+        res = http.get("https://api.coinone.co.kr/public/v2/markets/KRW", endpoint="coinone.markets", group="quotation")
+        data = res.json()
+        if data.get('result') != 'success':
+            raise ValueError(f"Coinone markets error: {data.get('error_code')}")
+        markets = {}
+        for m in data.get('markets', []):
+            markets[f"{m['target_currency'].upper()}/KRW"] = {
+                'qty_step': float(m['qty_unit']) if m.get('qty_unit') else None,
+                'min_qty': float(m['min_qty']) if m.get('min_qty') else None,
+                'min_notional': float(m['min_order_amount']) if m.get('min_order_amount') else None,
+            }
+        return markets
 
-    def _round_to_tick(self, price: float) -> float:
+    def _amount_to_tick(self, symbol, amount):
         """
-        Rounds the price down to the nearest valid Coinone KRW tick size.
-        This fixes Error 310: 'Unavailable price unit' when using slippage.
+        Rounds the quantity down to the market's quantity step (4 decimals on most Coinone pairs).
         """
-        if price < 1:
-            tick = 0.0001
-            decimals = 4
-        elif price < 10:
-            tick = 0.001
-            decimals = 3
-        elif price < 100:
-            tick = 0.01
-            decimals = 2
-        elif price < 1000:
-            tick = 0.1
-            decimals = 1
+        return self.markets.round_qty(symbol, amount)
+
+    def _limit_price(self, symbol, side, current_price):
+        """Aggressive limit price that sweeps the book like a market order, rounded to a valid tick."""
+        # Apply a 1.5% aggressive buffer to ensure instant market sweep
+        if side == 'BUY':
+            raw_target_price = current_price * 1.015
         else:
-            if price < 10000:
-                tick = 1.0
-            elif price < 100000:
-                tick = 10.0
-            elif price < 500000:
-                tick = 50.0
-            elif price < 1000000:
-                tick = 100.0
-            elif price < 2000000:
-                tick = 500.0
-            else:
-                tick = 1000.0
-            decimals = 0
+            raw_target_price = current_price * 0.985
             
-        # Format explicitly to drop floating point noise AND correctly round down
-        rounded_val = math.floor(price / tick) * tick
-        return float(round(rounded_val, decimals))
+        # Truncate price to acceptable exchange ticks to prevent Error 310: 'Unavailable price unit'
+        # Default CCXT often fails Coinone's dynamic tick, so we use the market registry's tick bands.
+        try:
+            return self.markets.round_price(symbol, raw_target_price)
+        except Exception as e:
+            logger.error(f"Error rounding tick size: {e}")
+            return float(raw_target_price)
 
-    def _amount_to_tick(self, amount: float) -> float:
-        """
-        Rounds the quantity down to 4 decimal places for Coinone.
-        Coinone strictly accepts max 4 decimal places for quantity on most pairs.
-        """
-        return float(format(math.floor(amount * 10000) / 10000, '.4f'))
+    def _place_limit_order(self, symbol, side, price, qty):
+        """Places one limit order. Returns the order id, or None on API error."""
+        base, quote = symbol.split('/')
+        request_params = {
+            'currency': base,
+            'price': float(price),
+            'qty': qty
+        }
+        try:
+            # Order calls always get budget first: they are never shed
+            budget.charge('order', PRIORITY_CRITICAL)
+            if side == 'BUY':
+                res = self.exchange.v2PrivatePostOrderLimitBuy(request_params)
+            else:
+                res = self.exchange.v2PrivatePostOrderLimitSell(request_params)
+        except Exception as e:
+            logger.error(f"[{symbol}] Exception placing {side} order: {e}")
+            return None
+        
+        if res.get('errorCode') != '0':
+            logger.error(f"[{symbol}] API Error placing order: {res}")
+            return None
+        return res.get('orderId')
 
-    def _wait_and_fill_limit_order(self, symbol: str, side: str, krw_budget=None, coin_budget=None, max_retries=5):
+    def _query_order(self, symbol, order_id):
         """
-        Auto-chasing limit order to spoof a market fill.
-        Since Coinone prohibits true market orders, limit orders placed at `current_price`
-        can easily hang if the market price spikes instantly.
-        This loops up to `max_retries`, waiting 5 seconds. If unfilled, it cancels and tries again
-        at the new price.
+        Returns {'status', 'qty', 'remain_qty', 'avg_price'} for an order, or None if the query failed.
+        query_order only reports the limit price, so once something filled the average fill price is
+        taken from the order's executions (None when they are not listed yet).
         """
         base, quote = symbol.split('/')
-        remaining_krw = krw_budget or 0
-        remaining_coin = coin_budget or 0
-        start_krw = remaining_krw
-        start_coin = remaining_coin
-        
-        for attempt in range(max_retries):
-            current_price = self.fetch_current_price(symbol)
-            if not current_price: continue
+        budget.charge('order', PRIORITY_CRITICAL)
+        status_res = self.exchange.v2PrivatePostOrderQueryOrder({
+            'currency': base,
+            'order_id': order_id
+        })
+        if status_res.get('errorCode') != '0':
+            return None
+        order_info = status_res.get('info', {})
+        qty = float(order_info.get('qty', 0))
+        remain_qty = float(order_info.get('remainQty', 0))
+        return {
+            'status': order_info.get('status') or status_res.get('status'),
+            'qty': qty,
+            'remain_qty': remain_qty,
+            'avg_price': self._fill_avg_price(base, order_id) if qty - remain_qty > 0 else None,
+        }
 
-            # Apply a 1.5% aggressive buffer to ensure instant market sweep
-            if side == 'BUY':
-                raw_target_price = current_price * 1.015
-            else:
-                raw_target_price = current_price * 0.985
-                
-            # Truncate price to acceptable exchange ticks to prevent Parameter Error
-            # Default CCXT often fails Coinone's dynamic tick, so we use our native rounder.
-            try:
-                target_price = self._round_to_tick(raw_target_price)
-            except Exception as e:
-                logger.error(f"Error rounding tick size for {symbol}: {e}")
-                target_price = float(raw_target_price)
+    def _fill_avg_price(self, base, order_id):
+        """Quantity-weighted average price of an order's executions in the recent complete orders, or None."""
+        budget.charge('order', PRIORITY_CRITICAL)
+        res = self.exchange.v2PrivatePostOrderCompleteOrders({'currency': base})
+        if res.get('errorCode') != '0':
+            return None
+        fills = [f for f in res.get('completeOrders', []) if str(f.get('orderId', '')).upper() == str(order_id).upper()]
+        qty = sum(float(f['qty']) for f in fills)
+        if qty <= 0:
+            return None
+        return sum(float(f['price']) * float(f['qty']) for f in fills) / qty
 
-            # Determine order dimensions
-            if side == 'BUY':
-                if remaining_krw <= 0: break
-                # Calculate amount using the *aggressive* target_price so we don't accidentally ask for more 
-                # coins than our KRW budget can cover at the worst-case slippage price.
-                amount = remaining_krw / target_price
-            else:
-                if remaining_coin <= 0: break
-                amount = remaining_coin
-                
-            # Use native formatting instead of CCXT's unreliable precision method for quantities
-            # Most Coinone coins allow 4 decimals. Using more triggers Error 310 or Parameter Error.
-            qty_formatted = self._amount_to_tick(amount)
-                
-            if qty_formatted <= 0: break
+    def _cancel_order(self, symbol, side, order_id, price, qty):
+        base, quote = symbol.split('/')
+        budget.charge('order', PRIORITY_CRITICAL)
+        self.exchange.v2PrivatePostOrderCancel({
+            'currency': base,
+            'order_id': order_id,
+            'price': float(price),
+            'qty': float(qty),
+            'is_ask': 1 if side == 'SELL' else 0
+        })
 
-            request_params = {
-                'currency': base,
-                'price': float(target_price),
-                'qty': qty_formatted
-            }
-            
-            try:
-                # Place the spoofed market (limit) order
-                if side == 'BUY':
-                    res = self.exchange.v2PrivatePostOrderLimitBuy(request_params)
-                else:
-                    res = self.exchange.v2PrivatePostOrderLimitSell(request_params)
-                
-                if res.get('errorCode') != '0':
-                    logger.error(f"[{symbol}] API Error placing order on attempt {attempt+1}: {res}")
-                    return None
-                    
-                order_id = res.get('orderId')
-                logger.info(f"[{symbol}] Attempt {attempt+1}/{max_retries} - Placed Limited {side} at {current_price:,} (ID: {order_id})")
-                
-                # Wait for execution
-                time.sleep(5)
-                
-                # Check execution status
-                query_params = {
-                    'currency': base,
-                    'order_id': order_id
-                }
-                status_res = self.exchange.v2PrivatePostOrderQueryOrder(query_params)
-                
-                if status_res.get('errorCode') == '0':
-                    order_info = status_res.get('info', {})
-                    # If status is "live", it hasn't completely filled.
-                    if order_info.get('status') == 'live':
-                        logger.warning(f"[{symbol}] Order {order_id} hanging due to slippage. Canceling and retrying...")
-                        # Partially filled amount (we subtract this from our remaining budget)
-                        filled_qty = float(order_info.get('qty', 0)) - float(order_info.get('remainQty', 0))
-                        if side == 'BUY':
-                            remaining_krw -= (filled_qty * float(current_price))
-                        else:
-                            remaining_coin -= filled_qty
-                            
-                        # Cancel the hanging remainder
-                        self.exchange.v2PrivatePostOrderCancel({
-                            'currency': base,
-                            'order_id': order_id,
-                            'price': float(current_price),
-                            'qty': float(order_info.get('remainQty')),
-                            'is_ask': 1 if side == 'SELL' else 0
-                        })
-                        time.sleep(1) # Wait for cancel to process
-                    else:
-                        # Fully filled ("completed" or other)
-                        return {"result": "success", "orderId": order_id, "filled_price": current_price}
-                
-            except Exception as e:
-                logger.error(f"[{symbol}] Exception in order chase loop: {e}")
-                
-        # 최대 재시도(max_retries)가 끝났거나, 잔여 물량이 너무 작아 루프를 탈출한 경우
-        # 조금이라도 체결된 이력이 있다면 '실패(None)'가 아닌 '부분 체결(Partial Success)'로 보고하여 
-        # 메인루프에서 포지션을 추적/청산할 수 있게 유도함.
-        if side == 'BUY' and remaining_krw < start_krw:
-            logger.warning(f"[{symbol}] BUY order max retries reached but partially filled. Tracking it.")
-            return {"result": "partial_success"}
-        if side == 'SELL' and remaining_coin < start_coin:
-            logger.warning(f"[{symbol}] SELL order max retries reached but partially filled. Clearing it.")
-            return {"result": "partial_success"}
-            
-        logger.error(f"[{symbol}] Failed to fully fill {side} order after {max_retries} attempts.")
-        return None
+    def _submit_limit_chase(self, symbol, side, on_done, krw_budget=None, coin_budget=None):
+        """
+        Auto-chasing limit order to spoof a market fill.
+        Since Coinone prohibits true market orders, limit orders placed at `current_price`
+        can easily hang if the market price spikes instantly. The order manager re-checks it
+        on its own thread, cancels and re-prices it, so this returns right after placement.
+        """
+        order = self.orders.submit(symbol, side, krw_budget=krw_budget, coin_budget=coin_budget, on_done=on_done)
+        if order is None:
+            logger.error(f"[{symbol}] Failed to place {side} order.")
+            return None
+        return {"result": "pending", "orderId": order.order_id, "filled_price": order.ref_price}
 
-    def place_market_buy_order(self, symbol, cost_krw):
-        """Places a market buy order using a specific KRW amount by mimicking it with an auto-chasing limit order."""
+    def place_market_buy_order(self, symbol, cost_krw, on_done=None):
+        """
+        Places a market buy order using a specific KRW amount by mimicking it with an auto-chasing limit order.
+        Returns {"result": "pending"} immediately; the final fill is reported through on_done(order).
+        """
         if config.dry_run:
             logger.info(f"[DRY RUN] Simulated Market Buy for {symbol} with {cost_krw} KRW")
             return {"uuid": f"dry-run-buy-{time.time()}"}
 
-        return self._wait_and_fill_limit_order(symbol, 'BUY', krw_budget=cost_krw)
+        return self._submit_limit_chase(symbol, 'BUY', on_done, krw_budget=cost_krw)
 
-    def place_market_sell_order(self, symbol, amount):
-        """Places a market sell order for a specific amount of coins by mimicking it with an auto-chasing limit order."""
+    def place_market_sell_order(self, symbol, amount, on_done=None):
+        """
+        Places a market sell order for a specific amount of coins by mimicking it with an auto-chasing limit order.
+        Returns {"result": "pending"} immediately; the final fill is reported through on_done(order).
+        """
         if config.dry_run:
             logger.info(f"[DRY RUN] Simulated Market Sell for {symbol} of amount {amount}")
             return {"uuid": f"dry-run-sell-{time.time()}"}
@@ -269,21 +323,33 @@ class CoinoneAPI:
         actual_balance = self.fetch_balance(base_ticker)
         
         safe_amount = min(amount, actual_balance)
-        current_price = self.fetch_current_price(symbol)
+        current_price = self.fetch_current_price(symbol, force_refresh=True)
         
-        # 먼지(Dust) 방지 필터: 보유 잔고의 가치가 4,500원 미만이면 코인원 최소 주문금액(5,000원) 미달로 무조건 에러남.
+        # 먼지(Dust) 방지 필터: 보유 잔고의 가치가 최소 주문금액(기본 5,000원)의 90% 미만이면 주문이 무조건 에러남.
         # 이 경우 '알아서 다 팔렸거나, 팔 수 없는 먼지'로 간주하고 무한 루프에 빠지지 않도록 처리함.
-        if current_price and (safe_amount * current_price) < 4500:
+        if current_price and (safe_amount * current_price) < self.markets.dust_limit(symbol):
              logger.warning(f"[{symbol}] Balance ({safe_amount} 개, 약 {safe_amount * current_price:.0f} 원) is practically dust or below minimum order size. Clearing from memory.")
              return {"result": "dust_cleared", "filled_price": current_price}
 
-        return self._wait_and_fill_limit_order(symbol, 'SELL', coin_budget=safe_amount)
+        return self._submit_limit_chase(symbol, 'SELL', on_done, coin_budget=safe_amount)
 
 class UpbitAPI:
     def __init__(self):
-        self.upbit = pyupbit.Upbit(config.upbit_access_key, config.upbit_secret_key)
+        self._upbit = None
+        self.prices = PriceSnapshot(self._fetch_all_prices, key_func=self.format_symbol)
+        self.candles = CandleCache('UPBIT', self._fetch_candles, key_func=self.format_symbol)
+        self.universe = UniverseIndicators(self.candles, self._fetch_candles, self.CANDLE_PAGE_SIZE)
+        self.markets = MarketRegistry('UPBIT', self._fetch_markets, key_func=self.format_symbol)
         logger.info("Initialized Upbit API connection (pyupbit).")
 
+    @property
+    def upbit(self):
+        """Authenticated pyupbit client, imported on the first private call (pyupbit pulls in pandas)."""
+        if self._upbit is None:
+            import pyupbit
+            self._upbit = pyupbit.Upbit(config.upbit_access_key, config.upbit_secret_key)
+        return self._upbit
+
     def format_symbol(self, symbol):
         """Converts CCXT BTC/KRW or KRW-BTC into pyupbit format KRW-BTC"""
         if '/' in symbol:
@@ -296,52 +362,130 @@ class UpbitAPI:
             return 100000.0 if ticker == "KRW" else 0.0
         try:
             # get_balances returns a list of dictionaries like {'currency': 'KRW', 'balance': '100000.0', ...}
+            budget.charge('exchange')
             raw_balances = self.upbit.get_balances()
             if raw_balances:
                 for b in raw_balances:
                     if b['currency'] == ticker:
                         return float(b['balance'])
             return 0.0
+        except RequestShed:
+            raise
         except Exception as e:
             logger.error(f"Error fetching balance for {ticker}: {e}")
             return 0.0
 
-    def fetch_current_price(self, symbol):
+    def fetch_all_balances(self):
+        """Every currency balance in one request: {'free': {'KRW': ..., 'BTC': ...}, 'total': {...}}."""
+        if config.dry_run:
+            return {'free': {'KRW': 100000.0}, 'total': {'KRW': 100000.0}}
+        budget.charge('exchange')
+        raw_balances = self.upbit.get_balances() or []
+        free, total = {}, {}
+        for b in raw_balances:
+            free[b['currency']] = float(b['balance'])
+            total[b['currency']] = float(b['balance']) + float(b.get('locked', 0) or 0)
+        return {'free': free, 'total': total}
+
+    def _fetch_all_prices(self):
+        """One bulk request for every KRW market ticker. Returns {'KRW-BTC': trade_price, ...}"""
+        url = "https://api.upbit.com/v1/ticker/all"
+        headers = {"accept": "application/json"}
+        res = http.get(url, headers=headers, params={"quote_currencies": "KRW"}, endpoint="upbit.ticker_all", group="quotation")
+        data = res.json()
+        if not isinstance(data, list):
+            logger.error(f"Upbit bulk ticker error: {data}")
+            return {}
+        return {item['market']: item['trade_price'] for item in data}
+
+    def _fetch_markets(self):
+        """
+        Upbit KRW market list. Upbit publishes one KRW tick table and a 5,000 KRW minimum for every
+        market, so each market carries the exchange defaults.
+        """
+        res = http.get("https://api.upbit.com/v1/market/all", params={"isDetails": "false"},
+                       endpoint="upbit.market_all", group="quotation")
+        data = res.json()
+        if not isinstance(data, list):
+            raise ValueError(f"Upbit market list error: {data}")
+        return {m['market']: {} for m in data if m['market'].startswith('KRW-')}
+
+    def fetch_current_price(self, symbol, force_refresh=False):
+        """
+        Returns the current price from the per-cycle bulk snapshot.
+        force_refresh=True bypasses the snapshot with a live single-symbol request (stop checks).
+        """
+        if not force_refresh:
+            price = self.prices.get(symbol)
+            if price:
+                return price
+
         try:
             formatted_sym = self.format_symbol(symbol)
-            return pyupbit.get_current_price(formatted_sym)
+            res = http.get("https://api.upbit.com/v1/ticker", params={"markets": formatted_sym}, endpoint="upbit.ticker", group="quotation")
+            data = res.json()
+            if not isinstance(data, list) or not data:
+                logger.error(f"Error fetching price for {symbol}: {data}")
+                return None
+            price = data[0]['trade_price']
+            self.prices.put(symbol, price)
+            return price
+        except RequestShed:
+            raise
         except Exception as e:
             logger.error(f"Error fetching price for {symbol}: {e}")
             return None
 
     def fetch_ohlcv(self, symbol, timeframe='1d', limit=2):
-        try:
-            formatted_sym = self.format_symbol(symbol)
-            interval_map = {'day': 'day', '1d': 'day', '1h': 'minute60', '15m': 'minute15', '4h': 'minute240'}
-            interval = interval_map.get(timeframe, 'day')
-            df = pyupbit.get_ohlcv(formatted_sym, interval=interval, count=limit)
-            if df is not None and not df.empty:
-                df.reset_index(inplace=True)
-                df.rename(columns={'index': 'timestamp'}, inplace=True)
-                return df
-            return None
-        except Exception as e:
-            logger.error(f"Error fetching OHLCV for {symbol}: {e}")
+        """Fetches OHLCV data through the candle cache. Returns a Pandas DataFrame."""
+        return self.candles.get(symbol, timeframe, limit)
+
+    # Upbit caps count at 200 per candle request
+    CANDLE_PAGE_SIZE = 200
+
+    def _fetch_candles(self, symbol, timeframe, limit, to=None):
+        """
+        Upbit quotation REST candles. Returns rows of (timestamp_sec, open, high, low, close, volume), oldest first.
+        `to` (epoch seconds, exclusive) returns the candles that started before it instead of the latest ones.
+        """
+        formatted_sym = self.format_symbol(symbol)
+        path_map = {'day': 'days', '1d': 'days', '1h': 'minutes/60', '15m': 'minutes/15', '4h': 'minutes/240', '1m': 'minutes/1'}
+        path = path_map.get(timeframe, 'days')
+        url = f"https://api.upbit.com/v1/candles/{path}"
+        params = {"market": formatted_sym, "count": min(limit, self.CANDLE_PAGE_SIZE)}
+        if to is not None:
+            params["to"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(to))
+        res = http.get(url, params=params, endpoint=f"upbit.candles.{path}", group="chart")
+        data = res.json()
+        if not isinstance(data, list) or not data:
+            logger.error(f"Upbit candle error for {symbol}: {data}")
             return None
+        # Upbit returns newest first; candle_date_time_utc is the candle start
+        rows = [
+            (calendar.timegm(time.strptime(c['candle_date_time_utc'], "%Y-%m-%dT%H:%M:%S")),
+             float(c['opening_price']), float(c['high_price']), float(c['low_price']),
+             float(c['trade_price']), float(c['candle_acc_trade_volume']))
+            for c in data
+        ]
+        rows.reverse()
+        return rows
 
-    def place_market_buy_order(self, symbol, cost_krw):
+    def place_market_buy_order(self, symbol, cost_krw, on_done=None):
+        """Upbit supports true market orders, so the result is final and on_done is not used."""
         if config.dry_run:
             logger.info(f"[DRY RUN] Simulated Upbit Market Buy for {symbol} with {cost_krw} KRW")
             return {"uuid": f"dry-run-buy-{time.time()}"}
             
         try:
-            # 강제로 5천원 미만이면 거부
-            if cost_krw < 5000:
-                logger.warning(f"[{symbol}] Buy order cost ({cost_krw}) under Upbit minimum 5000 KRW.")
+            # 최소 주문금액(기본 5천원) 미만이면 거부
+            min_notional = self.markets.min_notional(symbol)
+            if cost_krw < min_notional:
+                logger.warning(f"[{symbol}] Buy order cost ({cost_krw}) under Upbit minimum {min_notional:,.0f} KRW.")
                 return None
                 
             formatted_sym = self.format_symbol(symbol)
             # 업비트는 buy_market_order 지원
+            budget.charge('order', PRIORITY_CRITICAL)
             res = self.upbit.buy_market_order(formatted_sym, cost_krw)
             if res and 'uuid' in res:
                 logger.info(f"[{symbol}] Upbit Market BUY Placed. (ID: {res['uuid']})")
@@ -356,7 +500,7 @@ class UpbitAPI:
             logger.error(f"[{symbol}] Upbit BUY Exception: {e}")
             return None
 
-    def place_market_sell_order(self, symbol, amount):
+    def place_market_sell_order(self, symbol, amount, on_done=None):
         if config.dry_run:
             logger.info(f"[DRY RUN] Simulated Upbit Market Sell for {symbol} of amount {amount}")
             return {"uuid": f"dry-run-sell-{time.time()}"}
@@ -364,15 +508,16 @@ class UpbitAPI:
         try:
             base_ticker = symbol.split('/')[0] if '/' in symbol else symbol.split('-')[1]
             actual_balance = self.fetch_balance(base_ticker)
-            safe_amount = min(amount, actual_balance)
-            current_price = self.fetch_current_price(symbol)
+            safe_amount = self.markets.round_qty(symbol, min(amount, actual_balance))
+            current_price = self.fetch_current_price(symbol, force_refresh=True)
             
-            # 5천원 미만 잔고면 먼지로 판별하고 청산. 업비트는 시장가 매도 최소 5000원 룰이 있음.
-            if current_price and (safe_amount * current_price) < 4800:
+            # 최소 주문금액 미만 잔고면 먼지로 판별하고 청산. 업비트는 시장가 매도 최소 5000원 룰이 있음.
+            if current_price and (safe_amount * current_price) < self.markets.dust_limit(symbol):
                 logger.warning(f"[{symbol}] Balance ({safe_amount} 개) is below Upbit minimum sell size. Clearing dust from memory.")
                 return {"result": "dust_cleared", "filled_price": current_price}
                 
             formatted_sym = self.format_symbol(symbol)
+            budget.charge('order', PRIORITY_CRITICAL)
             res = self.upbit.sell_market_order(formatted_sym, safe_amount)
             if res and 'uuid' in res:
                 logger.info(f"[{symbol}] Upbit Market SELL Placed. (ID: {res['uuid']})")
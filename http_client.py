@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from config import config
+from logger import logger
+from rate_limiter import budget, RequestShed
+
+# Responses worth retrying: rate limited or a transient server-side failure
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class EndpointStats:
+    """Running latency / byte counters for one endpoint label."""
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.bytes = 0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'avg_ms': (self.total_latency / self.count * 1000) if self.count else 0.0,
+            'max_ms': self.max_latency * 1000,
+            'bytes': self.bytes,
+        }
+
+class HttpClient:
+    """
+    Shared pooled HTTP client for every REST call the bot makes.
+    - One keep-alive requests.Session (connection pool) per host, so TCP+TLS handshakes are paid once
+    - Default (connect, read) timeouts on every request
+    - Retry with jittered exponential backoff on 429 / 5xx / connection errors (honours Retry-After)
+    - Per-endpoint latency and byte counters
+    """
+    def __init__(self, connect_timeout=None, read_timeout=None, max_retries=None, pool_size=None):
+        self.timeout = (
+            config.http_connect_timeout if connect_timeout is None else connect_timeout,
+            config.http_read_timeout if read_timeout is None else read_timeout,
+        )
+        self.max_retries = config.http_max_retries if max_retries is None else max_retries
+        self.pool_size = pool_size or config.http_pool_size
+        self.backoff_base = 0.3
+        self.backoff_max = 5.0
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, host):
+        """Returns the pooled keep-alive session for `host` (created on first use)."""
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def get(self, url, params=None, headers=None, timeout=None, endpoint=None, retries=None, group=None):
+        return self.request("GET", url, params=params, headers=headers, timeout=timeout, endpoint=endpoint,
+                            retries=retries, group=group)
+
+    def request(self, method, url, params=None, headers=None, timeout=None, endpoint=None, retries=None, group=None, **kwargs):
+        """
+        Sends a request through the host's pool. `endpoint` labels the counters
+        (defaults to host + path; pass a label when the path embeds a symbol).
+        `group` charges the request to that endpoint group of the exchange request budget;
+        discovery-priority requests raise RequestShed instead of being sent when it runs low.
+        Returns the final requests.Response, or raises the last connection error.
+        """
+        parsed = urlparse(url)
+        session = self.session_for(parsed.netloc)
+        label = endpoint or f"{parsed.netloc}{parsed.path}"
+        retries = self.max_retries if retries is None else retries
+
+        attempt = 0
+        while True:
+            if group and not budget.acquire(group):
+                raise RequestShed(f"{label} shed: {group} budget reserved for risk checks")
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url, params=params, headers=headers,
+                                           timeout=timeout or self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(label, time.perf_counter() - start, 0, error=True)
+                if attempt >= retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"[HTTP] {label} connection error ({e.__class__.__name__}). Retry {attempt+1}/{retries} in {delay:.2f}s")
+            else:
+                self._record(label, time.perf_counter() - start, len(response.content),
+                             error=response.status_code >= 400)
+                if group:
+                    budget.update_from_headers(group, response.headers)
+                    if response.status_code == 429:
+                        budget.penalize(group)
+                if response.status_code not in RETRY_STATUS or attempt >= retries:
+                    return response
+                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"[HTTP] {label} returned {response.status_code}. Retry {attempt+1}/{retries} in {delay:.2f}s")
+
+            with self._lock:
+                # stats(reset=True) may have dropped the label since _record
+                self._stats.setdefault(label, EndpointStats()).retries += 1
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Full jitter: spreads simultaneous retries so they don't hit the limit together again
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, label, latency, size, error=False):
+        with self._lock:
+            stats = self._stats.get(label)
+            if stats is None:
+                stats = self._stats[label] = EndpointStats()
+            stats.count += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            stats.bytes += size
+            if error:
+                stats.errors += 1
+
+    def stats(self, reset=False):
+        """Returns {endpoint: {count, errors, retries, avg_ms, max_ms, bytes}}."""
+        with self._lock:
+            result = {label: s.as_dict() for label, s in self._stats.items()}
+            if reset:
+                self._stats = {}
+        return result
+
+# Module-level client shared by every component
+http = HttpClient()
@@ -0,0 +1,265 @@
+import time
+import threading
+import numpy as np
+from config import config
+from logger import logger
+from candle_cache import TIMEFRAME_SECONDS
+from backtest_engine import BTC_DUMP_PCT
+
+def wilder_step(avg_gain, avg_loss, last_close, close, length):
+    """One RMA step of the average gain / loss with a new close (scalars or arrays)."""
+    delta = close - last_close
+    return (avg_gain + (np.maximum(delta, 0.0) - avg_gain) / length,
+            avg_loss + (np.maximum(-delta, 0.0) - avg_loss) / length)
+
+def closed_history(fetcher, symbol, timeframe, count, page_size):
+    """The last `count` closed candles, oldest first, paging backwards from now with fetcher(..., to=)."""
+    tf_sec = TIMEFRAME_SECONDS[timeframe]
+    now = time.time()
+    rows = []
+    to = None
+    while len(rows) < count:
+        # +1: the first page ends with the forming candle
+        limit = min(page_size, count - len(rows) + 1)
+        page = fetcher(symbol, timeframe, limit, to=to)
+        if not page:
+            break
+        rows[:0] = [r for r in page if r[0] + tf_sec <= now and (not rows or r[0] < rows[0][0])]
+        if len(page) < limit:
+            break
+        to = page[0][0]
+    return rows[-count:]
+
+# Phase C timeframes: VBD target, RSI filter, BTC trend
+VBD_TIMEFRAME = '15m'
+RSI_TIMEFRAME = '1h'
+TREND_TIMEFRAME = '4h'
+
+class _Panel:
+    """
+    Recent candles of every tracked symbol on one timeframe as aligned (symbol × bar) arrays.
+    Column j is the candle starting at grid_end - (bars - 1 - j) * tf_sec, so the last column is the
+    forming candle; candles the exchange skipped (no trades) or not downloaded yet stay NaN.
+    """
+    def __init__(self, timeframe, bars, capacity):
+        self.timeframe = timeframe
+        self.tf_sec = TIMEFRAME_SECONDS[timeframe]
+        self.bars = bars
+        self.grid_end = None
+        # data[0..3] = open, high, low, close
+        self.data = np.full((4, capacity, bars), np.nan)
+
+    def grow(self, capacity):
+        data = np.full((4, capacity, self.bars), np.nan)
+        data[:, :self.data.shape[1]] = self.data
+        self.data = data
+
+    def advance(self, now):
+        """Moves the grid so the last column is the candle forming at `now`; new columns start empty."""
+        grid_end = int(now) // self.tf_sec * self.tf_sec
+        if self.grid_end is not None and grid_end > self.grid_end:
+            shift = min(self.bars, (grid_end - self.grid_end) // self.tf_sec)
+            self.data[:, :, :self.bars - shift] = self.data[:, :, shift:]
+            self.data[:, :, self.bars - shift:] = np.nan
+        if self.grid_end is None or grid_end > self.grid_end:
+            self.grid_end = grid_end
+
+    def has_forming(self, row):
+        return not np.isnan(self.data[0, row, -1])
+
+    def write(self, row, candles):
+        for ts, o, h, l, c, _ in candles:
+            col = self.bars - 1 - (self.grid_end - (ts - ts % self.tf_sec)) // self.tf_sec
+            if 0 <= col < self.bars:
+                self.data[:, row, col] = (o, h, l, c)
+
+class _WilderPanel:
+    """Wilder RSI state (RMA of gains / losses) of every tracked symbol as arrays, so the RSI of all rows is one vectorised step."""
+    def __init__(self, length, capacity):
+        self.length = length
+        self.avg_gain = np.zeros(capacity)
+        self.avg_loss = np.zeros(capacity)
+        self.last_close = np.full(capacity, np.nan)
+        self.last_ts = np.full(capacity, -1, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+
+    def grow(self, capacity):
+        n = len(self.count)
+        for name, fill in (('avg_gain', 0.0), ('avg_loss', 0.0), ('last_close', np.nan), ('last_ts', -1), ('count', 0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:n] = old
+            setattr(self, name, new)
+
+    def update(self, row, ts, close):
+        """Adds one closed candle to a row (ignored unless newer than the row's last candle)."""
+        if ts <= self.last_ts[row]:
+            return
+        if self.count[row]:
+            self.avg_gain[row], self.avg_loss[row] = wilder_step(
+                self.avg_gain[row], self.avg_loss[row], self.last_close[row], close, self.length)
+        self.count[row] += 1
+        self.last_close[row] = close
+        self.last_ts[row] = ts
+
+    def reset(self, row):
+        self.avg_gain[row] = self.avg_loss[row] = 0.0
+        self.last_close[row] = np.nan
+        self.last_ts[row] = -1
+        self.count[row] = 0
+
+    def values(self, rows, closes):
+        """RSI of `rows` with `closes` as their forming candles' closes; NaN without enough history."""
+        gain, loss = wilder_step(self.avg_gain[rows], self.avg_loss[rows], self.last_close[rows], closes, self.length)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+        rsi[(self.count[rows] < self.length) | np.isnan(closes)] = np.nan
+        return rsi
+
+class UniverseIndicators:
+    """
+    Phase C indicators for every scanned symbol at once. The 15m and 4h candles of all tracked
+    symbols sit in aligned _Panels and the 1h RSI keeps its Wilder averages in arrays, so VBD
+    targets, RSI and trend flags for the whole universe are one vectorised pass over the current
+    prices. refresh() downloads a symbol's candles only after one of them closed (a forming
+    candle's open never changes, and its close is the current price).
+    """
+    def __init__(self, candles, fetcher, page_size, seed_candles=None, rsi_length=14, capacity=64):
+        self.candles = candles
+        self._fetcher = fetcher
+        self.page_size = page_size
+        self.seed_candles = seed_candles or config.rsi_seed_candles
+        self.panels = {
+            VBD_TIMEFRAME: _Panel(VBD_TIMEFRAME, 2, capacity),
+            TREND_TIMEFRAME: _Panel(TREND_TIMEFRAME, 2, capacity),
+        }
+        self.rsi = _WilderPanel(rsi_length, capacity)
+        self._rows = {}
+        self._lock = threading.Lock()
+        candles.on_close(self._on_close)
+
+    def _row(self, symbol):
+        """Row of `symbol` in every panel, added on first use (call with the lock held)."""
+        key = self.candles._key_func(symbol)
+        row = self._rows.get(key)
+        if row is None:
+            row = self._rows[key] = len(self._rows)
+            if row >= len(self.rsi.count):
+                capacity = 2 * len(self.rsi.count)
+                for panel in self.panels.values():
+                    panel.grow(capacity)
+                self.rsi.grow(capacity)
+        return row
+
+    def refresh(self, symbol, timeframes=(VBD_TIMEFRAME, RSI_TIMEFRAME)):
+        """
+        Brings one symbol's candles up to date. Network-bound, so run it on the scan workers; it
+        downloads nothing while no candle of `timeframes` has closed since the last refresh.
+        """
+        now = time.time()
+        for timeframe in timeframes:
+            if timeframe == RSI_TIMEFRAME:
+                self._refresh_rsi(symbol, now)
+            else:
+                self._refresh_panel(self.panels[timeframe], symbol, now)
+
+    def _refresh_panel(self, panel, symbol, now):
+        with self._lock:
+            row = self._row(symbol)
+            panel.advance(now)
+            if panel.has_forming(row):
+                return
+        rows = self.candles.rows(symbol, panel.timeframe, panel.bars)
+        if rows:
+            with self._lock:
+                panel.advance(time.time())
+                panel.write(row, rows)
+
+    def _refresh_rsi(self, symbol, now):
+        with self._lock:
+            row = self._row(symbol)
+            seeded = self.rsi.count[row] > 0
+            last_ts = int(self.rsi.last_ts[row])
+        tf_sec = TIMEFRAME_SECONDS[RSI_TIMEFRAME]
+        # Closed candles after the last one averaged
+        missed = (int(now) // tf_sec * tf_sec - last_ts) // tf_sec - 1
+        reseed = False
+        if not seeded:
+            rows = closed_history(self._fetcher, symbol, RSI_TIMEFRAME, self.seed_candles, self.page_size)
+        elif missed == 1:
+            # A newer candle has closed: the cache downloads only that one (and notifies _on_close)
+            rows = (self.candles.rows(symbol, RSI_TIMEFRAME, 2) or [])[:-1]
+        elif missed > 1:
+            # Not scanned for a while, so no close notifications: average every missed candle, one Wilder
+            # step each. The extra candle must reach back to the stored state, else the row is reseeded
+            rows = closed_history(self._fetcher, symbol, RSI_TIMEFRAME, missed + 1, self.page_size)
+            if rows and rows[0][0] > last_ts:
+                rows = closed_history(self._fetcher, symbol, RSI_TIMEFRAME, self.seed_candles, self.page_size)
+                reseed = True
+        else:
+            return
+        with self._lock:
+            if reseed:
+                self.rsi.reset(row)
+            for ts, _, _, _, close, _ in rows:
+                self.rsi.update(row, ts, close)
+
+    def _on_close(self, key, timeframe, rows):
+        if timeframe != RSI_TIMEFRAME:
+            return
+        with self._lock:
+            row = self._rows.get(key)
+            # Rows start from the seed history, never from a stray notification
+            if row is None or not self.rsi.count[row]:
+                return
+            for ts, _, _, _, close, _ in rows:
+                self.rsi.update(row, ts, close)
+
+    def trend_changes(self, symbols, prices):
+        """Change of each symbol's current price vs its previous 4h close (NaN when not tracked on 4h)."""
+        with self._lock:
+            panel = self.panels[TREND_TIMEFRAME]
+            panel.advance(time.time())
+            rows = np.array([self._row(symbol) for symbol in symbols], dtype=np.int64)
+            prev_close = panel.data[3, rows, -2]
+        price = np.array([prices.get(symbol) or np.nan for symbol in symbols], dtype=float)
+        return price / prev_close - 1
+
+    def breakout_candidates(self, targets, prices, k, rsi_max, trend_symbol='BTC/KRW', drop_pct=BTC_DUMP_PCT):
+        """
+        Phase C for `targets` [(rank idx, symbol)] in one pass over `prices` {symbol: current price}.
+        Returns [(idx, symbol, price, target price, rsi)] for symbols at or above their VBD target
+        with RSI below `rsi_max`, or [] while `trend_symbol` is `drop_pct` or more below its last 4h close.
+        """
+        if not targets:
+            return []
+        symbols = [symbol for _, symbol in targets]
+        price = np.array([prices.get(symbol) or np.nan for symbol in symbols], dtype=float)
+        with self._lock:
+            panel = self.panels[VBD_TIMEFRAME]
+            panel.advance(time.time())
+            rows = np.array([self._row(symbol) for symbol in symbols], dtype=np.int64)
+            target = panel.data[0, rows, -1] + (panel.data[1, rows, -2] - panel.data[2, rows, -2]) * k
+            rsi = self.rsi.values(rows, price)
+        # Without enough history the RSI filter is neutral (50)
+        rsi = np.where(np.isnan(rsi), 50.0, rsi)
+        with np.errstate(invalid='ignore'):
+            breakout = np.flatnonzero(price >= target)
+        if not len(breakout):
+            return []
+
+        change = self.trend_changes([trend_symbol], prices)[0]
+        if change <= drop_pct:
+            logger.warning(f"🚨 [Macro Filter] BTC 4H Dumping Detected ({change * 100:.2f}%). "
+                           f"Buy cancelled for {[symbols[i] for i in breakout]}.")
+            return []
+
+        candidates = []
+        for i in breakout:
+            idx, symbol = targets[i]
+            if rsi[i] >= rsi_max:
+                logger.info(f"[{symbol}] Skipped: RSI={rsi[i]:.1f} (Overbought). Avoiding top-chasing.")
+                continue
+            logger.info(f"[{symbol}] Breakout Candidate! Price {price[i]:,} >= Target {target[i]:,} (Rank #{idx+1}, RSI={rsi[i]:.1f})")
+            candidates.append((idx, symbol, float(price[i]), float(target[i]), float(rsi[i])))
+        return candidates
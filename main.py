@@ -1,6 +1,13 @@
+import sys
+from startup_profile import profiler
+# --profile-startup: time every module import from here on (report printed after init)
+if "--profile-startup" in sys.argv:
+    profiler.install()
+
 import time
+import threading
 import schedule
-import pyupbit
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from rich.panel import Panel
 from config import config
@@ -8,9 +15,15 @@ from logger import logger
 from exchange_api import get_exchange_api
 from ai_advisor import AIAdvisor
 from strategy_vbd import StrategyVBD
-from database import record_trade, save_open_positions, load_open_positions
-from auto_optimizer import run_optimizer
+from database import save_open_positions, load_open_positions, positions_batch
+import trade_ledger
+import candidate_scorer
+from auto_optimizer import run_optimizer, apply_pending_params, OPTIMIZER_SLOTS
 from market_filter import MarketFilter
+from market_stream import MarketStream
+from indicators import VBD_TIMEFRAME, RSI_TIMEFRAME, TREND_TIMEFRAME
+from http_client import http
+from rate_limiter import budget, RequestShed, PRIORITY_CRITICAL, PRIORITY_DISCOVERY
 
 console = Console()
 
@@ -19,6 +32,21 @@ console = Console()
 positions = {}
 cooldowns = {} # Tracks sell timestamps to prevent immediate re-entry
 
+# Phase A runs from both the scan loop and the market stream thread
+positions_lock = threading.RLock()
+sell_retry_after = {} # symbol -> earliest time to retry a failed stop sell
+pending_orders = {} # symbol -> {'side', 'buy_price'} for orders the order manager is still working
+SELL_RETRY_BACKOFF_SEC = 10
+
+# Real-time ticker/trade websocket feed (None when disabled)
+market_stream = None
+
+# Phase C worker pool (created on first scan)
+_scan_executor = None
+
+# Background auto-optimizer run (None until the first slot)
+_optimizer_thread = None
+
 # Top coins cache (refreshed every TOP_COINS_REFRESH_MIN minutes)
 _cached_top_coins = []
 _top_coins_last_update = 0
@@ -33,7 +61,7 @@ def sync_positions_with_exchange(exchange_api):
     global positions
     
     try:
-        balances = exchange_api.exchange.fetch_balance()
+        balances = exchange_api.fetch_all_balances()
         free_balances = balances.get('free', {})
         total_balances = balances.get('total', {})
         
@@ -45,7 +73,7 @@ def sync_positions_with_exchange(exchange_api):
                 actual_amount = float(total_balances.get(base_ticker, 0.0))
             
             current_price = exchange_api.fetch_current_price(sym)
-            if not current_price or (actual_amount * current_price) < 5000:
+            if not current_price or (actual_amount * current_price) < exchange_api.markets.min_notional(sym):
                 logger.info(f"  [Sync] Removed [{sym}] (sold or dust).")
                 del positions[sym]
             else:
@@ -61,11 +89,11 @@ def sync_positions_with_exchange(exchange_api):
                 continue
             
             symbol = f"{currency}/KRW"
-            if symbol in positions:
+            if symbol in positions or symbol in pending_orders:
                 continue
             
             current_price = exchange_api.fetch_current_price(symbol)
-            if current_price and (amount * current_price) > 5000:
+            if current_price and (amount * current_price) > exchange_api.markets.min_notional(symbol):
                 positions[symbol] = {
                     'buy_price': current_price,
                     'highest_price': current_price,
@@ -78,6 +106,156 @@ def sync_positions_with_exchange(exchange_api):
     except Exception as e:
         logger.error(f"Failed to sync positions with exchange: {e}")
 
+def open_position(symbol, buy_price, amount, features=None):
+    positions[symbol] = {
+        'buy_price': buy_price,
+        'highest_price': buy_price,
+        'amount': amount,
+        'buy_time': time.time()
+    }
+    if features:
+        # 매수 시점의 후보 특징값 → 매도 시 거래 기록에 함께 저장 (candidate_scorer 학습 데이터)
+        positions[symbol]['features'] = features
+    logger.info(f"[{symbol}] Position Opened successfully.")
+    save_open_positions(positions)
+
+def close_position(symbol, buy_price, sell_price, amount):
+    trade_ledger.record_trade(symbol, buy_price, sell_price, amount, positions.get(symbol, {}).get('features'))
+    positions.pop(symbol, None)
+    cooldowns[symbol] = time.time()
+    logger.info(f"[{symbol}] Position cleared & Added to 3-hour cooldown.")
+    save_open_positions(positions)
+
+def on_order_done(symbol, order):
+    """Order manager callback (order-manager thread): applies the final fill of a background order."""
+    with positions_lock:
+        info = pending_orders.pop(symbol, {})
+        if order.side == 'BUY':
+            if order.result:
+                logger.info(f"[{symbol}] Buy filled ({order.result['result']}): {order.filled_qty} @ ~{order.avg_price:,.2f}")
+                open_position(symbol, order.avg_price, order.filled_qty, info.get('features'))
+            else:
+                logger.warning(f"[{symbol}] Buy order was not filled. No position opened.")
+        else:
+            if order.result:
+                buy_price = positions.get(symbol, {}).get('buy_price', info.get('buy_price'))
+                close_position(symbol, buy_price, order.avg_price, order.filled_qty)
+            else:
+                # 틱마다 매도 재시도가 몰리지 않도록 잠시 대기
+                sell_retry_after[symbol] = time.time() + SELL_RETRY_BACKOFF_SEC
+                logger.warning(f"[{symbol}] Sell order failed. Keeping in memory to retry on next tick.")
+
+def sell_position(exchange_api, symbol, current_price, fail_message):
+    """Sends the stop sell that manage_position decided (the symbol is already in pending_orders).
+    Call it *without* positions_lock: the balance lookup and order placement are blocking REST calls.
+    Coinone chases the fill in the background (result 'pending', cleared by on_order_done);
+    immediate results (Upbit, dry run, dust) close the position right away."""
+    with positions_lock:
+        pos = dict(positions.get(symbol, {}))
+        buy_price = pos.get('buy_price', pending_orders.get(symbol, {}).get('buy_price'))
+    base_ticker = symbol.split('/')[0] if '/' in symbol else symbol.split('-')[1]
+    order_result = None
+    amount_to_sell = 0
+    try:
+        amount_to_sell = exchange_api.fetch_balance(base_ticker) if not config.dry_run else pos.get('amount', 0)
+        order_result = exchange_api.place_market_sell_order(symbol, amount_to_sell, on_done=lambda order: on_order_done(symbol, order))
+    except Exception as e:
+        logger.error(f"[{symbol}] Exception sending sell order: {e}")
+
+    with positions_lock:
+        if order_result and order_result.get('result') == 'pending':
+            logger.info(f"[{symbol}] Sell order working (ID: {order_result['orderId']}). Position clears on fill.")
+            return
+        pending_orders.pop(symbol, None)
+        if order_result:
+            close_position(symbol, buy_price, current_price, amount_to_sell)
+        else:
+            # 틱마다 매도 재시도가 몰리지 않도록 잠시 대기
+            sell_retry_after[symbol] = time.time() + SELL_RETRY_BACKOFF_SEC
+            logger.warning(f"[{symbol}] {fail_message} Keeping in memory to retry on next tick.")
+
+def manage_position(exchange_api, market_filter, symbol, current_price):
+    """Phase A stop logic for one held position at `current_price` (adaptive trailing / hard / time stop).
+    Called from the 1-minute scan and from every market stream tick; caller must hold positions_lock.
+    A triggered stop marks the symbol as a pending SELL and returns the sell's failure message: the
+    caller then releases the lock and calls sell_position. Returns None when nothing fires."""
+    if symbol not in positions:
+        return
+    if symbol in pending_orders:
+        return # 매도 주문이 주문 관리자에서 처리 중
+    if time.time() < sell_retry_after.get(symbol, 0):
+        return
+    fg_score = market_filter.fear_greed_score
+
+    pos = positions[symbol]
+    buy_price = pos['buy_price']
+    highest_price = max(pos['highest_price'], current_price)
+    positions[symbol]['highest_price'] = highest_price
+
+    profit_pct_now = ((current_price - buy_price) / buy_price) * 100
+
+    # === 적응형 트레일링 스탑 ===
+    # 기본: 고점 대비 config.trailing_stop_pct (3%) 하락 시 매도
+    trailing_pct = config.trailing_stop_pct
+
+    # [이익 잠금] +3% 이상 수익 중이면 트레일링을 1.5%로 타이트하게 조여서 이익을 지킴
+    if profit_pct_now >= 3.0:
+        trailing_pct = 0.015  # 1.5%
+    # [초과 수익 보호] +6% 이상이면 더 강하게 1%로 조임
+    if profit_pct_now >= 6.0:
+        trailing_pct = 0.01   # 1%
+
+    drop_threshold = highest_price * (1.0 - trailing_pct)
+
+    # [Tier 2 Macro Filter]: If Panic mode, sell immediately
+    if market_filter.news_panic_flag:
+        logger.critical(f"🚨 [{symbol}] PANIC SELL TRIGGERED BY GLOBAL NEWS! Liquidating position.")
+        drop_threshold = current_price + 99999999
+
+    # === 적응형 하드 스탑 ===
+    # 기본: 진입가 대비 -HARD_STOP_PCT (3%)
+    # 하락장(F&G ≤ 40): -HARD_STOP_FEAR_PCT (2%)로 더 빡빡하게
+    hard_stop_pct = config.hard_stop_fear_pct if fg_score <= 40 else config.hard_stop_pct
+    hard_stop = buy_price * (1.0 - hard_stop_pct)
+
+    if current_price <= drop_threshold or current_price <= hard_stop:
+        profit_pct = ((current_price - buy_price) / buy_price) * 100
+        stop_type = "TRAILING" if current_price <= drop_threshold else "HARD"
+        logger.info(f"[{symbol}] {stop_type} STOP Triggered! Selling at {current_price:,} KRW (Buy: {buy_price:,}). PNL: {profit_pct:.2f}%")
+
+        pending_orders[symbol] = {'side': 'SELL', 'buy_price': buy_price}
+        return "Sell order failed or partially filled."
+
+    # Time-Stop: 12시간 보유 초과 시 청산
+    elif (time.time() - pos.get('buy_time', time.time())) > 43200:
+        profit_pct = ((current_price - buy_price) / buy_price) * 100
+        logger.info(f"[{symbol}] ⏰ TIME-STOP Triggered! Held over 12 hours. Selling at {current_price:,} KRW. PNL: {profit_pct:.2f}%")
+
+        pending_orders[symbol] = {'side': 'SELL', 'buy_price': buy_price}
+        return "Time-stop sell order failed."
+
+
+def handle_price_tick(exchange_api, market_filter, symbol, price):
+    """Market stream callback: runs the Phase A stop logic on every tick of a held symbol."""
+    if symbol not in positions:
+        return
+    try:
+        with budget.priority(PRIORITY_CRITICAL):
+            with positions_lock:
+                sell = manage_position(exchange_api, market_filter, symbol, price)
+            if sell:
+                sell_position(exchange_api, symbol, price, sell)
+    except Exception as e:
+        logger.error(f"Error managing position for {symbol} on tick: {e}")
+
+def raise_highest_price(symbol, high):
+    """Market stream backfill: lifts a held position's running high to a price reached while the stream
+    was down. No stop check here: `high` is no longer the current price (the next tick checks the stops)."""
+    with positions_lock:
+        pos = positions.get(symbol)
+        if pos is not None and high > pos['highest_price']:
+            pos['highest_price'] = high
+
 def get_cached_top_coins(strategy):
     """Returns top volume coins with caching (default: refresh every 10 min)."""
     global _cached_top_coins, _top_coins_last_update
@@ -91,94 +269,106 @@ def get_cached_top_coins(strategy):
     
     return _cached_top_coins
 
+def manage_open_positions(exchange_api, market_filter):
+    """Runs the Phase A stop logic once for every held position at the current snapshot price."""
+    for symbol in list(positions.keys()):
+        try:
+            with budget.priority(PRIORITY_CRITICAL):
+                current_price = exchange_api.fetch_current_price(symbol)
+            if not current_price:
+                continue
+
+            with budget.priority(PRIORITY_CRITICAL):
+                with positions_lock:
+                    sell = manage_position(exchange_api, market_filter, symbol, current_price)
+                if sell:
+                    sell_position(exchange_api, symbol, current_price, sell)
+
+        except Exception as e:
+            logger.error(f"Error managing position for {symbol}: {e}")
+
+def get_scan_executor():
+    """Shared thread pool for the Phase C breakout scan (SCAN_CONCURRENCY workers)."""
+    global _scan_executor
+    if _scan_executor is None:
+        _scan_executor = ThreadPoolExecutor(max_workers=config.scan_concurrency, thread_name_prefix="scan")
+    return _scan_executor
+
+def refresh_scan_symbol(exchange_api, symbol, timeframes):
+    """Phase C candle refresh for one symbol (runs on a scan worker thread). Returns False when postponed or failed."""
+    try:
+        with budget.priority(PRIORITY_DISCOVERY):
+            exchange_api.universe.refresh(symbol, timeframes)
+        return True
+    except RequestShed:
+        logger.info(f"[{symbol}] Scan postponed: request budget reserved for stop checks and orders.")
+    except Exception as e:
+        logger.error(f"Error scanning symbol {symbol}: {e}")
+    return False
+
+def start_optimizer(exchange_api):
+    """Runs the auto-optimizer in the background (a parameter sweep can take minutes); one run at a time."""
+    global _optimizer_thread
+    if _optimizer_thread and _optimizer_thread.is_alive():
+        logger.warning("Auto-optimizer still running from the previous slot. Skipped.")
+        return
+    _optimizer_thread = threading.Thread(target=run_optimizer, args=(exchange_api,), name="auto-optimizer", daemon=True)
+    _optimizer_thread.start()
+
+def log_cycle_stats(exchange_api, ai_advisor=None):
+    """Logs how many chart requests the candle cache saved this cycle, REST latency per endpoint, request budget pressure and Gemini latency."""
+    stats = exchange_api.candles.stats(reset=True)
+    logger.info(f"[Perf] Candle cache: {stats['hits']} hits / {stats['requests']} requests "
+                f"(cold {stats['misses']}, boundary {stats['incremental']}, forming {stats['forming_refreshes']})")
+    
+    endpoints = sorted(http.stats(reset=True).items(), key=lambda x: x[1]['count'] * x[1]['avg_ms'], reverse=True)
+    if endpoints:
+        summary = ", ".join(f"{name} x{s['count']} avg {s['avg_ms']:.0f}ms {s['bytes']/1024:.0f}KB" for name, s in endpoints[:5])
+        logger.info(f"[Perf] HTTP: {summary}")
+    
+    budget_stats = budget.stats(reset=True)
+    if budget_stats['shed'] or budget_stats['waited'] or budget_stats['throttled']:
+        logger.info(f"[Perf] Request budget: shed {budget_stats['shed']}, waited {budget_stats['waited']}, "
+                    f"429s {budget_stats['throttled']}, available/sec {budget_stats['available']}")
+    
+    if ai_advisor is not None and ai_advisor.active:
+        ai_stats = {kind: s for kind, s in ai_advisor.latency.stats(reset=True).items() if s['calls'] or s['timeouts']}
+        if ai_stats:
+            summary = ", ".join(f"{kind} x{s['calls']} p50 {s['p50_ms']:.0f}ms p90 {s['p90_ms']:.0f}ms p99 {s['p99_ms']:.0f}ms late {s['timeouts']}"
+                                for kind, s in sorted(ai_stats.items()))
+            logger.info(f"[Perf] Gemini: {summary} (spacing {ai_advisor.limiter.stats()['interval']:.1f}s)")
+
+def ledger_status_line():
+    """Dashboard line with the trade ledger's rolling 24h stats."""
+    day = trade_ledger.stats('1d')
+    color = "green" if day['net_pnl'] >= 0 else "red"
+    return (f"[bold cyan]24h Trades:[/bold cyan] [white]{day['trades']}[/white] (win [white]{day['win_rate']:.0%}[/white])  |  "
+            f"[bold cyan]Net:[/bold cyan] [{color}]{day['net_pnl']:+,.0f}[/{color}] 원 (fee {day['fees']:,.0f})")
+
 def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
     logger.info("--- Starting VBD + AI Scan Cycle ---")
     
+    # 매 사이클 시작 시 전체 시세를 1회 벌크 조회 → 이번 사이클의 모든 가격 조회는 이 스냅샷에서 처리
+    exchange_api.prices.refresh(force=True)
+    
     # 0. 매 사이클마다 거래소 실잔고와 동기화
-    sync_positions_with_exchange(exchange_api)
+    with positions_lock:
+        sync_positions_with_exchange(exchange_api)
     
     # 1. Top Volume Coins (캐싱, 기본 10분마다 갱신)
     top_coins = get_cached_top_coins(strategy)
     fg_score = market_filter.fear_greed_score
     
+    # 보유 + 감시 종목을 실시간 스트림 구독 목록에 반영
+    if market_stream:
+        market_stream.set_symbols(list(positions.keys()), watched=top_coins)
+    
     # ===================================================================
     # PHASE A: 기존 포지션 관리 (손절/익절/타임스탑)
     # V4.1: 적응형 트레일링 스탑 — 하락장에서는 더 빡빡하게, 수익 중이면 이익 잠금
+    # (마켓 스트림이 켜져 있으면 같은 로직이 틱마다도 실행됨 → handle_price_tick)
     # ===================================================================
-    for symbol in list(positions.keys()):
-        try:
-            current_price = exchange_api.fetch_current_price(symbol)
-            if not current_price:
-                continue
-
-            pos = positions[symbol]
-            buy_price = pos['buy_price']
-            highest_price = max(pos['highest_price'], current_price)
-            positions[symbol]['highest_price'] = highest_price
-            
-            profit_pct_now = ((current_price - buy_price) / buy_price) * 100
-            
-            # === 적응형 트레일링 스탑 ===
-            # 기본: 고점 대비 config.trailing_stop_pct (3%) 하락 시 매도
-            trailing_pct = config.trailing_stop_pct
-            
-            # [이익 잠금] +3% 이상 수익 중이면 트레일링을 1.5%로 타이트하게 조여서 이익을 지킴
-            if profit_pct_now >= 3.0:
-                trailing_pct = 0.015  # 1.5%
-            # [초과 수익 보호] +6% 이상이면 더 강하게 1%로 조임
-            if profit_pct_now >= 6.0:
-                trailing_pct = 0.01   # 1%
-            
-            drop_threshold = highest_price * (1.0 - trailing_pct)
-            
-            # [Tier 2 Macro Filter]: If Panic mode, sell immediately
-            if market_filter.news_panic_flag:
-                logger.critical(f"🚨 [{symbol}] PANIC SELL TRIGGERED BY GLOBAL NEWS! Liquidating position.")
-                drop_threshold = current_price + 99999999
-
-            # === 적응형 하드 스탑 ===
-            # 기본: 진입가 대비 -3%
-            # 하락장(F&G ≤ 40): -2%로 더 빡빡하게
-            hard_stop_pct = 0.02 if fg_score <= 40 else 0.03
-            hard_stop = buy_price * (1.0 - hard_stop_pct)
-            
-            if current_price <= drop_threshold or current_price <= hard_stop:
-                profit_pct = ((current_price - buy_price) / buy_price) * 100
-                stop_type = "TRAILING" if current_price <= drop_threshold else "HARD"
-                logger.info(f"[{symbol}] {stop_type} STOP Triggered! Selling at {current_price:,} KRW (Buy: {buy_price:,}). PNL: {profit_pct:.2f}%")
-                
-                base_ticker = symbol.split('/')[0] if '/' in symbol else symbol.split('-')[1]
-                amount_to_sell = exchange_api.fetch_balance(base_ticker) if not config.dry_run else pos.get('amount', 0)
-                order_result = exchange_api.place_market_sell_order(symbol, amount_to_sell)
-                
-                if order_result:
-                    record_trade(symbol, buy_price, current_price, amount_to_sell)
-                    del positions[symbol]
-                    cooldowns[symbol] = time.time()
-                    logger.info(f"[{symbol}] Position cleared & Added to 3-hour cooldown.")
-                    save_open_positions(positions)
-                else:
-                    logger.warning(f"[{symbol}] Sell order failed or partially filled. Keeping in memory to retry on next tick.")
-            
-            # Time-Stop: 12시간 보유 초과 시 청산
-            elif (time.time() - pos.get('buy_time', time.time())) > 43200:
-                profit_pct = ((current_price - buy_price) / buy_price) * 100
-                logger.info(f"[{symbol}] ⏰ TIME-STOP Triggered! Held over 12 hours. Selling at {current_price:,} KRW. PNL: {profit_pct:.2f}%")
-                
-                base_ticker = symbol.split('/')[0] if '/' in symbol else symbol.split('-')[1]
-                amount_to_sell = exchange_api.fetch_balance(base_ticker) if not config.dry_run else pos.get('amount', 0)
-                order_result = exchange_api.place_market_sell_order(symbol, amount_to_sell)
-                
-                if order_result:
-                    record_trade(symbol, buy_price, current_price, amount_to_sell)
-                    del positions[symbol]
-                    cooldowns[symbol] = time.time()
-                    save_open_positions(positions)
-                else:
-                    logger.warning(f"[{symbol}] Time-stop sell order failed. Keeping in memory to retry on next tick.")
-
-        except Exception as e:
-            logger.error(f"Error managing position for {symbol}: {e}")
+    manage_open_positions(exchange_api, market_filter)
 
     # ===================================================================
     # PHASE B: 4-Tier F&G 기반 자산 배분 시스템
@@ -222,7 +412,7 @@ def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
     krw_avail = get_current_real_balance(exchange_api, "KRW") or 0
     total_coin_value = 0
     if positions:
-        for sym, pos in positions.items():
+        for sym, pos in list(positions.items()):
             cur_p = exchange_api.fetch_current_price(sym) or pos['buy_price']
             total_coin_value += cur_p * pos.get('amount', 0)
             
@@ -239,50 +429,39 @@ def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
     # ===================================================================
     # PHASE C: 돌파 후보 수집 (매수 즉시 실행 X, 리스트에 모으기)
     # ===================================================================
-    breakout_candidates = []
-    
+    # 보유/패닉/쿨다운 필터는 메인 스레드에서 먼저 처리하고, 네트워크 조회만 병렬로 분산
+    scan_targets = []
     for idx, symbol in enumerate(top_coins):
-        try:
-            if symbol in positions:
-                continue
-            if market_filter.news_panic_flag:
-                continue
-            
-            # 쿨다운 체크
-            if symbol in cooldowns:
-                elapsed = time.time() - cooldowns[symbol]
-                if elapsed < 10800:
-                    continue
-                else:
-                    del cooldowns[symbol]
-            
-            current_price = exchange_api.fetch_current_price(symbol)
-            if not current_price:
-                continue
-            
-            # VBD 15m 돌파 체크
-            df_15m = exchange_api.fetch_ohlcv(symbol, timeframe='15m', limit=2)
-            if df_15m is None or len(df_15m) < 2:
+        if symbol in positions or symbol in pending_orders:
+            continue
+        if market_filter.news_panic_flag:
+            continue
+        
+        # 쿨다운 체크
+        if symbol in cooldowns:
+            elapsed = time.time() - cooldowns[symbol]
+            if elapsed < 10800:
                 continue
-            
-            target_price = strategy.get_breakout_target(df_15m)
-            
-            if target_price and current_price >= target_price:
-                if market_filter.check_btc_trend() == "DUMPING":
-                    logger.warning(f"[{symbol}] Buy cancelled due to BTC 4H Dumping Trend.")
-                    continue
-                
-                # RSI 과열 필터: RSI ≥ 75면 이미 과매수 → 고점 추격 방지
-                rsi = strategy.get_rsi(symbol)
-                if rsi >= 75:
-                    logger.info(f"[{symbol}] Skipped: RSI={rsi:.1f} (Overbought). Avoiding top-chasing.")
-                    continue
-                
-                breakout_candidates.append((idx, symbol, current_price, target_price, rsi))
-                logger.info(f"[{symbol}] Breakout Candidate! Price {current_price:,} >= Target {target_price:,} (Rank #{idx+1}, RSI={rsi:.1f})")
+            else:
+                del cooldowns[symbol]
         
-        except Exception as e:
-            logger.error(f"Error scanning symbol {symbol}: {e}")
+        scan_targets.append((idx, symbol))
+    
+    # 요청 한도가 예비분 아래로 떨어지면 이번 사이클 탐색은 연기 (손절/주문용 여유분 확보)
+    if scan_targets and not budget.discovery_allowed('chart'):
+        logger.info(f"[Budget] Chart request budget low. Postponing breakout scan of {len(scan_targets)} symbols to next cycle.")
+        scan_targets = []
+    
+    # 네트워크 조회(마감된 캔들만)는 병렬로, VBD 목표가/RSI/BTC 추세 판정은 전체 종목을 한 번에 벡터 연산
+    executor = get_scan_executor()
+    refresh_jobs = [(symbol, (VBD_TIMEFRAME, RSI_TIMEFRAME)) for _, symbol in scan_targets]
+    if scan_targets:
+        refresh_jobs.append(('BTC/KRW', (TREND_TIMEFRAME,)))
+    refreshed = list(executor.map(lambda job: refresh_scan_symbol(exchange_api, *job), refresh_jobs))
+    scan_targets = [target for target, ok in zip(scan_targets, refreshed) if ok]
+    prices = {symbol: exchange_api.fetch_current_price(symbol) for _, symbol in scan_targets}
+    prices['BTC/KRW'] = exchange_api.fetch_current_price('BTC/KRW')
+    breakout_candidates = exchange_api.universe.breakout_candidates(scan_targets, prices, config.vbd_k, config.rsi_max)
     
     # ===================================================================
     # PHASE D: 우선순위 매수 실행 (거래량 상위 코인부터 균등 배분)
@@ -295,6 +474,7 @@ def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
         status_text = f"[bold cyan]Fear & Greed:[/bold cyan] [{fg_color}]{fg_score} ({fg_mode_name})[/{fg_color}]\n"
         status_text += f"[bold cyan]Slots:[/bold cyan] [white]{len(positions)}[/white] / [white]{effective_max_positions}[/white]  |  [bold cyan]Cap/Coin:[/bold cyan] [white]{max_alloc_cap:,}[/white] KRW\n"
         status_text += f"[bold cyan]KRW Balance:[/bold cyan] [green]{krw_now:,.0f}[/green] 원  |  [bold cyan]Reserve:[/bold cyan] [yellow]{reserve_pct}%[/yellow]\n"
+        status_text += ledger_status_line() + "\n"
         status_text += "[dim]No breakout candidates this cycle.[/dim]"
         console.print(Panel(status_text, title="[bold magenta]📊 Scan Cycle Complete[/bold magenta]", expand=False))
         return
@@ -302,15 +482,27 @@ def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
     breakout_candidates.sort(key=lambda x: x[0])
     logger.info(f"📊 {len(breakout_candidates)} candidates found. Processing buys...")
     
+    # 확실한 후보는 로컬 점수 모델이 즉시 승인/거부, 애매한 후보만 AI에 한 번의 요청으로 질문 (응답 대기는 AI_DEADLINE_SEC까지)
+    pending_buys = sum(1 for o in pending_orders.values() if o['side'] == 'BUY')
+    ai_decisions = {}
+    candidate_features = {}
+    if effective_max_positions - len(positions) - pending_buys > 0:
+        btc_change = exchange_api.universe.trend_changes(['BTC/KRW'], prices)[0]
+        ai_decisions, borderline, candidate_features = candidate_scorer.triage(breakout_candidates, btc_change)
+        if borderline:
+            ai_decisions.update(ai_advisor.analyze_breakouts(borderline, config.vbd_k))
+    
     for rank_index, symbol, current_price, target_price, rsi in breakout_candidates:
         try:
-            remaining_slots = effective_max_positions - len(positions)
+            pending_buys = sum(1 for o in pending_orders.values() if o['side'] == 'BUY')
+            remaining_slots = effective_max_positions - len(positions) - pending_buys
             if remaining_slots <= 0:
                 break
             
             # 매수 전 가용 현금 재확인
+            min_order_krw = exchange_api.markets.min_order_krw(symbol)
             krw_avail = get_current_real_balance(exchange_api, "KRW")
-            if krw_avail is None or krw_avail < 5500:
+            if krw_avail is None or krw_avail < min_order_krw:
                 logger.info(f"[{symbol}] Skipped: Insufficient KRW ({krw_avail:,.0f}). Cannot proceed.")
                 break
             
@@ -318,30 +510,29 @@ def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
             allocate_amount = min(max_alloc_cap, int(krw_avail * 0.99))
             
             # 최소 주문 금액 보정
-            if allocate_amount < 5500:
-                # 할당량이 거래소 최소 기준치(5500원) 미만이면 무리하게 남은 잔고를 끌어쓰지 않고 스킵 (예방적 예비비 초과 방지)
-                logger.info(f"[{symbol}] Skipped: Ideal allocation ({allocate_amount:,.0f}) is below exchange minimum (5500 KRW). Reserved.")
+            if allocate_amount < min_order_krw:
+                # 할당량이 거래소 최소 기준치(최소 주문금액 + 10%) 미만이면 무리하게 남은 잔고를 끌어쓰지 않고 스킵 (예방적 예비비 초과 방지)
+                logger.info(f"[{symbol}] Skipped: Ideal allocation ({allocate_amount:,.0f}) is below exchange minimum ({min_order_krw:,.0f} KRW). Reserved.")
                 continue
             
             # AI 필터링
-            approved, context = ai_advisor.analyze_breakout(symbol, current_price, target_price, config.vbd_k, rank_index + 1, rsi)
+            approved, context = ai_decisions.get(symbol) or ai_advisor.analyze_breakout(
+                symbol, current_price, target_price, config.vbd_k, rank_index + 1, rsi)
             
             if approved:
                 logger.info(f"[{symbol}] AI Approved (Rank #{rank_index+1}): {context[-50:]}")
                 logger.info(f"[{symbol}] Buying with Equal Allocation: {allocate_amount:,.0f} KRW")
-                order = exchange_api.place_market_buy_order(symbol, allocate_amount)
-                
-                if order:
-                    bought_amount = (allocate_amount * 0.9995) / current_price if config.dry_run else allocate_amount / current_price
+                with positions_lock:
+                    order = exchange_api.place_market_buy_order(
+                        symbol, allocate_amount, on_done=lambda o, symbol=symbol: on_order_done(symbol, o))
                     
-                    positions[symbol] = {
-                        'buy_price': current_price,
-                        'highest_price': current_price,
-                        'amount': bought_amount,
-                        'buy_time': time.time()
-                    }
-                    logger.info(f"[{symbol}] Position Opened successfully.")
-                    save_open_positions(positions)
+                    if order and order.get('result') == 'pending':
+                        # 코인원: 주문 관리자가 백그라운드에서 체결을 추적, 체결 시 포지션 오픈
+                        pending_orders[symbol] = {'side': 'BUY', 'buy_price': current_price, 'features': candidate_features.get(symbol)}
+                        logger.info(f"[{symbol}] Buy order working (ID: {order['orderId']}). Position opens on fill.")
+                    elif order:
+                        bought_amount = (allocate_amount * 0.9995) / current_price if config.dry_run else allocate_amount / current_price
+                        open_position(symbol, current_price, bought_amount, candidate_features.get(symbol))
             else:
                 logger.info(f"[{symbol}] AI VETOED Trade (Rank #{rank_index+1}): {context[-50:]}")
 
@@ -361,6 +552,7 @@ def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
     status_lines.append(f"[bold cyan]Fear & Greed:[/bold cyan] [{fg_color}]{fg_score} ({fg_mode_name})[/{fg_color}]")
     status_lines.append(f"[bold cyan]Slots:[/bold cyan] [white]{used_slots}[/white] / [white]{effective_max_positions}[/white]  |  [bold cyan]Cap/Coin:[/bold cyan] [white]{max_alloc_cap:,}[/white] KRW")
     status_lines.append(f"[bold cyan]KRW Balance:[/bold cyan] [green]{krw_now:,.0f}[/green] 원  |  [bold cyan]Reserve:[/bold cyan] [yellow]{reserve_pct}%[/yellow]")
+    status_lines.append(ledger_status_line())
     
     if positions:
         pos_table = Table(show_header=True, header_style="bold magenta", expand=False, padding=(0, 1))
@@ -370,7 +562,7 @@ def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
         pos_table.add_column("PNL", justify="right", width=10)
         pos_table.add_column("Held", justify="right", style="dim", width=8)
         
-        for sym, pos in positions.items():
+        for sym, pos in list(positions.items()):
             cur = exchange_api.fetch_current_price(sym) or pos['buy_price']
             raw_pnl = ((cur - pos['buy_price']) / pos['buy_price']) * 100
             net_pnl = raw_pnl - 0.04  # Coinone Open API round-trip fee deduction (0.02% * 2)
@@ -392,7 +584,18 @@ def scan_and_trade(exchange_api, ai_advisor, strategy, market_filter):
         status_text = "\n".join(status_lines)
         console.print(Panel(status_text, title="[bold magenta]📊 Scan Cycle Complete[/bold magenta]", expand=False))
 
+def run_scan_cycle(exchange_api, ai_advisor, strategy, market_filter):
+    """Scheduled entry point: one scan cycle followed by its performance counters."""
+    # 옵티마이저 결과는 사이클 시작 전에만 반영 (한 사이클 안에서 이전/새 파라미터가 섞이지 않도록)
+    apply_pending_params()
+    # 사이클 중 포지션 저장은 모아서 사이클 끝에 한 번만 기록 (변경 없으면 기록 안 함)
+    with positions_batch():
+        scan_and_trade(exchange_api, ai_advisor, strategy, market_filter)
+    log_cycle_stats(exchange_api, ai_advisor)
+
 def main():
+    global market_stream
+    profile_startup = "--profile-startup" in sys.argv
     welcome_msg = f"[bold cyan]AI Fusion Trading Bot + Auto Optimizer (KST)[/bold cyan]\n" \
                   f"Tracking: [yellow]Top {config.coin_count} Coins[/yellow] | Max Hold: [green]{config.max_positions} Coins[/green]\n" \
                   f"VBD K-Value: [magenta]{config.vbd_k}[/magenta] | Target Stop: [red]{config.trailing_stop_pct*100:.1f}%[/red]\n" \
@@ -403,33 +606,67 @@ def main():
     logger.info(f"Starting Engine with Active Exchange: {config.active_exchange}")
     
     try:
-        exchange_api = get_exchange_api()
-        ai_advisor = AIAdvisor()
-        strategy = StrategyVBD(k_value=config.vbd_k)
-        config.validate()
-        
-        # 실제 계좌 원화 잔고 출력
-        krw_real = get_current_real_balance(exchange_api, "KRW")
-        logger.info(f"💰 Current Coinone KRW Balance: {krw_real:,.0f} 원")
+        with profiler.step("exchange init"):
+            exchange_api = get_exchange_api()
+            config.validate()
+
+        # 재시작(크래시 복구) 시 손절 관리부터 재개: 저장된 포지션(매수가/고점) 복원 → 잔고 동기화 → 스톱 체크
+        # 뉴스/F&G/AI 같은 느린 초기화는 손절이 다시 돌아가기 시작한 뒤에 수행
+        with profiler.step("restore positions"):
+            with positions_lock:
+                positions.update(load_open_positions())
+                sync_positions_with_exchange(exchange_api)
 
+        ai_advisor = AIAdvisor()
         market_filter = MarketFilter(ai_advisor, exchange_api)
-        market_filter.update_fear_and_greed() # Run once on boot
-        market_filter.analyze_global_news()   # Run once on boot
 
-        sync_positions_with_exchange(exchange_api)
+        # 실시간 시세 스트림: 보유 포지션의 손절/익절을 1분 폴링이 아닌 틱마다 검사
+        if config.market_stream_enabled:
+            with profiler.step("market stream start"):
+                market_stream = MarketStream(
+                    config.active_exchange,
+                    on_tick=lambda symbol, price: handle_price_tick(exchange_api, market_filter, symbol, price),
+                    exchange_api=exchange_api,
+                    on_high=raise_highest_price,
+                )
+                market_stream.set_symbols(list(positions.keys()))
+                market_stream.start()
 
-        scan_and_trade(exchange_api, ai_advisor, strategy, market_filter)
+        with profiler.step("first stop check"):
+            manage_open_positions(exchange_api, market_filter)
+        logger.info(f"Managing stops for {len(positions)} positions {profiler.elapsed():.2f}s after launch.")
+
+        with profiler.step("strategy init"):
+            strategy = StrategyVBD(k_value=config.vbd_k, exchange_api=exchange_api)
+            # 실제 계좌 원화 잔고 출력
+            krw_real = get_current_real_balance(exchange_api, "KRW")
+            logger.info(f"💰 Current {config.active_exchange} KRW Balance: {krw_real:,.0f} 원")
+
+        with profiler.step("fear & greed"):
+            market_filter.update_fear_and_greed() # Run once on boot
+        with profiler.step("global news"):
+            market_filter.analyze_global_news()   # Run once on boot
+
+        if profile_startup:
+            profiler.uninstall()
+            profiler.report(console)
+            if market_stream:
+                market_stream.stop()
+            return
+
+        run_scan_cycle(exchange_api, ai_advisor, strategy, market_filter)
         
         # Check every 1 minute.
-        schedule.every(1).minutes.do(scan_and_trade, exchange_api, ai_advisor, strategy, market_filter)
+        schedule.every(1).minutes.do(run_scan_cycle, exchange_api, ai_advisor, strategy, market_filter)
         
-        # Auto-Optimizer Schedule: Twice a day (09:00, 21:00 KST)
-        schedule.every().day.at("09:00").do(run_optimizer)
-        schedule.every().day.at("21:00").do(run_optimizer)
+        # Auto-Optimizer Schedule: Twice a day (09:00, 21:00 KST), on its own thread so scans keep running
+        for slot in OPTIMIZER_SLOTS:
+            schedule.every().day.at(slot).do(start_optimizer, exchange_api)
         
         # Market Filter Schedules
         schedule.every().day.at("08:50").do(market_filter.update_fear_and_greed)
-        schedule.every(4).hours.do(market_filter.analyze_global_news)
+        # 뉴스 피드는 자주 확인 (변경 없으면 304 응답, 헤드라인이 바뀔 때만 AI 호출)
+        schedule.every(config.news_check_min).minutes.do(market_filter.analyze_global_news)
         
         logger.info("Entering multi-coin tracking loop. Press Ctrl+C to abort.")
         while True:
@@ -438,6 +675,8 @@ def main():
             
     except KeyboardInterrupt:
         logger.info("Bot manually stopped.")
+        if market_stream:
+            market_stream.stop()
     except Exception as e:
         logger.error(f"Fatal error: {e}")
 
@@ -1,7 +1,9 @@
-import requests
-import feedparser
 import time
+from config import config
 from logger import logger
+from http_client import http
+from ai_advisor import AIDeadlineExceeded
+from news_feed import ConditionalFeed, merge_headlines, headline_digest
 
 class MarketFilter:
     def __init__(self, ai_advisor, exchange_api):
@@ -11,7 +13,11 @@ class MarketFilter:
         # State Flags
         self.fear_greed_score = 50 # Default Neutral
         self.news_panic_flag = False
-        self.last_news_check = 0
+        self.feeds = [ConditionalFeed(url) for url in config.news_feeds]
+        # Hash of the headline set Gemini last judged / is still judging after a missed deadline
+        self._news_digest = None
+        self._pending_digest = None
+        self._last_news_ask = 0
 
     def update_fear_and_greed(self):
         """Tier 1 (Daily): Fetch Fear & Greed Index from CoinMarketCap (Fallback: Alternative.me)"""
@@ -22,7 +28,7 @@ class MarketFilter:
         try:
             url = "https://coinmarketcap.com/charts/fear-and-greed-index/"
             headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-            res = requests.get(url, headers=headers, timeout=10)
+            res = http.get(url, headers=headers, endpoint="cmc.fear_greed")
             if res.status_code == 200:
                 match = re.search(r'"score":(\d+)', res.text)
                 if match:
@@ -34,7 +40,7 @@ class MarketFilter:
 
         # 2. Fallback: Alternative.me
         try:
-            response = requests.get("https://api.alternative.me/fng/?limit=1", timeout=10)
+            response = http.get("https://api.alternative.me/fng/", params={"limit": 1}, endpoint="alternative.fng")
             data = response.json()
             if 'data' in data and len(data['data']) > 0:
                 self.fear_greed_score = int(data['data'][0]['value'])
@@ -46,26 +52,37 @@ class MarketFilter:
             logger.error(f"Error fetching Fear & Greed Index: {e}")
 
     def analyze_global_news(self):
-        """Tier 2 (Every 4H): Fetch CoinDesk RSS and ask Gemini if it's a critical bear market."""
-        # Prevent spamming if called multiple times rapidly
-        if time.time() - self.last_news_check < 3600:
+        """
+        Tier 2 (every NEWS_CHECK_MIN): polls the news feeds with conditional GET, merges and de-duplicates
+        their newest headlines and asks Gemini for a panic verdict only when that headline set changed
+        and NEWS_MIN_REASK_MIN has passed since the last question.
+        """
+        if not self.ai.active:
+            logger.warning("Gemini API not configured. Skipping news analysis.")
             return
-            
+
         try:
-            logger.info("Fetching global crypto news RSS for AI sentiment analysis...")
-            # CoinDesk general news RSS
-            feed = feedparser.parse("https://www.coindesk.com/arc/outboundfeeds/rss/")
-            
-            headlines = []
-            for entry in feed.entries[:7]: # Top 7 latest headlines
-                headlines.append(f"- {entry.title}")
-                
-            news_text = "\n".join(headlines)
-            logger.info(f"Extracted {len(headlines)} global headlines. Sending to Gemini for panic detection...")
+            for feed in self.feeds:
+                try:
+                    feed.poll()
+                except Exception as e:
+                    logger.warning(f"News feed {feed.url} unavailable ({e}). Using its last headlines.")
+            headlines = merge_headlines(self.feeds, config.news_headlines)
+            if not headlines:
+                logger.warning("No news headlines available. Panic flag unchanged.")
+                return
             
-            if not self.ai.client:
-                logger.warning("Gemini API not configured. Skipping news analysis.")
+            digest = headline_digest(headlines)
+            if digest in (self._news_digest, self._pending_digest):
+                logger.info(f"[Macro Filter] Headlines unchanged. Skipping AI news check (panic flag: {self.news_panic_flag}).")
                 return
+            wait_min = config.news_min_reask_min - (time.time() - self._last_news_ask) / 60
+            if wait_min > 0:
+                logger.info(f"[Macro Filter] Headlines changed. Next AI news check in {wait_min:.0f} min (panic flag: {self.news_panic_flag}).")
+                return
+            
+            news_text = "\n".join(f"- {title}" for title in headlines)
+            logger.info(f"Headline set changed ({len(headlines)} headlines from {len(self.feeds)} feeds). Sending to Gemini for panic detection...")
 
             prompt = f"""
 You are an expert cryptocurrency risk manager. Read the following latest global news headlines:
@@ -78,46 +95,35 @@ Note: Routine volatility or minor bad news does not count as critical panic.
 If there is a critical systemic risk detected, reply ONLY with the exact word: CRITICAL_BEAR
 If the market is normal or just experiencing routine news, reply ONLY with the exact word: NORMAL
 """
-            logger.info("Sending headlines to Gemini for panic detection...")
-            response = self.ai.client.models.generate_content(
-                model=self.ai.model_name,
-                contents=prompt
-            )
-            result = response.text.strip().upper()
-            
-            if "CRITICAL_BEAR" in result:
-                self.news_panic_flag = True
-                logger.critical("🚨 [Macro Filter] AI DETECTED CRITICAL MARKET PANIC FROM NEWS. BUY LOCK ACTIVATED! 🚨")
-            else:
-                self.news_panic_flag = False
-                logger.info("[Macro Filter] AI judged current news sentiment as NORMAL.")
-                
-            self.last_news_check = time.time()
+            self._last_news_ask = time.time()
+            response = self.ai.request('news', prompt, config.ai_news_deadline_sec,
+                                       on_late=lambda late: self._apply_news_verdict(late, digest),
+                                       on_late_error=lambda e: self._release_pending(digest))
+            self._apply_news_verdict(response, digest)
             
+        except AIDeadlineExceeded as e:
+            # 응답이 늦으면 현재 판정 유지, 늦게 도착한 응답은 도착 시점에 반영 (같은 헤드라인으로 재질문하지 않음)
+            if e.pending:
+                self._pending_digest = digest
+            logger.warning(f"[Macro Filter] Gemini news check exceeded {config.ai_news_deadline_sec:g}s. Keeping current panic flag ({self.news_panic_flag}).")
         except Exception as e:
             logger.error(f"Error analyzing global news: {e}")
             self.news_panic_flag = False # Fail open (allow trading) if error occurs
 
-    def check_btc_trend(self):
-        """Tier 3 (Every 15m): Check if BTC is dumping significantly on 4H chart."""
-        try:
-            # Fetch 4H candles for BTC/KRW, limit 5 to check recent trend
-            df = self.exchange.fetch_ohlcv('BTC/KRW', timeframe='4h', limit=5)
-            if df is None or len(df) < 2:
-                return "NORMAL"
-                
-            # Compare current close to previous close
-            current_close = df['close'].iloc[-1]
-            prev_close = df['close'].iloc[-2]
-            
-            drop_pct = ((current_close - prev_close) / prev_close) * 100
-            
-            if drop_pct <= -3.0:
-                logger.warning(f"🚨 [Macro Filter] BTC 4H Dumping Detected ({drop_pct:.2f}%). Altcoin purchases paused.")
-                return "DUMPING"
+    def _apply_news_verdict(self, response, digest):
+        result = response.text.strip().upper()
+        
+        if "CRITICAL_BEAR" in result:
+            self.news_panic_flag = True
+            logger.critical("🚨 [Macro Filter] AI DETECTED CRITICAL MARKET PANIC FROM NEWS. BUY LOCK ACTIVATED! 🚨")
+        else:
+            self.news_panic_flag = False
+            logger.info("[Macro Filter] AI judged current news sentiment as NORMAL.")
             
-            return "NORMAL"
-        except Exception as e:
-            logger.error(f"Error checking BTC trend: {e}")
-            return "NORMAL"
+        self._news_digest = digest
+        self._pending_digest = None
 
+    def _release_pending(self, digest):
+        """A late news verdict failed: the headline set can be judged again at the next poll."""
+        if self._pending_digest == digest:
+            self._pending_digest = None
@@ -0,0 +1,202 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+import numpy as np
+from config import config
+from logger import logger
+
+MARKET_CACHE_FILE = "market_cache.json"
+
+# KRW price bands: (band lower bound, tick size). A price uses the tick of the last band it reaches.
+TICK_BANDS = {
+    "COINONE": (
+        (0, 0.0001), (1, 0.001), (10, 0.01), (100, 0.1), (1000, 1.0),
+        (10000, 10.0), (100000, 50.0), (500000, 100.0), (1000000, 500.0), (2000000, 1000.0),
+    ),
+    "UPBIT": (
+        (0, 0.0001), (0.1, 0.001), (1, 0.01), (10, 0.1), (100, 1.0),
+        (1000, 1.0), (10000, 10.0), (100000, 50.0), (500000, 100.0), (1000000, 500.0), (2000000, 1000.0),
+    ),
+}
+
+# Per-exchange defaults for markets the exchange metadata does not describe
+DEFAULT_SPECS = {
+    # Coinone accepts at most 4 decimals of quantity on most pairs
+    "COINONE": {'qty_step': 0.0001, 'min_qty': 0.0001, 'min_notional': 5000.0},
+    "UPBIT": {'qty_step': 0.00000001, 'min_qty': 0.0, 'min_notional': 5000.0},
+}
+
+# Holdings worth less than min_notional × DUST_RATIO cannot be sold and are treated as dust
+DUST_RATIO = {"COINONE": 0.9, "UPBIT": 0.96}
+# New buys need min_notional × SIZING_MARGIN so fees/slippage never push an order under the minimum
+SIZING_MARGIN = 1.1
+
+class _TickTable:
+    """Compiled tick bands: bisect for one price, np.searchsorted for an array of prices."""
+    def __init__(self, bands):
+        self.bounds = [float(b) for b, _ in bands]
+        self.ticks = [float(t) for _, t in bands]
+        self.decimals = [max(0, -int(math.floor(math.log10(t)))) for t in self.ticks]
+        self._bounds_arr = np.array(self.bounds)
+        self._ticks_arr = np.array(self.ticks)
+
+    def tick(self, price):
+        return self.ticks[max(bisect.bisect_right(self.bounds, price) - 1, 0)]
+
+    def floor(self, price):
+        i = max(bisect.bisect_right(self.bounds, price) - 1, 0)
+        tick = self.ticks[i]
+        # Small epsilon so exact multiples like 0.3 / 0.1 don't floor one tick too low
+        return float(round(math.floor(price / tick + 1e-9) * tick, self.decimals[i]))
+
+    def ticks_for(self, prices):
+        idx = np.clip(np.searchsorted(self._bounds_arr, prices, side='right') - 1, 0, None)
+        return self._ticks_arr[idx]
+
+    def floor_array(self, prices):
+        ticks = self.ticks_for(prices)
+        return np.round(np.floor(prices / ticks + 1e-9) * ticks, 8)
+
+class MarketRegistry:
+    """
+    Per-market trading rules for one exchange: tick bands, quantity step and minimum order value.
+    Loaded once from the exchange's public market metadata (`loader()` returning
+    {symbol: {'qty_step', 'min_qty', 'min_notional', 'tick_bands'?}}) and kept in a local
+    disk cache for MARKET_CACHE_TTL_HOURS, so restarts don't wait on the network.
+    Every rounding helper accepts a single price or a NumPy array of prices.
+    """
+    def __init__(self, exchange_name, loader=None, key_func=None, cache_path=MARKET_CACHE_FILE, max_age=None):
+        self.exchange_name = exchange_name
+        self._loader = loader
+        self._key_func = key_func or (lambda symbol: symbol)
+        self.cache_path = cache_path
+        self.max_age = config.market_cache_ttl_hours * 3600 if max_age is None else max_age
+        self.defaults = dict(DEFAULT_SPECS.get(exchange_name, DEFAULT_SPECS["UPBIT"]))
+        self.dust_ratio = DUST_RATIO.get(exchange_name, 0.9)
+        self._default_table = _TickTable(TICK_BANDS.get(exchange_name, TICK_BANDS["UPBIT"]))
+        self._markets = {}
+        self._tables = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, force=False):
+        """Loads market metadata: fresh disk cache first, then the exchange, then a stale cache as fallback."""
+        with self._lock:
+            if self._loaded and not force:
+                return
+            cached, saved_at = self._read_cache()
+            if cached and not force and time.time() - saved_at < self.max_age:
+                self._set_markets(cached)
+                logger.info(f"Loaded {len(cached)} {self.exchange_name} markets from {self.cache_path}.")
+                return
+
+            markets = None
+            if self._loader:
+                try:
+                    markets = self._loader()
+                except Exception as e:
+                    logger.error(f"Failed to load {self.exchange_name} market metadata: {e}")
+            if markets:
+                self._set_markets(markets)
+                self._write_cache(markets)
+                logger.info(f"Loaded {len(markets)} {self.exchange_name} markets from the exchange.")
+            else:
+                # Stale rules beat none; unknown markets fall back to the exchange defaults
+                self._set_markets(cached or {})
+                if cached:
+                    logger.warning(f"Using stale {self.exchange_name} market cache ({len(cached)} markets).")
+
+    def _set_markets(self, markets):
+        self._markets = markets
+        self._tables = {}
+        self._loaded = True
+
+    def _read_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None, 0.0
+        try:
+            with open(self.cache_path, 'r') as f:
+                entry = json.load(f).get(self.exchange_name) or {}
+            return entry.get('markets'), float(entry.get('saved_at', 0))
+        except Exception as e:
+            logger.error(f"Error reading market cache: {e}")
+            return None, 0.0
+
+    def _write_cache(self, markets):
+        if not self.cache_path:
+            return
+        try:
+            data = {}
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path, 'r') as f:
+                    data = json.load(f)
+            data[self.exchange_name] = {'saved_at': time.time(), 'markets': markets}
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.error(f"Error saving market cache: {e}")
+
+    def symbols(self):
+        """Every market key the exchange metadata lists (exchange symbol format)."""
+        if not self._loaded:
+            self.load()
+        return sorted(self._markets)
+
+    def spec(self, symbol):
+        """Market rules for `symbol` merged over the exchange defaults."""
+        if not self._loaded:
+            self.load()
+        market = self._markets.get(self._key_func(symbol))
+        if not market:
+            return self.defaults
+        merged = dict(self.defaults)
+        merged.update({k: v for k, v in market.items() if v is not None})
+        return merged
+
+    def _table(self, symbol):
+        bands = self.spec(symbol).get('tick_bands')
+        if not bands:
+            return self._default_table
+        key = self._key_func(symbol)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = _TickTable(bands)
+        return table
+
+    def tick_size(self, symbol, price):
+        table = self._table(symbol)
+        if np.ndim(price):
+            return table.ticks_for(np.asarray(price, dtype=float))
+        return table.tick(price)
+
+    def round_price(self, symbol, price):
+        """Rounds a price (or an array of prices) down to a valid tick for `symbol`."""
+        table = self._table(symbol)
+        if np.ndim(price):
+            return table.floor_array(np.asarray(price, dtype=float))
+        return table.floor(price)
+
+    def round_qty(self, symbol, amount):
+        """Rounds a quantity (or an array of quantities) down to the market's quantity step."""
+        step = self.spec(symbol)['qty_step']
+        decimals = max(0, -int(math.floor(math.log10(step))))
+        if np.ndim(amount):
+            return np.round(np.floor(np.asarray(amount, dtype=float) / step + 1e-9) * step, decimals)
+        return float(round(math.floor(amount / step + 1e-9) * step, decimals))
+
+    def min_notional(self, symbol):
+        """Minimum order value in KRW."""
+        return float(self.spec(symbol)['min_notional'])
+
+    def dust_limit(self, symbol):
+        """Holdings below this KRW value can't be sold on the exchange."""
+        return self.min_notional(symbol) * self.dust_ratio
+
+    def min_order_krw(self, symbol):
+        """Smallest KRW allocation worth placing as a new buy."""
+        return self.min_notional(symbol) * SIZING_MARGIN
@@ -0,0 +1,341 @@
+import json
+import sys
+import time
+import uuid
+import threading
+from config import config
+from logger import logger
+
+try:
+    from websockets.sync.client import connect as ws_connect
+    from websockets.sync.server import serve as ws_serve
+except ImportError:
+    ws_connect = None
+    ws_serve = None
+
+class UpbitStreamProtocol:
+    """Upbit public websocket: one subscription message for ticker + trade on every code."""
+    url = "wss://api.upbit.com/websocket/v1"
+    ping_message = "PING"
+
+    def code_for(self, symbol):
+        if '/' in symbol:
+            base, quote = symbol.split('/')
+            return f"{quote}-{base}"
+        return symbol
+
+    def subscribe_messages(self, codes, orderbook=False):
+        codes = sorted(codes)
+        request = [
+            {"ticket": f"coin-trader-{uuid.uuid4().hex[:8]}"},
+            {"type": "ticker", "codes": codes},
+            {"type": "trade", "codes": codes},
+        ]
+        if orderbook:
+            request.append({"type": "orderbook", "codes": codes})
+        return [json.dumps(request)]
+
+    def parse(self, message):
+        """Returns a list of (code, price) ticks found in one raw message."""
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        data = json.loads(message)
+        if data.get('type') in ('ticker', 'trade') and data.get('trade_price'):
+            return [(data['code'], float(data['trade_price']))]
+        return []
+
+class CoinoneStreamProtocol:
+    """Coinone public websocket: one SUBSCRIBE request per (channel, currency)."""
+    url = "wss://stream.coinone.co.kr"
+    ping_message = json.dumps({"request_type": "PING"})
+
+    def code_for(self, symbol):
+        if '/' in symbol:
+            return symbol.split('/')[0]
+        return symbol.split('-')[1]
+
+    def subscribe_messages(self, codes, orderbook=False):
+        messages = []
+        channels = ("TICKER", "TRADE", "ORDERBOOK") if orderbook else ("TICKER", "TRADE")
+        for code in sorted(codes):
+            for channel in channels:
+                messages.append(json.dumps({
+                    "request_type": "SUBSCRIBE",
+                    "channel": channel,
+                    "topic": {"quote_currency": "KRW", "target_currency": code},
+                }))
+        return messages
+
+    def parse(self, message):
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        data = json.loads(message)
+        if data.get('response_type') != 'DATA':
+            return []
+        body = data.get('data', {})
+        price = body.get('last') if data.get('channel') == 'TICKER' else body.get('price')
+        if body.get('target_currency') and price:
+            return [(body['target_currency'], float(price))]
+        return []
+
+STREAM_PROTOCOLS = {
+    "UPBIT": UpbitStreamProtocol,
+    "COINONE": CoinoneStreamProtocol,
+}
+
+class MarketStream:
+    """
+    Streaming market-data feed for held and watched symbols.
+    Keeps an in-memory last-price table and calls `on_tick(symbol, price)` for every
+    ticker/trade message, so stop checks react to ticks instead of the 1-minute poll.
+    Reconnects with exponential backoff; after an unexpected disconnect the gap is
+    backfilled from REST: the highest 1m candle high of each held symbol goes to
+    `on_high(symbol, high)` (running high only: that price is no longer current), then the
+    bulk price snapshot goes through on_tick like any other tick.
+    """
+    def __init__(self, exchange_name, on_tick, exchange_api=None, url=None, record_path=None, max_backoff=30,
+                 on_high=None):
+        self.protocol = STREAM_PROTOCOLS[exchange_name]()
+        self.url = url or config.market_stream_url or self.protocol.url
+        self.on_tick = on_tick
+        self.on_high = on_high
+        self.exchange_api = exchange_api
+        self.record_path = record_path if record_path is not None else config.market_stream_record_path
+        # Order book messages are only recorded (orderbook_replay), never parsed into ticks
+        self.orderbook = bool(self.record_path) and config.market_stream_orderbook
+        self.max_backoff = max_backoff
+
+        self.last_prices = {}   # symbol -> (price, received_at)
+        self._codes = {}        # exchange code -> symbol as used by main.positions
+        self._held = set()
+        self._lock = threading.Lock()
+        self._resubscribe = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._ws = None
+        self.connected = False
+        self.disconnected_at = None
+        self.reconnects = 0
+        self.messages = 0
+
+    def set_symbols(self, held, watched=()):
+        """Sets the subscription to held + watched symbols; resubscribes only when the set changes."""
+        codes = {}
+        for symbol in list(watched) + list(held):
+            codes[self.protocol.code_for(symbol)] = symbol
+        with self._lock:
+            self._held = set(held)
+            changed = set(codes) != set(self._codes)
+            self._codes = codes
+        if changed and self.connected:
+            self._resubscribe.set()
+
+    def get_price(self, symbol, max_age=None):
+        """Last streamed price for `symbol`, or None if unknown / older than `max_age` seconds."""
+        entry = self.last_prices.get(symbol)
+        if not entry:
+            return None
+        price, received_at = entry
+        if max_age is not None and time.time() - received_at > max_age:
+            return None
+        return price
+
+    def start(self):
+        if ws_connect is None:
+            logger.warning("websockets package not installed. Market stream disabled; stops use the 1-minute poll.")
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="market-stream", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            with self._lock:
+                codes = set(self._codes)
+            if not codes:
+                self._stop.wait(1)
+                continue
+            try:
+                with ws_connect(self.url, open_timeout=10, max_size=2**22) as ws:
+                    self._ws = ws
+                    for message in self.protocol.subscribe_messages(codes, orderbook=self.orderbook):
+                        ws.send(message)
+                    self.connected = True
+                    backoff = 1
+                    logger.info(f"[Stream] Connected to {self.url} ({len(codes)} symbols).")
+                    if self.disconnected_at is not None:
+                        self._backfill()
+                    self._receive_loop(ws)
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"[Stream] Connection lost: {e}. Reconnecting in {backoff}s...")
+            finally:
+                self._ws = None
+                self.connected = False
+
+            if self._stop.is_set():
+                break
+            if self._resubscribe.is_set():
+                # Planned reconnect to apply a new symbol set: no backoff, no gap to backfill
+                self._resubscribe.clear()
+                continue
+            if self.disconnected_at is None:
+                self.disconnected_at = time.time()
+            self.reconnects += 1
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _receive_loop(self, ws):
+        last_ping = time.time()
+        record_file = open(self.record_path, 'a', encoding='utf-8') if self.record_path else None
+        try:
+            while not self._stop.is_set() and not self._resubscribe.is_set():
+                try:
+                    message = ws.recv(timeout=1)
+                except TimeoutError:
+                    message = None
+                if time.time() - last_ping > 20:
+                    ws.send(self.protocol.ping_message)
+                    last_ping = time.time()
+                if message is None:
+                    continue
+                self.messages += 1
+                if record_file:
+                    raw = message.decode('utf-8') if isinstance(message, bytes) else message
+                    record_file.write(raw.strip() + "\n")
+                for code, price in self.protocol.parse(message):
+                    self._emit(code, price)
+        finally:
+            if record_file:
+                record_file.close()
+
+    def _emit(self, code, price):
+        symbol = self._codes.get(code)
+        if symbol is None:
+            return
+        self.last_prices[symbol] = (price, time.time())
+        try:
+            self.on_tick(symbol, price)
+        except Exception as e:
+            logger.error(f"[Stream] Tick handler error for {symbol}: {e}")
+
+    def _backfill(self):
+        """Replays what the stream missed while disconnected, using REST data."""
+        gap = time.time() - self.disconnected_at
+        self.disconnected_at = None
+        if self.exchange_api is None:
+            return
+        logger.info(f"[Stream] Backfilling {gap:.0f}s gap from REST...")
+        with self._lock:
+            codes = dict(self._codes)
+            held = set(self._held)
+        # 끊긴 동안의 고점을 먼저 반영해야 트레일링 기준가가 맞음 (보유 종목만 1분봉 조회)
+        # 고점은 현재가가 아니므로 손절 판단 없이 기준가만 올리고, 판단은 아래 REST 현재가로 한 번만
+        if gap > 60 and self.on_high is not None:
+            limit = min(int(gap // 60) + 2, 200)
+            for symbol in held:
+                df = self.exchange_api.fetch_ohlcv(symbol, timeframe='1m', limit=limit)
+                if df is not None and not df.empty:
+                    try:
+                        self.on_high(symbol, float(df['high'].max()))
+                    except Exception as e:
+                        logger.error(f"[Stream] Backfill high handler error for {symbol}: {e}")
+        self.exchange_api.prices.refresh(force=True)
+        for code, symbol in codes.items():
+            price = self.exchange_api.fetch_current_price(symbol)
+            if price:
+                self._emit(code, price)
+
+class ReplayServer:
+    """
+    Local websocket stand-in for the exchange feed. Waits for the client's subscription,
+    then replays recorded raw messages (one per line of a MARKET_STREAM_RECORD_PATH file).
+    `disconnect_after` drops the connection after N messages to exercise reconnect + backfill.
+    """
+    def __init__(self, messages, host="127.0.0.1", port=0, interval=0.0, disconnect_after=None):
+        self.messages = list(messages)
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.disconnect_after = disconnect_after
+        self.subscriptions = []
+        self.connections = 0
+        self._position = 0
+        self._server = None
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls([line.strip() for line in f if line.strip()], **kwargs)
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self):
+        if ws_serve is None:
+            raise RuntimeError("websockets package is required for the replay server.")
+        self._server = ws_serve(self._handle, self.host, self.port)
+        self.port = self._server.socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _handle(self, ws):
+        self.connections += 1
+        self.subscriptions.append(ws.recv())
+        sent = 0
+        while self._position < len(self.messages):
+            ws.send(self.messages[self._position])
+            self._position += 1
+            sent += 1
+            if self.disconnect_after and sent >= self.disconnect_after:
+                return
+            if self.interval:
+                time.sleep(self.interval)
+        # Keep the connection open (answering pings) until the client leaves
+        try:
+            for _ in ws:
+                pass
+        except Exception:
+            pass
+
+if __name__ == "__main__":
+    # Offline check: replay a recorded message file through the real stream client
+    # usage: python market_stream.py <recording.jsonl> [UPBIT|COINONE] [symbol ...]
+    if len(sys.argv) < 2:
+        print("usage: python market_stream.py <recording.jsonl> [UPBIT|COINONE] [symbol ...]")
+        sys.exit(1)
+    exchange_name = sys.argv[2].upper() if len(sys.argv) > 2 else config.active_exchange
+    server = ReplayServer.from_file(sys.argv[1], interval=0.01).start()
+    stream = MarketStream(exchange_name, on_tick=lambda s, p: print(f"{s}: {p:,}"), url=server.url, record_path="")
+    stream.set_symbols(sys.argv[3:] or ["BTC/KRW"])
+    stream.start()
+    try:
+        while server._position < len(server.messages):
+            time.sleep(0.2)
+        time.sleep(0.5)
+    finally:
+        stream.stop()
+        server.stop()
+    print(f"Replayed {stream.messages} messages.")
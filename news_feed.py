@@ -0,0 +1,71 @@
+import calendar
+import hashlib
+import re
+from urllib.parse import urlparse
+from http_client import http
+
+class ConditionalFeed:
+    """
+    One RSS/Atom feed polled with conditional GET. The ETag / Last-Modified of the last response
+    are sent back, so an unchanged feed answers 304 without a body; a 200 whose body hashes the
+    same as the previous one is not parsed again either. `headlines` always holds the latest
+    [(published epoch, title)].
+    """
+    def __init__(self, url):
+        self.url = url
+        self.endpoint = f"news.{urlparse(url).netloc}"
+        self.etag = None
+        self.last_modified = None
+        self._body_hash = None
+        self.headlines = []
+        self.not_modified = 0
+
+    def poll(self):
+        """Fetches the feed if it changed. Returns True when new headlines were parsed."""
+        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        res = http.get(self.url, headers=headers, endpoint=self.endpoint)
+        if res.status_code == 304:
+            self.not_modified += 1
+            return False
+        res.raise_for_status()
+        self.etag = res.headers.get('ETag')
+        self.last_modified = res.headers.get('Last-Modified')
+        body_hash = hashlib.sha1(res.content).hexdigest()
+        if body_hash == self._body_hash:
+            return False
+
+        import feedparser
+        feed = feedparser.parse(res.content)
+        self.headlines = [(_published(entry), entry.title.strip()) for entry in feed.entries if entry.get('title')]
+        self._body_hash = body_hash
+        return True
+
+def _published(entry):
+    parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+    return calendar.timegm(parsed) if parsed else 0
+
+def _normalize(title):
+    # Unicode-aware, so Korean / accented headlines keep their words
+    return re.sub(r'[\W_]+', ' ', title.casefold()).strip()
+
+def merge_headlines(feeds, limit):
+    """Newest `limit` headlines over all feeds; the same story carried by several feeds counts once."""
+    seen = set()
+    merged = []
+    for _, title in sorted((h for feed in feeds for h in feed.headlines), key=lambda h: h[0], reverse=True):
+        key = _normalize(title)
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(title)
+        if len(merged) == limit:
+            break
+    return merged
+
+def headline_digest(headlines):
+    """Hash of a headline set, independent of order, case and punctuation."""
+    return hashlib.sha1("\n".join(sorted(_normalize(title) for title in headlines)).encode()).hexdigest()
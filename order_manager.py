@@ -0,0 +1,243 @@
+import time
+import threading
+from logger import logger
+
+# Live order lifecycle: placed → (partially filled) → cancel pending → re-priced → ... → done
+ORDER_PLACED = "placed"
+ORDER_PARTIALLY_FILLED = "partially_filled"
+ORDER_CANCEL_PENDING = "cancel_pending"
+ORDER_REPRICED = "repriced"
+ORDER_DONE = "done"
+# Exchange order statuses of an order still resting on the book
+LIVE_STATUSES = ("live", "partially_filled")
+
+class ManagedOrder:
+    """One auto-chasing limit order (BUY with a KRW budget, SELL with a coin amount)."""
+    def __init__(self, symbol, side, krw_budget=None, coin_budget=None, max_retries=5, on_done=None):
+        self.symbol = symbol
+        self.side = side
+        self.remaining_krw = krw_budget or 0
+        self.remaining_coin = coin_budget or 0
+        self.start_krw = self.remaining_krw
+        self.start_coin = self.remaining_coin
+        self.max_retries = max_retries
+        self.on_done = on_done
+
+        self.state = None
+        self.attempt = 0
+        self.order_id = None
+        self.order_price = None    # limit price of the live exchange order
+        self.order_qty = 0.0
+        self.order_filled = 0.0    # part of the live order already accounted for
+        self.order_cost = 0.0      # KRW value of order_filled
+        self.ref_price = None      # market price the limit was derived from
+        self.next_action_at = 0.0
+        self.filled_qty = 0.0
+        self.filled_cost = 0.0
+        self.result = None
+        self.history = []
+
+    def transition(self, state):
+        self.state = state
+        self.history.append((state, time.time()))
+
+    @property
+    def avg_price(self):
+        return self.filled_cost / self.filled_qty if self.filled_qty > 0 else self.ref_price
+
+    @property
+    def done(self):
+        return self.state == ORDER_DONE
+
+class OrderManager:
+    """
+    Non-blocking replacement for the sleeping limit-order chase loop.
+    Each live order is a state machine advanced by poll() on the manager's own thread,
+    so the scan loop and stop checks never wait on order execution. Finished orders are
+    reported through their `on_done(order)` callback (called on the manager thread).
+
+    `api` provides the exchange specifics: fetch_current_price(symbol, force_refresh=True),
+    _limit_price(symbol, side, price), _amount_to_tick(symbol, qty), _place_limit_order(symbol, side, price, qty),
+    _query_order(symbol, order_id) and _cancel_order(symbol, side, order_id, price, qty).
+    _query_order returns {'status', 'qty', 'remain_qty'} plus, when the exchange reports it, the
+    order's average fill price as 'avg_price'; fills without it are booked at the reference price.
+    """
+    def __init__(self, api, fill_wait=5.0, cancel_wait=1.0, poll_interval=0.5, max_retries=5, autostart=True):
+        self.api = api
+        # False: no background thread, the caller drives poll() (orderbook_replay on a virtual clock)
+        self.autostart = autostart
+        self.fill_wait = fill_wait
+        self.cancel_wait = cancel_wait
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self._orders = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, symbol, side, krw_budget=None, coin_budget=None, on_done=None):
+        """Places the first limit order and returns the ManagedOrder, or None if it could not be placed."""
+        order = ManagedOrder(symbol, side, krw_budget, coin_budget, self.max_retries, on_done)
+        if not self._place(order, ORDER_PLACED):
+            return None
+        with self._lock:
+            self._orders.append(order)
+        if self.autostart:
+            self.start()
+        return order
+
+    def active_orders(self, symbol=None):
+        with self._lock:
+            return [o for o in self._orders if symbol is None or o.symbol == symbol]
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="order-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.poll_interval)
+
+    def poll(self):
+        """Advances every order whose next action is due."""
+        now = time.time()
+        for order in self.active_orders():
+            if now < order.next_action_at:
+                continue
+            try:
+                self._step(order)
+            except Exception as e:
+                logger.error(f"[{order.symbol}] Exception in order manager ({order.state}): {e}")
+                order.next_action_at = time.time() + 1
+            if order.done:
+                with self._lock:
+                    self._orders.remove(order)
+                if order.on_done:
+                    try:
+                        order.on_done(order)
+                    except Exception as e:
+                        logger.error(f"[{order.symbol}] Order callback error: {e}")
+
+    def _step(self, order):
+        if order.state in (ORDER_PLACED, ORDER_REPRICED):
+            status = self.api._query_order(order.symbol, order.order_id)
+            if status is None:
+                order.next_action_at = time.time() + 1
+                return
+            filled_now = status['qty'] - status['remain_qty']
+            if status['status'] not in LIVE_STATUSES:
+                self._account(order, filled_now, status.get('avg_price'))
+                if status['remain_qty'] <= 1e-12:
+                    order.result = {"result": "success", "orderId": order.order_id, "filled_price": order.ref_price,
+                                    "avg_price": order.avg_price, "filled_qty": order.filled_qty}
+                    order.transition(ORDER_DONE)
+                else:
+                    # Closed by the exchange before it filled completely → re-price the rest
+                    logger.warning(f"[{order.symbol}] Order {order.order_id} closed by the exchange ({status['status']}) "
+                                   f"with {status['remain_qty']} unfilled. Retrying the remainder...")
+                    order.transition(ORDER_CANCEL_PENDING)
+                    order.next_action_at = time.time()
+                return
+
+            # Still live: hanging due to slippage → account the partial fill, then cancel the remainder
+            if filled_now > order.order_filled:
+                self._account(order, filled_now, status.get('avg_price'))
+                order.transition(ORDER_PARTIALLY_FILLED)
+            logger.warning(f"[{order.symbol}] Order {order.order_id} hanging due to slippage. Canceling and retrying...")
+            self.api._cancel_order(order.symbol, order.side, order.order_id, order.ref_price, status['remain_qty'])
+            order.transition(ORDER_CANCEL_PENDING)
+            order.next_action_at = time.time() + self.cancel_wait
+
+        elif order.state == ORDER_CANCEL_PENDING:
+            # Fills can still land while the cancel is in flight: book what the order really filled first
+            status = self.api._query_order(order.symbol, order.order_id)
+            if status is None:
+                order.next_action_at = time.time() + 1
+                return
+            self._account(order, status['qty'] - status['remain_qty'], status.get('avg_price'))
+            if status['status'] in LIVE_STATUSES:
+                logger.warning(f"[{order.symbol}] Order {order.order_id} still live after cancel. Canceling again...")
+                self.api._cancel_order(order.symbol, order.side, order.order_id, order.ref_price, status['remain_qty'])
+                order.next_action_at = time.time() + self.cancel_wait
+                return
+            order.attempt += 1
+            if order.attempt >= order.max_retries or not self._place(order, ORDER_REPRICED):
+                self._finish_unfilled(order)
+
+    def _account(self, order, filled_total, avg_price=None):
+        """
+        Books fills of the live exchange order up to `filled_total` coins, at the order's reported
+        average fill price (`avg_price`), else at the market price the limit was derived from.
+        """
+        delta = filled_total - order.order_filled
+        if delta <= 0:
+            return
+        if avg_price:
+            cost = filled_total * avg_price - order.order_cost
+        else:
+            cost = delta * order.ref_price
+        order.order_filled = filled_total
+        order.order_cost += cost
+        order.filled_qty += delta
+        order.filled_cost += cost
+        if order.side == 'BUY':
+            order.remaining_krw -= cost
+        else:
+            order.remaining_coin -= delta
+
+    def _place(self, order, state):
+        """Prices and places a limit order for the remaining budget. Returns False if nothing was placed."""
+        current_price = self.api.fetch_current_price(order.symbol, force_refresh=True)
+        if not current_price:
+            return False
+        target_price = self.api._limit_price(order.symbol, order.side, current_price)
+
+        if order.side == 'BUY':
+            if order.remaining_krw <= 0:
+                return False
+            # Size with the *aggressive* target_price so the KRW budget covers worst-case slippage
+            amount = order.remaining_krw / target_price
+        else:
+            if order.remaining_coin <= 0:
+                return False
+            amount = order.remaining_coin
+
+        qty = self.api._amount_to_tick(order.symbol, amount)
+        if qty <= 0:
+            return False
+
+        order_id = self.api._place_limit_order(order.symbol, order.side, target_price, qty)
+        if not order_id:
+            return False
+
+        order.order_id = order_id
+        order.order_price = target_price
+        order.order_qty = qty
+        order.order_filled = 0.0
+        order.order_cost = 0.0
+        order.ref_price = current_price
+        order.transition(state)
+        order.next_action_at = time.time() + self.fill_wait
+        logger.info(f"[{order.symbol}] Attempt {order.attempt+1}/{order.max_retries} - Placed Limited {order.side} at {current_price:,} (ID: {order_id})")
+        return True
+
+    def _finish_unfilled(self, order):
+        # 최대 재시도가 끝났거나 잔여 물량이 너무 작은 경우: 조금이라도 체결됐다면 '부분 체결'로 보고하여
+        # 메인루프에서 포지션을 추적/청산할 수 있게 유도함.
+        if order.filled_qty > 0:
+            logger.warning(f"[{order.symbol}] {order.side} order max retries reached but partially filled.")
+            order.result = {"result": "partial_success", "orderId": order.order_id, "filled_price": order.ref_price,
+                            "avg_price": order.avg_price, "filled_qty": order.filled_qty}
+        else:
+            logger.error(f"[{order.symbol}] Failed to fully fill {order.side} order after {order.attempt} attempts.")
+            order.result = None
+        order.transition(ORDER_DONE)
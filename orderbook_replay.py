@@ -0,0 +1,473 @@
+import os
+import sys
+import json
+import time
+import random
+import itertools
+import numpy as np
+from config import config
+from logger import logger
+from candle_store import symbol_key
+from market_registry import MarketRegistry
+from order_manager import OrderManager
+from replay import VirtualClock
+
+# ===================================================================
+# Binary log: <path>.book / <path>.trade, fixed-size little-endian records after a 16-byte header
+# ===================================================================
+LOG_MAGIC = b"OBLOG1"
+HEADER_SIZE = 16
+KIND_BOOK = 1
+KIND_TRADE = 2
+BOOK_DEPTH = 15  # Upbit / Coinone websocket order books are 15 levels deep
+
+SIDE_BUY = 1     # buyer was the aggressor (trade hit the asks)
+SIDE_SELL = -1   # seller was the aggressor (trade hit the bids)
+
+def book_dtype(depth=BOOK_DEPTH):
+    return np.dtype([
+        ('ts', '<i8'),
+        ('ask_price', '<f8', (depth,)), ('ask_qty', '<f4', (depth,)),
+        ('bid_price', '<f8', (depth,)), ('bid_qty', '<f4', (depth,)),
+    ])
+
+TRADE_DTYPE = np.dtype([('ts', '<i8'), ('price', '<f8'), ('qty', '<f4'), ('side', 'i1')])
+
+class OrderBookLog:
+    """
+    Append-only order book snapshots and trades of one symbol (timestamps in epoch ms).
+    Records are fixed-size, so reading is a memory map with no parsing: a 15-level snapshot is
+    372 bytes and a trade 21 bytes, against several KB of websocket JSON.
+    """
+    def __init__(self, path, depth=BOOK_DEPTH):
+        self.path = path
+        self.depth = depth
+        self.book_path = f"{path}.book"
+        self.trade_path = f"{path}.trade"
+
+    def _header(self, kind):
+        return LOG_MAGIC + bytes([kind, self.depth]) + b"\0" * (HEADER_SIZE - len(LOG_MAGIC) - 2)
+
+    def _append(self, file_path, kind, records):
+        if not len(records):
+            return
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new_file = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        with open(file_path, 'ab') as f:
+            if new_file:
+                f.write(self._header(kind))
+            f.write(records.tobytes())
+
+    def append_books(self, ts, ask_price, ask_qty, bid_price, bid_qty):
+        """Appends snapshots; price/qty arguments are (n, depth) arrays (missing levels: NaN price, 0 qty)."""
+        records = np.zeros(len(ts), dtype=book_dtype(self.depth))
+        records['ts'] = ts
+        records['ask_price'], records['ask_qty'] = ask_price, ask_qty
+        records['bid_price'], records['bid_qty'] = bid_price, bid_qty
+        self._append(self.book_path, KIND_BOOK, records)
+
+    def append_trades(self, ts, price, qty, side):
+        records = np.zeros(len(ts), dtype=TRADE_DTYPE)
+        records['ts'], records['price'], records['qty'], records['side'] = ts, price, qty, side
+        self._append(self.trade_path, KIND_TRADE, records)
+
+    def _load(self, file_path, kind, dtype):
+        if not os.path.exists(file_path) or os.path.getsize(file_path) <= HEADER_SIZE:
+            return np.zeros(0, dtype=dtype)
+        with open(file_path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if header[:len(LOG_MAGIC)] != LOG_MAGIC or header[len(LOG_MAGIC)] != kind or header[len(LOG_MAGIC) + 1] != self.depth:
+            raise ValueError(f"{file_path} is not a depth-{self.depth} order book log.")
+        count = (os.path.getsize(file_path) - HEADER_SIZE) // dtype.itemsize  # ignore a torn last record
+        return np.memmap(file_path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+    def books(self):
+        return self._load(self.book_path, KIND_BOOK, book_dtype(self.depth))
+
+    def trades(self):
+        return self._load(self.trade_path, KIND_TRADE, TRADE_DTYPE)
+
+def _levels(levels, depth, price_key, qty_key):
+    prices = np.full(depth, np.nan)
+    qtys = np.zeros(depth, dtype=np.float32)
+    for i, level in enumerate(levels[:depth]):
+        prices[i], qtys[i] = float(level[price_key]), float(level[qty_key])
+    return prices, qtys
+
+def parse_recording_line(line, exchange_name, depth=BOOK_DEPTH):
+    """
+    One raw MarketStream message → ('book', symbol, (ts, ask_p, ask_q, bid_p, bid_q)),
+    ('trade', symbol, (ts, price, qty, side)) or None.
+    """
+    data = json.loads(line)
+    if exchange_name == "UPBIT":
+        code = data.get('code', '')
+        symbol = f"{code.split('-')[1]}/{code.split('-')[0]}" if '-' in code else None
+        if data.get('type') == 'orderbook' and symbol:
+            units = data.get('orderbook_units', [])
+            ask_p, ask_q = _levels(units, depth, 'ask_price', 'ask_size')
+            bid_p, bid_q = _levels(units, depth, 'bid_price', 'bid_size')
+            return 'book', symbol, (int(data['timestamp']), ask_p, ask_q, bid_p, bid_q)
+        if data.get('type') == 'trade' and symbol:
+            side = SIDE_BUY if data.get('ask_bid') == 'BID' else SIDE_SELL
+            ts = int(data.get('trade_timestamp') or data['timestamp'])
+            return 'trade', symbol, (ts, float(data['trade_price']), float(data['trade_volume']), side)
+        return None
+
+    if data.get('response_type') != 'DATA':
+        return None
+    body = data.get('data', {})
+    symbol = f"{body.get('target_currency', '').upper()}/{body.get('quote_currency', 'KRW').upper()}"
+    if data.get('channel') == 'ORDERBOOK':
+        asks = sorted(body.get('asks', []), key=lambda level: float(level['price']))
+        bids = sorted(body.get('bids', []), key=lambda level: -float(level['price']))
+        ask_p, ask_q = _levels(asks, depth, 'price', 'qty')
+        bid_p, bid_q = _levels(bids, depth, 'price', 'qty')
+        return 'book', symbol, (int(body['timestamp']), ask_p, ask_q, bid_p, bid_q)
+    if data.get('channel') == 'TRADE':
+        # is_seller_maker: the resting order was the sell → the buyer took liquidity
+        side = SIDE_BUY if body.get('is_seller_maker') else SIDE_SELL
+        return 'trade', symbol, (int(body['timestamp']), float(body['price']), float(body['qty']), side)
+    return None
+
+def convert_recording(recording_path, exchange_name, out_dir, depth=BOOK_DEPTH, batch=50000):
+    """Converts a MarketStream JSONL recording (MARKET_STREAM_ORDERBOOK=True) into per-symbol binary logs."""
+    books, trades = {}, {}
+    counts = {'book': 0, 'trade': 0}
+
+    def flush():
+        for symbol, rows in books.items():
+            if rows:
+                cols = list(zip(*rows))
+                OrderBookLog(os.path.join(out_dir, symbol_key(symbol)), depth).append_books(
+                    np.array(cols[0]), np.array(cols[1]), np.array(cols[2]), np.array(cols[3]), np.array(cols[4]))
+        for symbol, rows in trades.items():
+            if rows:
+                cols = list(zip(*rows))
+                OrderBookLog(os.path.join(out_dir, symbol_key(symbol)), depth).append_trades(*map(np.array, cols))
+        books.clear()
+        trades.clear()
+
+    with open(recording_path, 'r', encoding='utf-8') as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                parsed = parse_recording_line(line, exchange_name, depth)
+            except (ValueError, KeyError, IndexError) as e:
+                logger.warning(f"Skipped unreadable recording line {n}: {e}")
+                continue
+            if parsed is None:
+                continue
+            kind, symbol, row = parsed
+            (books if kind == 'book' else trades).setdefault(symbol, []).append(row)
+            counts[kind] += 1
+            if n % batch == 0:
+                flush()
+    flush()
+    return counts
+
+# ===================================================================
+# Execution simulator: the real OrderManager chase loop against the replayed book
+# ===================================================================
+class _SimOrder:
+    def __init__(self, order_id, side, price, qty, arrival_ms):
+        self.order_id = order_id
+        self.side = side
+        self.price = price
+        self.qty = qty
+        self.arrival_ms = arrival_ms
+        self.arrived = False
+        self.evaluated_ms = arrival_ms
+        self.queue_ahead = 0.0
+        self.filled = 0.0
+        self.cost = 0.0
+        self.cancel_at_ms = None
+        self.fills = []  # (ts_ms, qty, price)
+
+    @property
+    def remaining(self):
+        return self.qty - self.filled
+
+class SimulatedOrderBookAPI:
+    """
+    Implements the OrderManager exchange interface over an OrderBookLog on a VirtualClock.
+    An order reaches the book `latency_ms` after it is sent: it first takes every opposite level
+    priced through its limit in the snapshot live at arrival, and the rest rests at the limit
+    behind the same-price queue, filled by later aggressor trades at or through the limit.
+    A cancel also takes `latency_ms`; fills in that window still happen, and the OrderManager books
+    them when it re-queries the cancelled order (late fills in the study report should stay at zero).
+    """
+    def __init__(self, log, symbol, clock, exchange_name=None, buffer_pct=0.015, latency_ms=150.0):
+        self.symbol = symbol
+        self.clock = clock
+        self.buffer_pct = buffer_pct
+        self.latency_ms = latency_ms
+        self.markets = MarketRegistry(exchange_name or config.active_exchange, cache_path=None)
+
+        books, trades = log.books(), log.trades()
+        self.book_ts = np.ascontiguousarray(books['ts'])
+        self.ask_price, self.ask_qty = books['ask_price'], books['ask_qty']
+        self.bid_price, self.bid_qty = books['bid_price'], books['bid_qty']
+        self.trade_ts = np.ascontiguousarray(trades['ts'])
+        self.trade_price = np.ascontiguousarray(trades['price'])
+        self.trade_qty = np.ascontiguousarray(trades['qty'], dtype=float)
+        self.trade_side = np.ascontiguousarray(trades['side'])
+        self.orders = {}
+
+    def reset(self, buffer_pct=None, latency_ms=None):
+        """Forgets every simulated order (the loaded log is kept) for the next setting of a study."""
+        self.orders = {}
+        if buffer_pct is not None:
+            self.buffer_pct = buffer_pct
+        if latency_ms is not None:
+            self.latency_ms = latency_ms
+
+    def _now_ms(self):
+        return int(self.clock.now * 1000)
+
+    def start_ms(self):
+        return int(min(self.book_ts[0] if len(self.book_ts) else np.inf, self.trade_ts[0] if len(self.trade_ts) else np.inf))
+
+    def end_ms(self):
+        return int(max(self.book_ts[-1] if len(self.book_ts) else 0, self.trade_ts[-1] if len(self.trade_ts) else 0))
+
+    # --- OrderManager interface ---
+    def fetch_current_price(self, symbol, force_refresh=False):
+        """Last trade price at the clock (mid of the live snapshot before the first trade)."""
+        now = self._now_ms()
+        i = int(np.searchsorted(self.trade_ts, now, side='right')) - 1
+        if i >= 0:
+            return float(self.trade_price[i])
+        j = int(np.searchsorted(self.book_ts, now, side='right')) - 1
+        if j < 0:
+            return None
+        return float((self.ask_price[j][0] + self.bid_price[j][0]) / 2)
+
+    def _limit_price(self, symbol, side, current_price):
+        raw = current_price * (1 + self.buffer_pct) if side == 'BUY' else current_price * (1 - self.buffer_pct)
+        return self.markets.round_price(symbol, raw)
+
+    def _amount_to_tick(self, symbol, amount):
+        return self.markets.round_qty(symbol, amount)
+
+    def _place_limit_order(self, symbol, side, price, qty):
+        order_id = f"sim-{len(self.orders) + 1}"
+        self.orders[order_id] = _SimOrder(order_id, side, float(price), float(qty), self._now_ms() + self.latency_ms)
+        return order_id
+
+    def _query_order(self, symbol, order_id):
+        order = self.orders.get(order_id)
+        if order is None:
+            return None
+        self._advance(order, self._now_ms())
+        live = order.remaining > 1e-12 and order.cancel_at_ms is None
+        return {'status': 'live' if live else 'completed', 'qty': order.qty, 'remain_qty': max(order.remaining, 0.0),
+                'avg_price': order.cost / order.filled if order.filled else None}
+
+    def _cancel_order(self, symbol, side, order_id, price, qty):
+        order = self.orders[order_id]
+        order.cancel_at_ms = self._now_ms() + self.latency_ms
+        self._advance(order, order.cancel_at_ms)
+
+    # --- matching ---
+    def _advance(self, order, until_ms):
+        """Applies every fill of `order` up to `until_ms` (never past its cancel)."""
+        if order.cancel_at_ms is not None:
+            until_ms = min(until_ms, order.cancel_at_ms)
+        if not order.arrived:
+            if until_ms < order.arrival_ms:
+                return
+            self._arrive(order)
+        if order.remaining <= 1e-12 or until_ms <= order.evaluated_ms:
+            return
+
+        lo = int(np.searchsorted(self.trade_ts, order.evaluated_ms, side='right'))
+        hi = int(np.searchsorted(self.trade_ts, until_ms, side='right'))
+        order.evaluated_ms = until_ms
+        if hi <= lo:
+            return
+        price = self.trade_price[lo:hi]
+        if order.side == 'BUY':
+            crossing = (self.trade_side[lo:hi] == SIDE_SELL) & (price <= order.price)
+        else:
+            crossing = (self.trade_side[lo:hi] == SIDE_BUY) & (price >= order.price)
+        idx = np.flatnonzero(crossing)
+        if not len(idx):
+            return
+        # Aggressor volume through our price drains the queue ahead of us first, then fills us
+        volume = np.cumsum(self.trade_qty[lo:hi][idx])
+        ours = np.clip(volume - order.queue_ahead, 0.0, order.remaining)
+        order.queue_ahead = max(order.queue_ahead - volume[-1], 0.0)
+        if ours[-1] <= 0:
+            return
+        steps = np.diff(ours, prepend=0.0)
+        for k in np.flatnonzero(steps > 0):
+            order.fills.append((int(self.trade_ts[lo + idx[k]]), float(steps[k]), order.price))
+        order.filled += float(ours[-1])
+        order.cost += float(ours[-1]) * order.price
+
+    def _arrive(self, order):
+        """Takes the opposite side of the snapshot live at arrival, then joins the queue at the limit price."""
+        order.arrived = True
+        order.evaluated_ms = order.arrival_ms
+        j = int(np.searchsorted(self.book_ts, order.arrival_ms, side='right')) - 1
+        if j < 0:
+            return
+        if order.side == 'BUY':
+            prices, qtys = self.ask_price[j], self.ask_qty[j]
+            takeable = prices <= order.price
+            same_side_p, same_side_q = self.bid_price[j], self.bid_qty[j]
+        else:
+            prices, qtys = self.bid_price[j], self.bid_qty[j]
+            takeable = prices >= order.price
+            same_side_p, same_side_q = self.ask_price[j], self.ask_qty[j]
+        take = np.where(takeable, qtys, 0.0).astype(float)
+        cum = np.minimum(np.cumsum(take), order.qty)
+        got = np.diff(cum, prepend=0.0)
+        if cum[-1] > 0:
+            for level in np.flatnonzero(got > 0):
+                order.fills.append((order.arrival_ms, float(got[level]), float(prices[level])))
+            order.filled = float(cum[-1])
+            order.cost = float(np.dot(got, np.nan_to_num(prices)))
+        order.queue_ahead = float(same_side_q[same_side_p == order.price].sum())
+
+def simulate_execution(api, at, side, krw_budget=None, coin_budget=None, fill_wait=5.0, cancel_wait=1.0,
+                       max_retries=5, poll_interval=0.5):
+    """
+    Runs one OrderManager chase starting at `at` (epoch seconds) on the API's clock, without threads.
+    Returns the order's true outcome from the simulated book (fills, cost, timing) next to what the
+    OrderManager booked.
+    """
+    clock = api.clock
+    clock.now = at
+    first_order = len(api.orders)
+    decision_price = api.fetch_current_price(api.symbol)
+    manager = OrderManager(api, fill_wait=fill_wait, cancel_wait=cancel_wait, poll_interval=poll_interval,
+                           max_retries=max_retries, autostart=False)
+    order = manager.submit(api.symbol, side, krw_budget=krw_budget, coin_budget=coin_budget)
+    if order is None:
+        return None
+    while not order.done:
+        clock.now = max(clock.now + poll_interval, order.next_action_at)
+        manager.poll()
+
+    sim_orders = list(api.orders.values())[first_order:]
+    for sim_order in sim_orders:
+        api._advance(sim_order, sim_order.cancel_at_ms or int(clock.now * 1000))
+    fills = [f for o in sim_orders for f in o.fills]
+    start_ms, end_ms = int(at * 1000), int(clock.now * 1000)
+    events = (np.searchsorted(api.trade_ts, end_ms, side='right') - np.searchsorted(api.trade_ts, start_ms, side='left')
+              + np.searchsorted(api.book_ts, end_ms, side='right') - np.searchsorted(api.book_ts, start_ms, side='left'))
+    qty = sum(f[1] for f in fills)
+    cost = sum(f[1] * f[2] for f in fills)
+    avg_price = cost / qty if qty else None
+    sign = 1 if side == 'BUY' else -1
+    return {
+        'decision_price': decision_price,
+        'filled_qty': qty,
+        'avg_price': avg_price,
+        # BUY: share of the KRW budget spent; SELL: share of the coins sold
+        'fill_ratio': (cost / krw_budget) if side == 'BUY' else (qty / coin_budget if coin_budget else 0.0),
+        # Cost of the chase vs the price the decision was made at (positive = paid away)
+        'slippage_bps': sign * (avg_price / decision_price - 1) * 1e4 if avg_price and decision_price else None,
+        'time_to_fill': (max(f[0] for f in fills) / 1000 - at) if fills else None,
+        'attempts': len(sim_orders),  # limit orders placed
+        'booked_qty': order.filled_qty,
+        'late_fill_qty': max(qty - order.filled_qty, 0.0),
+        'events': int(events),  # book snapshots + trades replayed while the chase ran
+    }
+
+EXECUTION_GRID = {
+    'buffer_pct': (0.002, 0.005, 0.01, 0.015),
+    'max_retries': (1, 3, 5),
+    'fill_wait': (1.0, 2.0, 5.0),
+}
+
+def run_execution_study(log_path, symbol, side='BUY', krw_budget=100000, coin_budget=None, grid=None,
+                        n_orders=200, latency_ms=150.0, cancel_wait=1.0, exchange_name=None, seed=0):
+    """
+    Replays `n_orders` chases at random moments of the log for every combination of `grid`
+    (keys: buffer_pct, max_retries, fill_wait, latency_ms). Every setting sees the same moments.
+    Returns [(params, summary)] with mean slippage, fill ratio, time to fill and late fills.
+    """
+    grid = grid or EXECUTION_GRID
+    log = OrderBookLog(log_path)
+    clock = VirtualClock(0)
+    api = SimulatedOrderBookAPI(log, symbol, clock, exchange_name=exchange_name, latency_ms=latency_ms)
+    start_ms, end_ms = api.start_ms(), api.end_ms()
+    horizon_ms = 60_000 * 5  # leave room at the end of the log for the chase itself
+    if end_ms - start_ms <= horizon_ms:
+        logger.error(f"{log_path}: not enough recorded data for an execution study.")
+        return []
+    rng = random.Random(seed)
+    moments = sorted(rng.uniform(start_ms, end_ms - horizon_ms) / 1000 for _ in range(n_orders))
+
+    results = []
+    names = list(grid)
+    saved_level = logger.level
+    logger.setLevel("ERROR")  # every chase logs each attempt
+    wall_start = time.perf_counter()
+    try:
+        with clock.install():
+            for values in itertools.product(*grid.values()):
+                params = dict(zip(names, values))
+                api.reset(buffer_pct=params.get('buffer_pct', 0.015), latency_ms=params.get('latency_ms', latency_ms))
+                runs = [simulate_execution(api, at, side, krw_budget=krw_budget, coin_budget=coin_budget,
+                                           fill_wait=params.get('fill_wait', 5.0), cancel_wait=cancel_wait,
+                                           max_retries=params.get('max_retries', 5)) for at in moments]
+                runs = [r for r in runs if r]
+                slippage = [r['slippage_bps'] for r in runs if r['slippage_bps'] is not None]
+                fill_times = [r['time_to_fill'] for r in runs if r['time_to_fill'] is not None]
+                results.append((params, {
+                    'orders': len(runs),
+                    'fill_ratio': float(np.mean([r['fill_ratio'] for r in runs])) if runs else 0.0,
+                    'slippage_bps': float(np.mean(slippage)) if slippage else None,
+                    'time_to_fill': float(np.mean(fill_times)) if fill_times else None,
+                    'attempts': float(np.mean([r['attempts'] for r in runs])) if runs else 0.0,
+                    'late_fills': sum(1 for r in runs if r['late_fill_qty'] > 1e-12),
+                    'events': sum(r['events'] for r in runs),
+                }))
+    finally:
+        logger.setLevel(saved_level)
+    wall = time.perf_counter() - wall_start
+    events = sum(summary['events'] for _, summary in results)
+    logger.info(f"Execution study: {len(results)} settings × {n_orders} orders, {events:,} book/trade events "
+                f"in {wall:.1f}s ({events / wall * 60 if wall else 0:,.0f} events/min)")
+    return results
+
+if __name__ == "__main__":
+    # usage: python orderbook_replay.py convert <recording.jsonl> [UPBIT|COINONE] [out_dir]
+    #        python orderbook_replay.py study <log path, e.g. orderbooks/BTC_KRW> [BUY|SELL] [orders]
+    if len(sys.argv) < 3 or sys.argv[1] not in ("convert", "study"):
+        print("usage: python orderbook_replay.py convert <recording.jsonl> [UPBIT|COINONE] [out_dir]\n"
+              "       python orderbook_replay.py study <log path> [BUY|SELL] [orders]")
+        sys.exit(1)
+    if sys.argv[1] == "convert":
+        exchange_name = sys.argv[3].upper() if len(sys.argv) > 3 else config.active_exchange
+        out_dir = sys.argv[4] if len(sys.argv) > 4 else "orderbooks"
+        start = time.time()
+        counts = convert_recording(sys.argv[2], exchange_name, out_dir)
+        print(f"Converted {counts['book']:,} book snapshots and {counts['trade']:,} trades into {out_dir} in {time.time() - start:.1f}s")
+    else:
+        log_path = sys.argv[2]
+        side = sys.argv[3].upper() if len(sys.argv) > 3 else 'BUY'
+        n_orders = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+        base, quote = os.path.basename(log_path).split('_')
+        symbol = f"{base}/{quote}"
+        coin_budget = None
+        if side == 'SELL':
+            clock = VirtualClock(0)
+            api = SimulatedOrderBookAPI(OrderBookLog(log_path), symbol, clock)
+            clock.now = api.start_ms() / 1000
+            coin_budget = 100000 / (api.fetch_current_price(symbol) or 1)
+        results = run_execution_study(log_path, symbol, side=side, coin_budget=coin_budget, n_orders=n_orders)
+        results.sort(key=lambda r: (r[1]['slippage_bps'] is None, r[1]['slippage_bps'] or 0))
+        print(f"{'buffer':>7} {'retries':>7} {'wait':>5} | {'fill%':>6} {'slip bps':>9} {'fill s':>7} {'tries':>6} {'late':>5}")
+        for params, s in results:
+            slip = f"{s['slippage_bps']:9.1f}" if s['slippage_bps'] is not None else f"{'-':>9}"
+            fill_t = f"{s['time_to_fill']:7.1f}" if s['time_to_fill'] is not None else f"{'-':>7}"
+            print(f"{params.get('buffer_pct', 0):7.3f} {params.get('max_retries', 0):7d} {params.get('fill_wait', 0):5.1f} | "
+                  f"{s['fill_ratio']:6.1%} {slip} {fill_t} {s['attempts']:6.2f} {s['late_fills']:5d}")
@@ -0,0 +1,250 @@
+import re
+import time
+import threading
+from contextlib import contextmanager
+from config import config
+from logger import logger
+
+# Request priorities: lower number = more important
+PRIORITY_CRITICAL = 0   # Phase A stop checks and order calls: never shed
+PRIORITY_NORMAL = 1
+PRIORITY_DISCOVERY = 2  # Phase C breakout scanning: shed / postponed when the budget runs low
+
+# Per-exchange request limits per endpoint group: (per second, per minute)
+RATE_LIMITS = {
+    "UPBIT": {
+        "quotation": (10, 600),
+        "chart": (10, 600),
+        "exchange": (30, 900),
+        "order": (8, 200),
+    },
+    "COINONE": {
+        "quotation": (10, 300),
+        "chart": (10, 300),
+        "exchange": (10, 300),
+        "order": (10, 300),
+    },
+}
+
+# Upbit response header: "Remaining-Req: group=default; min=1800; sec=29"
+_REMAINING_REQ = re.compile(r"group=([\w-]+).*?sec=(\d+)")
+# Upbit Remaining-Req group → our endpoint group
+UPBIT_HEADER_GROUPS = {
+    "market": "quotation",
+    "ticker": "quotation",
+    "orderbook": "quotation",
+    "trades": "quotation",
+    "candles": "chart",
+    "default": "exchange",
+    "order": "order",
+}
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` stored."""
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self):
+        self._refill()
+        return self.tokens
+
+    def take(self, reserve=0.0):
+        """Takes one token if more than `reserve` tokens would remain available. Returns True on success."""
+        self._refill()
+        if self.tokens - 1 >= reserve:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def clamp(self, remaining):
+        """Trusts the server's view when it reports fewer remaining requests than we think we have."""
+        self._refill()
+        self.tokens = min(self.tokens, float(remaining))
+
+class RequestBudget:
+    """
+    Request budget scheduler shared by every exchange call.
+    Keeps a per-second and a per-minute token bucket per endpoint group, tightened by the
+    remaining quota the exchange reports in response headers. Critical calls (stop checks,
+    orders) wait for a token; discovery calls are shed while the group is below its reserve,
+    so a Phase C scan can never starve a sell.
+    """
+    def __init__(self, exchange_name=None, reserve_fraction=None, max_wait=2.0):
+        limits = RATE_LIMITS.get(exchange_name or config.active_exchange, RATE_LIMITS["UPBIT"])
+        self.reserve_fraction = config.rate_discovery_reserve if reserve_fraction is None else reserve_fraction
+        self.max_wait = max_wait
+        self._buckets = {
+            group: (TokenBucket(per_sec, per_sec), TokenBucket(per_min / 60.0, per_min))
+            for group, (per_sec, per_min) in limits.items()
+        }
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.shed = {}
+        self.waited = {}
+        self.throttled = {}
+
+    @contextmanager
+    def priority(self, level):
+        """Sets the priority of every budgeted request made by this thread inside the block."""
+        previous = getattr(self._local, 'priority', PRIORITY_NORMAL)
+        self._local.priority = level
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self):
+        return getattr(self._local, 'priority', PRIORITY_NORMAL)
+
+    def _reserve(self, bucket, priority):
+        if priority == PRIORITY_DISCOVERY:
+            return bucket.capacity * self.reserve_fraction
+        return 0.0
+
+    def acquire(self, group, priority=None):
+        """
+        Takes one request from `group`'s budget. Critical/normal requests wait (up to max_wait)
+        for a token; discovery requests return False immediately when the group is below its reserve.
+        """
+        buckets = self._buckets.get(group)
+        if buckets is None:
+            return True
+        priority = self.current_priority() if priority is None else priority
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self._lock:
+                sec_bucket, min_bucket = buckets
+                if (sec_bucket.available() - 1 >= self._reserve(sec_bucket, priority)
+                        and min_bucket.available() - 1 >= self._reserve(min_bucket, priority)):
+                    sec_bucket.take()
+                    min_bucket.take()
+                    return True
+                if priority == PRIORITY_DISCOVERY:
+                    self.shed[group] = self.shed.get(group, 0) + 1
+                    return False
+                delay = max(sec_bucket.wait_time(), min_bucket.wait_time(), 0.01)
+                self.waited[group] = self.waited.get(group, 0) + 1
+            if time.monotonic() + delay > deadline:
+                # Never block a critical call indefinitely on our own estimate; the exchange has the final say
+                return True
+            time.sleep(delay)
+
+    def charge(self, group, priority=None):
+        """acquire() for calls that have no quiet way to skip a request: raises RequestShed when it is shed."""
+        if not self.acquire(group, priority):
+            raise RequestShed(f"{group} budget reserved for risk checks")
+
+    def discovery_allowed(self, group):
+        """True while `group` has budget above the discovery reserve."""
+        buckets = self._buckets.get(group)
+        if buckets is None:
+            return True
+        with self._lock:
+            return all(b.available() - 1 >= self._reserve(b, PRIORITY_DISCOVERY) for b in buckets)
+
+    def update_from_headers(self, group, headers):
+        """
+        Reads Upbit's Remaining-Req header and clamps the per-second bucket of the group the header
+        names (which need not be the requesting call's `group`). Unknown header groups are ignored.
+        """
+        remaining = headers.get('Remaining-Req') if headers else None
+        match = _REMAINING_REQ.search(remaining) if remaining else None
+        if not match:
+            return
+        buckets = self._buckets.get(UPBIT_HEADER_GROUPS.get(match.group(1)))
+        if buckets is None:
+            return
+        with self._lock:
+            buckets[0].clamp(int(match.group(2)))
+
+    def penalize(self, group):
+        """Called on a 429: empties the group's per-second bucket so everyone backs off."""
+        buckets = self._buckets.get(group)
+        if buckets is None:
+            return
+        with self._lock:
+            buckets[0].tokens = 0.0
+            self.throttled[group] = self.throttled.get(group, 0) + 1
+        logger.warning(f"[Budget] {group} throttled by exchange (429). Discovery calls paused.")
+
+    def stats(self, reset=False):
+        with self._lock:
+            result = {
+                'shed': dict(self.shed),
+                'waited': dict(self.waited),
+                'throttled': dict(self.throttled),
+                'available': {g: round(b[0].available(), 1) for g, b in self._buckets.items()},
+            }
+            if reset:
+                self.shed, self.waited, self.throttled = {}, {}, {}
+        return result
+
+class AdaptiveRateLimiter:
+    """
+    Spacing between calls to an API whose real quota we don't know (Gemini free tier).
+    Calls are at least `interval` seconds apart. A 429 doubles the interval (up to max_interval)
+    and pushes the next slot back; every success shrinks it by `decay` toward min_interval.
+    """
+    def __init__(self, min_interval, max_interval=60.0, decay=0.8):
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max(max_interval, min_interval))
+        self.decay = decay
+        self.interval = self.min_interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+        self.waited = 0.0
+        self.throttled = 0
+
+    def acquire(self):
+        """Blocks until this caller's slot. Returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            delay = slot - now
+            self.waited += delay
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def wait_time(self):
+        """Seconds a call made now would wait for its slot."""
+        with self._lock:
+            return max(0.0, self._next_slot - time.monotonic())
+
+    def success(self):
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval * self.decay)
+
+    def penalize(self):
+        """Called on a 429: backs off before the next call is allowed."""
+        with self._lock:
+            self.interval = min(self.max_interval, self.interval * 2)
+            self._next_slot = max(self._next_slot, time.monotonic() + self.interval)
+            self.throttled += 1
+        logger.warning(f"[Budget] Gemini throttled (429). Spacing AI requests {self.interval:.1f}s apart.")
+
+    def stats(self, reset=False):
+        with self._lock:
+            result = {'interval': self.interval, 'waited': self.waited, 'throttled': self.throttled}
+            if reset:
+                self.waited, self.throttled = 0.0, 0
+        return result
+
+class RequestShed(Exception):
+    """Raised when a discovery request is dropped to keep budget for risk checks."""
+
+# Shared budget for the active exchange
+budget = RequestBudget()
@@ -0,0 +1,343 @@
+import os
+import sys
+import time
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+from config import config
+from logger import logger
+from candle_cache import CandleCache, TIMEFRAME_SECONDS, TIMEFRAME_ALIASES
+from candle_store import CandleStore
+from indicators import UniverseIndicators
+from exchange_api import PriceSnapshot
+from market_registry import MarketRegistry
+
+# Candles loaded before the replay window so 1h RSI / 4h BTC trend have history from the first cycle
+REPLAY_WARMUP_SEC = 86400
+
+class VirtualClock:
+    """
+    Replay time. install() swaps time.time/time.sleep for this clock, so every module that calls
+    time.time() (cooldowns, time stops, candle boundaries, snapshot age) sees the replayed moment.
+    Sleeping does not pass time: only the replay loop advances the clock.
+    """
+    def __init__(self, start):
+        self.now = float(start)
+        self._saved = None
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        pass
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    @contextmanager
+    def install(self):
+        self._saved = (time.time, time.sleep)
+        time.time, time.sleep = self.time, self.sleep
+        try:
+            yield self
+        finally:
+            time.time, time.sleep = self._saved
+            self._saved = None
+
+class _Series:
+    """One symbol's recorded base candles plus lazily built higher-timeframe aggregates."""
+    def __init__(self, candles, base_sec):
+        self.ts = np.asarray(candles['timestamp'], dtype=np.int64)
+        self.open = np.asarray(candles['open'], dtype=float)
+        self.high = np.asarray(candles['high'], dtype=float)
+        self.low = np.asarray(candles['low'], dtype=float)
+        self.close = np.asarray(candles['close'], dtype=float)
+        self.volume = np.asarray(candles['volume'], dtype=float)
+        self.base_sec = base_sec
+        # Traded KRW value prefix sums: 24h volume of any window in O(log n)
+        self.value_cum = np.concatenate(([0.0], np.cumsum(self.close * self.volume)))
+        self._aggregates = {}
+
+    def closed_count(self, now):
+        """Number of base candles closed at `now`."""
+        return int(np.searchsorted(self.ts, now - self.base_sec, side='right'))
+
+    def price(self, now):
+        """Last traded price at `now`: the open of the forming candle, else the last close (no look-ahead)."""
+        i = int(np.searchsorted(self.ts, now, side='right')) - 1
+        if i < 0:
+            return None
+        return float(self.open[i] if self.ts[i] + self.base_sec > now else self.close[i])
+
+    def value_24h(self, now):
+        end = self.closed_count(now)
+        begin = int(np.searchsorted(self.ts, now - 86400, side='left'))
+        return float(self.value_cum[end] - self.value_cum[min(begin, end)])
+
+    def aggregate(self, tf_sec):
+        """(start, open, high, low, close, volume) arrays of `tf_sec` candles built from the base candles."""
+        agg = self._aggregates.get(tf_sec)
+        if agg is None:
+            bucket = self.ts // tf_sec * tf_sec
+            starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+            ends = np.append(starts[1:], len(bucket)) - 1
+            agg = self._aggregates[tf_sec] = (
+                bucket[starts], self.open[starts], np.maximum.reduceat(self.high, starts),
+                np.minimum.reduceat(self.low, starts), self.close[ends], np.add.reduceat(self.volume, starts),
+            )
+        return agg
+
+    def rows(self, tf_sec, limit, now, to=None):
+        """
+        Up to `limit` candles as the exchange would serve them at `now`: closed candles, then the forming
+        candle built from the base candles closed so far in its interval and the current price.
+        With `to`, only candles starting before `to` (the page before it, when paging backwards).
+        """
+        price = self.price(now)
+        if price is None:
+            return None
+        if tf_sec == self.base_sec:
+            starts, o, h, l, c, v = self.ts, self.open, self.high, self.low, self.close, self.volume
+        else:
+            starts, o, h, l, c, v = self.aggregate(tf_sec)
+        period = int(now) // tf_sec * tf_sec
+        n_closed = int(np.searchsorted(starts, period, side='left'))
+        if to is not None:
+            n_closed = min(n_closed, int(np.searchsorted(starts, to, side='left')))
+        rows = [(int(starts[i]), float(o[i]), float(h[i]), float(l[i]), float(c[i]), float(v[i]))
+                for i in range(max(n_closed - limit, 0), n_closed)]
+        if to is not None and period >= to:
+            return rows
+
+        lo = int(np.searchsorted(self.ts, period, side='left'))
+        hi = self.closed_count(now)
+        if hi > lo:
+            forming = (period, float(self.open[lo]), max(float(self.high[lo:hi].max()), price),
+                       min(float(self.low[lo:hi].min()), price), price, float(self.volume[lo:hi].sum()))
+        else:
+            forming = (period, price, price, price, price, 0.0)
+        rows.append(forming)
+        return rows[-limit:]
+
+class SimulatedExchange:
+    """
+    Offline stand-in for CoinoneAPI / UpbitAPI over recorded candles, driven by a VirtualClock.
+    Prices and charts are served as of the clock's current time through the same PriceSnapshot,
+    CandleCache and MarketRegistry the live adapters use, and market orders fill immediately at the
+    current price (± slippage, minus fees) against simulated balances. Symbols use the 'BTC/KRW' format.
+    """
+    def __init__(self, clock, candles, base_timeframe, exchange_name=None, krw=1_000_000, fee_rate=0.0005, slippage=0.0):
+        self.clock = clock
+        self.exchange_name = exchange_name or config.active_exchange
+        base_sec = TIMEFRAME_SECONDS[TIMEFRAME_ALIASES.get(base_timeframe, base_timeframe)]
+        self.series = {symbol: _Series(columns, base_sec) for symbol, columns in candles.items()}
+        self.fee_rate = fee_rate
+        self.slippage = slippage
+        self.balances = {'KRW': float(krw)}
+        self.fills = []  # (time, symbol, side, qty, price, krw)
+        # StrategyVBD's Coinone volume scan calls exchange.fetch_tickers(): served from this object
+        self.exchange = self
+
+        self.prices = PriceSnapshot(self._fetch_all_prices)
+        self.candles = CandleCache(self.exchange_name, self._fetch_candles)
+        self.universe = UniverseIndicators(self.candles, self._fetch_candles, self.CANDLE_PAGE_SIZE)
+        self.markets = MarketRegistry(self.exchange_name, cache_path=None)
+
+    CANDLE_PAGE_SIZE = 500
+
+    def fetch_balance(self, ticker="KRW"):
+        return self.balances.get(ticker, 0.0)
+
+    def fetch_all_balances(self):
+        balances = {currency: amount for currency, amount in self.balances.items() if amount > 0 or currency == 'KRW'}
+        return {'free': dict(balances), 'total': dict(balances)}
+
+    def fetch_tickers(self):
+        """ccxt-shaped tickers: last price and 24h traded KRW value of every recorded symbol."""
+        now = self.clock.now
+        tickers = {}
+        for symbol, series in self.series.items():
+            price = series.price(now)
+            if price is not None:
+                tickers[symbol] = {'last': price, 'quoteVolume': series.value_24h(now)}
+        return tickers
+
+    def _fetch_all_prices(self):
+        now = self.clock.now
+        prices = {}
+        for symbol, series in self.series.items():
+            price = series.price(now)
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+    def fetch_current_price(self, symbol, force_refresh=False):
+        if not force_refresh:
+            price = self.prices.get(symbol)
+            if price:
+                return price
+        series = self.series.get(symbol)
+        return series.price(self.clock.now) if series else None
+
+    def fetch_ohlcv(self, symbol, timeframe='1d', limit=2):
+        return self.candles.get(symbol, timeframe, limit)
+
+    def _fetch_candles(self, symbol, timeframe, limit, to=None):
+        series = self.series.get(symbol)
+        tf_sec = TIMEFRAME_SECONDS.get(TIMEFRAME_ALIASES.get(timeframe, timeframe))
+        if series is None or tf_sec is None or tf_sec < series.base_sec:
+            return None
+        return series.rows(tf_sec, limit, self.clock.now, to=to)
+
+    def _fill(self, symbol, side, qty, price, krw):
+        self.fills.append((self.clock.now, symbol, side, qty, price, krw))
+        return {"result": "success", "orderId": f"sim-{len(self.fills)}", "filled_price": price}
+
+    def place_market_buy_order(self, symbol, cost_krw, on_done=None):
+        """Fills immediately (like Upbit market orders), so on_done is not used."""
+        price = self.fetch_current_price(symbol, force_refresh=True)
+        if not price or cost_krw < self.markets.min_notional(symbol) or cost_krw > self.balances['KRW']:
+            logger.warning(f"[{symbol}] Simulated buy of {cost_krw:,.0f} KRW rejected.")
+            return None
+        fill_price = price * (1 + self.slippage)
+        qty = self.markets.round_qty(symbol, cost_krw * (1 - self.fee_rate) / fill_price)
+        base = symbol.split('/')[0]
+        self.balances['KRW'] -= cost_krw
+        self.balances[base] = self.balances.get(base, 0.0) + qty
+        return self._fill(symbol, 'BUY', qty, fill_price, -cost_krw)
+
+    def place_market_sell_order(self, symbol, amount, on_done=None):
+        base = symbol.split('/')[0]
+        safe_amount = self.markets.round_qty(symbol, min(amount, self.balances.get(base, 0.0)))
+        price = self.fetch_current_price(symbol, force_refresh=True)
+        if not price:
+            return None
+        if safe_amount * price < self.markets.dust_limit(symbol):
+            return {"result": "dust_cleared", "filled_price": price}
+        fill_price = price * (1 - self.slippage)
+        proceeds = safe_amount * fill_price * (1 - self.fee_rate)
+        self.balances[base] -= safe_amount
+        self.balances['KRW'] += proceeds
+        return self._fill(symbol, 'SELL', safe_amount, fill_price, proceeds)
+
+    def equity(self):
+        """KRW plus every holding at the current price."""
+        total = self.balances['KRW']
+        for currency, amount in self.balances.items():
+            series = self.series.get(f"{currency}/KRW")
+            if currency != 'KRW' and amount > 0 and series is not None:
+                total += amount * (series.price(self.clock.now) or 0.0)
+        return total
+
+class _NullConsole:
+    """Drops the per-cycle dashboard (rendering it costs more than the cycle itself)."""
+    def print(self, *args, **kwargs):
+        pass
+
+@contextmanager
+def _replay_sandbox(quiet):
+    """Offline, side-effect-free run of main: Coinone-format symbols, real fills, state files in a temp dir."""
+    import main
+    import database
+    import trade_logger
+    import trade_ledger
+    saved_config = (config.active_exchange, config.dry_run)
+    saved_files = (database.DB_FILE, database.POSITIONS_FILE, trade_logger.TRADE_DIR)
+    saved_console, saved_level = main.console, logger.level
+    with tempfile.TemporaryDirectory(prefix="replay-") as tmp:
+        config.active_exchange, config.dry_run = "COINONE", False
+        database.DB_FILE = os.path.join(tmp, database.DB_FILE)
+        database.POSITIONS_FILE = os.path.join(tmp, database.POSITIONS_FILE)
+        trade_logger.TRADE_DIR = os.path.join(tmp, trade_logger.TRADE_DIR)
+        trade_ledger.ledger.reset()
+        main.console = _NullConsole() if quiet else saved_console
+        if quiet:
+            logger.setLevel("WARNING")
+        for state in (main.positions, main.cooldowns, main.pending_orders, main.sell_retry_after):
+            state.clear()
+        main.market_stream = None
+        main._cached_top_coins, main._top_coins_last_update = [], 0
+        try:
+            yield main
+        finally:
+            database.close()
+            trade_ledger.ledger.reset()
+            config.active_exchange, config.dry_run = saved_config
+            database.DB_FILE, database.POSITIONS_FILE, trade_logger.TRADE_DIR = saved_files
+            main.console = saved_console
+            logger.setLevel(saved_level)
+
+def run_replay(days=7, timeframe='1m', exchange_name=None, symbols=None, end=None, cycle_sec=60,
+               krw=1_000_000, fear_greed=50, fee_rate=0.0005, slippage=0.0, quiet=True, store=None):
+    """
+    Replays main.scan_and_trade every `cycle_sec` virtual seconds over the last `days` of stored
+    `timeframe` candles (candle_store), with the real MarketFilter, StrategyVBD and position logic
+    against a SimulatedExchange. The AI advisor auto-approves and news/F&G are fixed (`fear_greed`).
+    Returns a summary dict, or None when there are no stored candles.
+    """
+    from ai_advisor import AIAdvisor
+    from market_filter import MarketFilter
+    from strategy_vbd import StrategyVBD
+
+    exchange_name = exchange_name or config.active_exchange
+    store = store or CandleStore()
+    symbols = symbols or store.symbols(exchange_name, timeframe)
+    last = [store.last_timestamp(exchange_name, s, timeframe) for s in symbols]
+    last = [ts for ts in last if ts is not None]
+    if not last:
+        logger.error(f"No stored {exchange_name} {timeframe} candles to replay (run: python candle_store.py {exchange_name} {timeframe}).")
+        return None
+    tf_sec = TIMEFRAME_SECONDS[TIMEFRAME_ALIASES.get(timeframe, timeframe)]
+    end = end or max(last) + tf_sec
+    start = end - days * 86400
+    candles = {}
+    for symbol in symbols:
+        columns = store.load(exchange_name, symbol, timeframe, start=start - REPLAY_WARMUP_SEC, end=end)
+        if columns is not None and len(columns['timestamp']):
+            candles[symbol] = columns
+
+    clock = VirtualClock(start)
+    sim = SimulatedExchange(clock, candles, timeframe, exchange_name, krw=krw, fee_rate=fee_rate, slippage=slippage)
+    equity = []
+    cycles = 0
+    wall_start = time.perf_counter()
+    with clock.install(), _replay_sandbox(quiet) as main:
+        ai_advisor = AIAdvisor()
+        ai_advisor.active = False
+        market_filter = MarketFilter(ai_advisor, sim)
+        market_filter.fear_greed_score = fear_greed
+        strategy = StrategyVBD(k_value=config.vbd_k, exchange_api=sim)
+        while clock.now < end:
+            main.scan_and_trade(sim, ai_advisor, strategy, market_filter)
+            equity.append(sim.equity())
+            cycles += 1
+            clock.advance(cycle_sec)
+    wall = time.perf_counter() - wall_start
+
+    curve = np.array(equity) if equity else np.array([float(krw)])
+    buys = sum(1 for f in sim.fills if f[2] == 'BUY')
+    sells = sum(1 for f in sim.fills if f[2] == 'SELL')
+    return {
+        'symbols': len(candles),
+        'cycles': cycles,
+        'virtual_days': cycles * cycle_sec / 86400,
+        'wall_sec': wall,
+        'cycles_per_sec': cycles / wall if wall else 0.0,
+        'buys': buys,
+        'sells': sells,
+        'final_equity': float(curve[-1]),
+        'total_return': float(curve[-1] / krw - 1),
+        'max_drawdown': float(np.max(1 - curve / np.maximum.accumulate(curve))),
+        'open_positions': dict(main.positions),
+    }
+
+if __name__ == "__main__":
+    # usage: python replay.py [days] [timeframe]   (record candles first: python candle_store.py <EXCHANGE> 1m)
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 7
+    timeframe = sys.argv[2] if len(sys.argv) > 2 else '1m'
+    summary = run_replay(days=days, timeframe=timeframe)
+    if summary:
+        print(f"Replayed {summary['cycles']} cycles ({summary['virtual_days']:.1f} days, {summary['symbols']} symbols) "
+              f"in {summary['wall_sec']:.1f}s ({summary['cycles_per_sec']:.0f} cycles/s)")
+        print(f"Trades: {summary['buys']} buys / {summary['sells']} sells | Return {summary['total_return']:+.2%} | "
+              f"MDD {summary['max_drawdown']:.2%} | Open: {list(summary['open_positions'])}")
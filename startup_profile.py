@@ -0,0 +1,83 @@
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+class StartupProfiler:
+    """
+    Measures how long the bot takes to get from launch to managing stops.
+    install() wraps __import__ so every first-time module import is timed (main thread only);
+    step(name) times one init step. report() prints both, slowest first.
+    """
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.imports = {}   # module -> (inclusive_sec, self_sec)
+        self.steps = []     # (name, sec)
+        self._stack = []
+        self._original_import = None
+        self._main_thread = threading.main_thread()
+
+    def install(self):
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or threading.current_thread() is not self._main_thread:
+            return self._original_import(name, globals, locals, fromlist, level)
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            self.imports.setdefault(name, (elapsed, elapsed - children))
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def report(self, console, top=15):
+        from rich.table import Table
+
+        # Self time per top-level package: "ccxt.base.exchange" is charged to ccxt
+        packages = {}
+        for name, (_, self_sec) in self.imports.items():
+            root = name.split('.')[0]
+            packages[root] = packages.get(root, 0.0) + self_sec
+
+        imports_table = Table(title="Import time by package (self)", show_header=True, header_style="bold magenta")
+        imports_table.add_column("Package", style="cyan")
+        imports_table.add_column("ms", justify="right")
+        for root, sec in sorted(packages.items(), key=lambda x: x[1], reverse=True)[:top]:
+            imports_table.add_row(root, f"{sec*1000:.1f}")
+
+        steps_table = Table(title="Init steps", show_header=True, header_style="bold magenta")
+        steps_table.add_column("Step", style="cyan")
+        steps_table.add_column("ms", justify="right")
+        for name, sec in self.steps:
+            steps_table.add_row(name, f"{sec*1000:.1f}")
+
+        console.print(imports_table)
+        console.print(steps_table)
+        console.print(f"[bold]Total startup:[/bold] {self.elapsed():.2f}s "
+                      f"(imports {sum(packages.values()):.2f}s, steps {sum(s for _, s in self.steps):.2f}s)")
+
+# Created at import time so the clock starts as early as main.py can start it
+profiler = StartupProfiler()
@@ -0,0 +1,54 @@
+import json
+import types
+from ai_advisor import AIAdvisor, AIDeadlineExceeded, BATCH_ATTEMPTS
+from decision_cache import DecisionCache
+
+CANDIDATES = [(i, f"{base}/KRW", 1010.0, 1000.0, 60.0) for i, base in enumerate(("XRP", "ADA", "DOGE", "SOL"))]
+
+def advisor(answers):
+    """AIAdvisor whose batch requests are answered from `answers` ({symbol: decision} or an exception)."""
+    ai = AIAdvisor()
+    ai.active = True
+    ai.decisions = DecisionCache(path=None)
+    ai._history_text = lambda symbol: "No recent trade history."
+    ai.asked = []
+
+    def request(kind, prompt, deadline, request_config=None, on_late=None, on_late_error=None):
+        asked = [symbol for _, symbol, *_ in CANDIDATES if f"[{symbol}]" in prompt]
+        ai.asked.append(asked)
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        entries = [{"symbol": s, "decision": d, "reason": "test"} for s, d in answer.items() if s in asked]
+        return types.SimpleNamespace(text=json.dumps({"decisions": entries}))
+
+    ai.request = request
+    return ai
+
+def test_symbols_missing_from_the_batch_are_asked_again_in_one_request():
+    ai = advisor([{"XRP/KRW": "BUY", "ADA/KRW": "WAIT"}, {"DOGE/KRW": "BUY"}])
+    results = ai.analyze_breakouts(CANDIDATES, 0.5)
+    assert ai.asked == [["XRP/KRW", "ADA/KRW", "DOGE/KRW", "SOL/KRW"], ["DOGE/KRW", "SOL/KRW"]]
+    assert results["XRP/KRW"][0] and not results["ADA/KRW"][0] and results["DOGE/KRW"][0]
+    # Undecided after the retry: vetoed instead of one more request per symbol
+    assert results["SOL/KRW"] == (False, "No valid AI decision. Auto-veto.")
+    assert len(ai.asked) == BATCH_ATTEMPTS
+
+def test_invalid_batch_json_costs_at_most_one_retry():
+    ai = advisor([ValueError("boom"), {}])
+    results = ai.analyze_breakouts(CANDIDATES, 0.5)
+    assert len(ai.asked) == BATCH_ATTEMPTS
+    assert not any(approved for approved, _ in results.values())
+
+def test_missed_deadline_applies_the_policy_without_retrying():
+    ai = advisor([AIDeadlineExceeded("late", pending=True)])
+    results = ai.analyze_breakouts(CANDIDATES, 0.5)
+    assert len(ai.asked) == 1
+    assert set(results) == {symbol for _, symbol, *_ in CANDIDATES}
+
+def test_decisions_are_cached_for_the_next_cycle():
+    ai = advisor([{s: "BUY" for _, s, *_ in CANDIDATES}])
+    ai.analyze_breakouts(CANDIDATES, 0.5)
+    results = ai.analyze_breakouts(CANDIDATES, 0.5)
+    assert len(ai.asked) == 1
+    assert all(approved for approved, _ in results.values())
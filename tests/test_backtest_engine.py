@@ -0,0 +1,20 @@
+import numpy as np
+from backtest_engine import _first_stop
+
+def first_stop(high, low, trailing_stop_pct=0.03, hard_pct=0.05):
+    high, low = np.array(high, dtype=float), np.array(low, dtype=float)
+    n = len(low)
+    return _first_stop(np.array([0]), np.array([100.0]), np.array([n - 1]), n - 1, high, low,
+                       np.full(n, hard_pct), trailing_stop_pct)
+
+def test_a_bar_whose_high_and_stop_both_fall_inside_it_tests_the_low_first():
+    # Bar 1 trades 104..110: ordered high first it would trail to 110 * 0.985 and stop at its own low
+    stopped, _, _, _ = first_stop([100, 110], [100, 104])
+    assert not stopped[0]
+
+def test_the_bar_high_lifts_the_stop_from_the_next_bar_on():
+    stopped, offset, level, is_trailing = first_stop([100, 110, 108], [100, 104, 107])
+    assert stopped[0] and offset[0] == 1
+    # +7% at the low: the 1% protect trailing under the 110 high of the bar before
+    assert level[0] == np.float64(110) * (1 - 0.01)
+    assert is_trailing[0]
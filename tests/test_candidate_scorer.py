@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from candidate_scorer import fit_logistic
+
+def sample(n=20000, seed=3):
+    """Features on very different scales, labels drawn from a known logistic model."""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.normal(60, 10, n), rng.normal(0.004, 0.002, n), rng.normal(0, 1, n)])
+    coef = np.array([-0.05, 300.0, 0.0])
+    p = 1 / (1 + np.exp(-(X @ coef + 2.0)))
+    return X, rng.random(n) < p, coef
+
+def test_recovers_the_generating_model_on_the_raw_feature_scale():
+    X, y, coef = sample()
+    intercept, fitted = fit_logistic(X, y, l2=0.0)
+    assert fitted[:2] == pytest.approx(coef[:2], rel=0.1)
+    assert fitted[2] == pytest.approx(0.0, abs=0.05)
+    assert intercept == pytest.approx(2.0, abs=0.3)
+
+def test_penalised_fit_is_the_optimum_of_the_standardised_objective():
+    X, y, _ = sample(n=500)
+    l2 = 5.0
+    intercept, coef = fit_logistic(X, y, l2=l2)
+    mean, scale = X.mean(axis=0), X.std(axis=0)
+    w = coef * scale
+    p = 1 / (1 + np.exp(-(X @ coef + intercept)))
+    # Gradient of the log loss + l2/2 * |w|^2 (intercept unpenalised) vanishes at the fit
+    Z = (X - mean) / scale
+    assert np.sum(p - y) == pytest.approx(0.0, abs=1e-6)
+    assert Z.T @ (p - y) + l2 * w == pytest.approx(np.zeros(3), abs=1e-6)
+
+def test_constant_features_get_no_weight_and_the_intercept_is_the_base_rate():
+    X = np.column_stack([np.ones(40), np.full(40, 7.0)])
+    y = np.arange(40) < 10
+    intercept, coef = fit_logistic(X, y)
+    assert coef.tolist() == [0.0, 0.0]
+    assert 1 / (1 + np.exp(-intercept)) == pytest.approx(0.25)
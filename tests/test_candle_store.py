@@ -0,0 +1,67 @@
+import types
+import numpy as np
+import pytest
+import candle_store
+from candle_store import CandleStore
+
+MIN = 60
+NOW = 1_700_000_000 // MIN * MIN + 30   # 30s into a forming 1m candle
+
+def candle(ts, close=100.0):
+    return (ts, close, close + 1, close - 1, close, 2.0)
+
+class PagedAPI:
+    """_fetch_candles over a fixed candle list, paging backwards like the exchanges (newest page first)."""
+    CANDLE_PAGE_SIZE = 5
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.pages = 0
+
+    def _fetch_candles(self, symbol, timeframe, limit, to=None):
+        self.pages += 1
+        rows = [r for r in self.rows if to is None or r[0] < to]
+        return rows[-limit:]
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CandleStore(root=str(tmp_path))
+    store.now = NOW
+    monkeypatch.setattr(candle_store, 'time', types.SimpleNamespace(time=lambda: store.now))
+    return store
+
+def test_append_keeps_only_rows_newer_than_the_stored_ones(store):
+    assert store.append("UPBIT", "BTC/KRW", "1m", [candle(180), candle(60), candle(120)]) == 3
+    assert store.append("UPBIT", "KRW-BTC", "1m", [candle(120, 5.0), candle(240, 7.0)]) == 1
+    columns = store.load("UPBIT", "BTC/KRW", "1m")
+    assert list(columns['timestamp']) == [60, 120, 180, 240]
+    assert list(columns['close']) == [100.0, 100.0, 100.0, 7.0]
+    assert columns['timestamp'].dtype == np.int64
+    assert store.symbols("UPBIT", "1m") == ["BTC/KRW"]
+
+def test_load_slices_by_time_without_copying(store):
+    store.append("UPBIT", "BTC/KRW", "1m", [candle(t) for t in range(0, 600, 60)])
+    columns = store.load("UPBIT", "BTC/KRW", "1m", start=120, end=300)
+    assert list(columns['timestamp']) == [120, 180, 240]
+    assert isinstance(columns['close'], np.memmap)
+    assert store.load("UPBIT", "ETH/KRW", "1m") is None
+
+def test_sync_pages_back_to_since_and_skips_the_forming_candle(store):
+    since = NOW - 30 - 12 * MIN
+    api = PagedAPI([candle(t) for t in range(since - 3 * MIN, NOW, MIN)])
+    assert store.sync(api, "UPBIT", "BTC/KRW", "1m", since=since) == 12
+    ts = store.load("UPBIT", "BTC/KRW", "1m")['timestamp']
+    assert ts[0] == since and ts[-1] == NOW - 30 - MIN
+    assert api.pages == 3
+
+def test_sync_downloads_only_bars_after_the_last_stored_one(store):
+    since = NOW - 30 - 12 * MIN
+    api = PagedAPI([candle(t) for t in range(since, NOW, MIN)])
+    assert store.sync(api, "UPBIT", "BTC/KRW", "1m", since=since) == 12
+    # One minute later the formerly forming candle has closed and a new one is forming
+    store.now += MIN
+    api.rows.append(candle(NOW - 30 + MIN))
+    api.pages = 0
+    assert store.sync(api, "UPBIT", "BTC/KRW", "1m") == 1
+    assert api.pages == 1
+    assert store.last_timestamp("UPBIT", "BTC/KRW", "1m") == NOW - 30
@@ -0,0 +1,61 @@
+import json
+import threading
+import pytest
+from database import PositionJournal
+
+BTC = {'buy_price': 100.0, 'highest_price': 100.0, 'amount': 0.5, 'buy_time': 1700000000}
+ETH = {'buy_price': 5.0, 'highest_price': 5.0, 'amount': 2.0, 'buy_time': 1700000100}
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "open_positions.json")
+
+def journal_lines(path):
+    with open(path + ".journal") as f:
+        return [json.loads(line) for line in f]
+
+def test_only_changed_symbols_are_appended(path):
+    journal = PositionJournal(path)
+    journal.save({'BTC/KRW': BTC, 'ETH/KRW': ETH})
+    journal.save({'BTC/KRW': BTC, 'ETH/KRW': ETH})
+    journal.save({'BTC/KRW': dict(BTC, highest_price=110.0)})
+    assert journal_lines(path) == [
+        {'set': 'BTC/KRW', 'position': BTC}, {'set': 'ETH/KRW', 'position': ETH},
+        {'del': 'ETH/KRW'}, {'set': 'BTC/KRW', 'position': dict(BTC, highest_price=110.0)},
+    ]
+    assert PositionJournal(path).load() == {'BTC/KRW': dict(BTC, highest_price=110.0)}
+
+def test_a_torn_last_line_is_dropped_and_folded_into_the_snapshot(path):
+    journal = PositionJournal(path)
+    journal.save({'BTC/KRW': BTC})
+    journal.save({'BTC/KRW': BTC, 'ETH/KRW': ETH})
+    # Crash halfway through the next append
+    with open(path + ".journal", 'a') as f:
+        f.write('{"set": "BTC/KRW", "position": {"buy_pri')
+
+    recovered = PositionJournal(path)
+    assert recovered.load() == {'BTC/KRW': BTC, 'ETH/KRW': ETH}
+    # The good lines went to the snapshot and the journal was emptied, so new appends stay readable
+    with open(path) as f:
+        assert json.load(f) == {'BTC/KRW': BTC, 'ETH/KRW': ETH}
+    assert journal_lines(path) == []
+    recovered.save({'ETH/KRW': ETH})
+    assert PositionJournal(path).load() == {'ETH/KRW': ETH}
+
+def test_compaction_every_compact_lines(path):
+    journal = PositionJournal(path, compact_lines=3)
+    for i in range(4):
+        journal.save({'BTC/KRW': dict(BTC, highest_price=100.0 + i)})
+    assert len(journal_lines(path)) == 1
+    assert PositionJournal(path).load() == {'BTC/KRW': dict(BTC, highest_price=103.0)}
+
+def test_batch_coalesces_its_own_thread_but_not_others(path):
+    journal = PositionJournal(path)
+    with journal.batch():
+        journal.save({'BTC/KRW': BTC})
+        journal.save({'BTC/KRW': dict(BTC, highest_price=105.0)})
+        other = threading.Thread(target=journal.save, args=({'BTC/KRW': BTC, 'ETH/KRW': ETH},))
+        other.start()
+        other.join()
+        assert journal_lines(path) == [{'set': 'BTC/KRW', 'position': BTC}, {'set': 'ETH/KRW', 'position': ETH}]
+    assert journal_lines(path)[2:] == [{'del': 'ETH/KRW'}, {'set': 'BTC/KRW', 'position': dict(BTC, highest_price=105.0)}]
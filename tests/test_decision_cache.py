@@ -0,0 +1,72 @@
+import types
+import pytest
+import decision_cache
+from decision_cache import DecisionCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1_700_000_100.0)
+    monkeypatch.setattr(decision_cache, 'time', types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+def cache(path=None, **kwargs):
+    kwargs = dict(dict(ttl=600, max_entries=3, distance_bucket_pct=0.5, rsi_bucket=5), **kwargs)
+    return DecisionCache(path=path, **kwargs)
+
+def test_key_buckets_the_context_within_one_15m_candle(clock):
+    c = cache()
+    key = c.key('XRP/KRW', 1002.0, 1000.0, 61.0)
+    assert key == c.key('XRP/KRW', 1004.0, 1000.0, 64.9)
+    assert key != c.key('XRP/KRW', 1006.0, 1000.0, 61.0)
+    assert key != c.key('XRP/KRW', 1002.0, 1000.0, 65.0)
+    clock.now += decision_cache.DECISION_PERIOD_SEC
+    assert key != c.key('XRP/KRW', 1002.0, 1000.0, 61.0)
+
+def test_entries_expire_after_the_ttl(clock):
+    c = cache()
+    c.put('a', True, "ok")
+    clock.now += 600
+    assert c.get('a') == (True, "ok")
+    assert c.latest('XRP/KRW') is None
+    clock.now += 1
+    assert c.get('a') is None
+    assert (c.hits, c.misses) == (1, 1)
+
+def test_the_least_recently_used_entry_is_dropped(clock):
+    c = cache()
+    for key in ('a', 'b', 'c'):
+        c.put(key, True, key)
+    c.get('a')
+    c.put('d', False, "d")
+    assert c.get('b') is None
+    assert [c.get(key) is not None for key in ('a', 'c', 'd')] == [True, True, True]
+
+def test_latest_returns_the_newest_decision_on_a_symbol(clock):
+    c = cache()
+    c.put('XRP/KRW|1|0|12', True, "first")
+    clock.now += 10
+    c.put('XRP/KRW|1|2|13', False, "second")
+    c.put('XRPX/KRW|1|0|12', True, "other symbol")
+    assert c.latest('XRP/KRW') == (False, "second")
+
+def test_restart_keeps_live_entries_in_lru_order(clock, tmp_path):
+    path = str(tmp_path / "cache.json")
+    c = cache(path)
+    c.put('a', True, "a")
+    clock.now += 500
+    c.put('b', False, "b")
+    c.put('c', True, "c")
+    c.get('b')
+    c.put('d', True, "d")
+    clock.now += 200
+    # Saved as c, b, d: 'c' is still the least recently used after the restart
+    restarted = cache(path)
+    restarted.put('e', True, "e")
+    assert restarted.get('c') is None
+    assert restarted.get('b') == (False, "b") and restarted.get('d') == (True, "d")
+
+def test_expired_entries_are_not_loaded(clock, tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache(path).put('a', True, "a")
+    clock.now += 601
+    assert cache(path)._entries == {}
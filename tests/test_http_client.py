@@ -0,0 +1,67 @@
+import pytest
+import requests
+import http_client
+from http_client import HttpClient
+
+class Response:
+    def __init__(self, status_code, headers=None, content=b"{}"):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+
+class ScriptedSession:
+    """Session answering each request with the next scripted response (or raising it)."""
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+@pytest.fixture
+def client(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(http_client.time, 'sleep', sleeps.append)
+    client = HttpClient(connect_timeout=1, read_timeout=1, max_retries=3, pool_size=1)
+    client.sleeps = sleeps
+    return client
+
+def send(client, answers, **kwargs):
+    session = ScriptedSession(answers)
+    client.session_for = lambda host: session
+    return client.get("https://api.test/v1/ticker", endpoint="ticker", **kwargs), session
+
+def test_retries_5xx_and_connection_errors_until_a_response(client):
+    response, session = send(client, [Response(502), requests.ConnectionError("reset"), Response(200)])
+    assert response.status_code == 200
+    assert session.calls == 3
+    stats = client.stats()['ticker']
+    assert (stats['count'], stats['errors'], stats['retries']) == (3, 2, 2)
+
+def test_backoff_is_jittered_exponential_and_capped(client, monkeypatch):
+    monkeypatch.setattr(http_client.random, 'uniform', lambda low, high: high)
+    send(client, [Response(503)] * 4)
+    assert client.sleeps == [0.3, 0.6, 1.2]
+    assert client._backoff(10) == client.backoff_max
+
+def test_retry_after_header_sets_the_delay(client):
+    send(client, [Response(429, {'Retry-After': '2'}), Response(200)])
+    assert client.sleeps == [2.0]
+
+def test_the_last_response_is_returned_once_retries_run_out(client):
+    response, session = send(client, [Response(500)] * 2, retries=1)
+    assert response.status_code == 500
+    assert session.calls == 2
+
+def test_client_errors_are_not_retried(client):
+    response, session = send(client, [Response(404)])
+    assert response.status_code == 404
+    assert session.calls == 1 and client.sleeps == []
+
+def test_connection_error_is_raised_after_the_last_retry(client):
+    with pytest.raises(requests.Timeout):
+        send(client, [requests.Timeout("slow")] * 2, retries=1)
@@ -0,0 +1,84 @@
+import types
+import numpy as np
+import pytest
+import indicators
+from indicators import UniverseIndicators, wilder_step
+
+HOUR = 3600
+START = 1_700_000_000 // HOUR * HOUR
+CLOSES = 1000 * np.exp(np.cumsum(np.random.default_rng(7).normal(0, 0.01, 1000)))
+
+class Clock:
+    def __init__(self):
+        self.now = START
+
+    def at_hour(self, hour):
+        self.now = START + hour * HOUR + 100
+
+    def candles(self):
+        """Every 1h candle up to and including the forming one."""
+        last = int((self.now - START) // HOUR)
+        return [(START + i * HOUR, c, c, c, c, 1.0) for i, c in enumerate(CLOSES[:last + 1])]
+
+class FakeCandles:
+    """The part of CandleCache UniverseIndicators uses, serving the clock's candles."""
+    def __init__(self, clock):
+        self.clock = clock
+        self._key_func = lambda symbol: symbol
+
+    def on_close(self, listener):
+        pass
+
+    def rows(self, symbol, timeframe, limit):
+        return self.clock.candles()[-limit:]
+
+def full_rsi(first, last_closed, forming_close, length=14):
+    """Wilder RSI recomputed from candle `first` to `last_closed`, plus the forming candle's close."""
+    gain = loss = 0.0
+    for prev, close in zip(CLOSES[first:last_closed], CLOSES[first + 1:last_closed + 1]):
+        gain, loss = wilder_step(gain, loss, prev, close, length)
+    gain, loss = wilder_step(gain, loss, CLOSES[last_closed], forming_close, length)
+    return 100 - 100 / (1 + gain / loss)
+
+@pytest.fixture
+def universe(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(indicators, 'time', types.SimpleNamespace(time=lambda: clock.now))
+    fetches = []
+
+    def fetcher(symbol, timeframe, limit, to=None):
+        fetches.append(limit)
+        rows = [r for r in clock.candles() if to is None or r[0] < to]
+        return rows[-limit:]
+
+    uni = UniverseIndicators(FakeCandles(clock), fetcher, page_size=200, seed_candles=300)
+    return uni, clock, fetches
+
+def current_rsi(uni, hour):
+    row = uni._rows['XRP/KRW']
+    return uni.rsi.values(np.array([row]), np.array([CLOSES[hour]]))[0]
+
+def test_seeded_rsi_matches_a_full_recompute(universe):
+    uni, clock, _ = universe
+    clock.at_hour(400)
+    uni.refresh('XRP/KRW', timeframes=('1h',))
+    assert current_rsi(uni, 400) == pytest.approx(full_rsi(100, 399, CLOSES[400]))
+
+def test_rsi_after_one_closed_candle_matches_a_full_recompute(universe):
+    uni, clock, _ = universe
+    clock.at_hour(400)
+    uni.refresh('XRP/KRW', timeframes=('1h',))
+    clock.at_hour(401)
+    uni.refresh('XRP/KRW', timeframes=('1h',))
+    assert current_rsi(uni, 401) == pytest.approx(full_rsi(100, 400, CLOSES[401]))
+
+def test_rsi_after_a_gap_catches_up_on_every_missed_candle(universe):
+    uni, clock, fetches = universe
+    clock.at_hour(400)
+    uni.refresh('XRP/KRW', timeframes=('1h',))
+    # Out of the scan targets for 10 hours: no close notifications arrived meanwhile
+    clock.at_hour(410)
+    uni.refresh('XRP/KRW', timeframes=('1h',))
+    assert current_rsi(uni, 410) == pytest.approx(full_rsi(100, 409, CLOSES[410]))
+    # Only the missed candles were downloaded, not a new seed
+    assert fetches[-1] < uni.seed_candles
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+import types
+import pandas as pd
+import pytest
+import main
+import market_stream
+from market_stream import MarketStream, ReplayServer
+
+RECORDING = os.path.join(os.path.dirname(__file__), 'data', 'upbit_ticker.jsonl')
+
+class BackfillAPI:
+    """REST side of the exchange during the reconnect: 1m highs of the gap and the current prices."""
+    def __init__(self):
+        self.prices = types.SimpleNamespace(refresh=lambda force=False: None)
+        self.sells = []
+        self.sold = threading.Event()
+
+    def fetch_ohlcv(self, symbol, timeframe='1d', limit=2):
+        return pd.DataFrame({'high': [102500000.0, 105000000.0, 103800000.0]})
+
+    def fetch_current_price(self, symbol, force_refresh=False):
+        return {'BTC/KRW': 103000000.0, 'ETH/KRW': 5010000.0}[symbol]
+
+    def place_market_sell_order(self, symbol, amount, on_done=None):
+        self.sells.append((symbol, amount))
+        self.sold.set()
+        return {"result": "pending", "orderId": "sell-1", "filled_price": None}
+
+@pytest.fixture
+def bot_state(monkeypatch):
+    monkeypatch.setattr(main.config, 'dry_run', True)
+    monkeypatch.setattr(main, 'positions', {
+        'BTC/KRW': {'buy_price': 100000000.0, 'highest_price': 100000000.0, 'amount': 0.01, 'buy_time': time.time()},
+    })
+    monkeypatch.setattr(main, 'pending_orders', {})
+    monkeypatch.setattr(main, 'sell_retry_after', {})
+    return main
+
+def test_recorded_ticks_reconnect_backfill_and_stop(bot_state, monkeypatch):
+    # Every reconnect looks two minutes long, so the backfill also fetches the 1m highs of the gap
+    real_time = time.time
+    monkeypatch.setattr(market_stream, 'time', types.SimpleNamespace(
+        time=lambda: real_time() + 120 * stream.reconnects, sleep=time.sleep))
+
+    api = BackfillAPI()
+    market_filter = types.SimpleNamespace(fear_greed_score=50, news_panic_flag=False)
+    ticks = []
+
+    def on_tick(symbol, price):
+        ticks.append((symbol, price))
+        main.handle_price_tick(api, market_filter, symbol, price)
+
+    server = ReplayServer.from_file(RECORDING, disconnect_after=3).start()
+    stream = MarketStream("UPBIT", on_tick=on_tick, exchange_api=api, url=server.url, record_path="",
+                          on_high=main.raise_highest_price)
+    stream.set_symbols(['BTC/KRW'], watched=['ETH/KRW'])
+    stream.start()
+    try:
+        assert api.sold.wait(10)
+        deadline = time.time() + 10
+        while stream.get_price('ETH/KRW') != 5000000.0 and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        stream.stop()
+        server.stop()
+
+    assert server.connections == 2
+    assert stream.reconnects == 1
+    # The gap's high only lifted the running high; no tick carried it
+    assert ('BTC/KRW', 105000000.0) not in ticks
+    assert main.positions['BTC/KRW']['highest_price'] == 105000000.0
+    # +3% profit tightens the trailing stop to 1.5% below 105M: the fresh REST price of 103M sells
+    assert [price for symbol, price in ticks if symbol == 'BTC/KRW'] == [100000000.0, 101000000.0, 102000000.0, 103000000.0]
+    assert api.sells == [('BTC/KRW', 0.01)]
+    assert main.pending_orders['BTC/KRW']['side'] == 'SELL'
+    # Streaming resumed after the backfill
+    assert stream.get_price('ETH/KRW') == 5000000.0
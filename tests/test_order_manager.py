@@ -0,0 +1,110 @@
+import pytest
+from order_manager import OrderManager
+from exchange_api import CoinoneAPI
+
+class ScriptedAPI:
+    """Exchange stub: a fixed market price and one scripted _query_order answer per call."""
+    def __init__(self, statuses, price=100.0):
+        self.statuses = list(statuses)
+        self.price = price
+        self.placed = []
+        self.cancels = 0
+
+    def fetch_current_price(self, symbol, force_refresh=False):
+        return self.price
+
+    def _limit_price(self, symbol, side, price):
+        return price * 1.015 if side == 'BUY' else price * 0.985
+
+    def _amount_to_tick(self, symbol, amount):
+        return round(amount, 4)
+
+    def _place_limit_order(self, symbol, side, price, qty):
+        self.placed.append((price, qty))
+        return f"order-{len(self.placed)}"
+
+    def _query_order(self, symbol, order_id):
+        return self.statuses.pop(0)(self.placed[-1][1])
+
+    def _cancel_order(self, symbol, side, order_id, price, qty):
+        self.cancels += 1
+
+def run(api, side, **budget):
+    manager = OrderManager(api, fill_wait=0, cancel_wait=0, autostart=False)
+    order = manager.submit('XRP/KRW', side, **budget)
+    while not order.done:
+        manager.poll()
+    return order
+
+def test_buy_books_partial_and_cancel_window_fills_then_reprices_the_rest():
+    api = ScriptedAPI([
+        lambda qty: {'status': 'live', 'qty': qty, 'remain_qty': qty - 30, 'avg_price': 100.5},
+        # 30 more filled while the cancel was in flight
+        lambda qty: {'status': 'canceled', 'qty': qty, 'remain_qty': qty - 60, 'avg_price': 100.4},
+        lambda qty: {'status': 'filled', 'qty': qty, 'remain_qty': 0, 'avg_price': 100.2},
+    ])
+    order = run(api, 'BUY', krw_budget=10000)
+
+    assert api.cancels == 1
+    first_qty, second_qty = api.placed[0][1], api.placed[1][1]
+    # The reprice is sized from the KRW left after the 60 coins booked at 100.4
+    assert order.remaining_krw + second_qty * 100.2 == pytest.approx(10000 - 60 * 100.4)
+    assert second_qty == round((10000 - 60 * 100.4) / (100.0 * 1.015), 4)
+    assert order.filled_qty == pytest.approx(60 + second_qty)
+    assert order.filled_cost == pytest.approx(60 * 100.4 + second_qty * 100.2)
+    assert order.result['result'] == 'success'
+    assert first_qty > 60
+
+def test_fills_without_avg_price_are_booked_at_the_reference_price():
+    api = ScriptedAPI([lambda qty: {'status': 'filled', 'qty': qty, 'remain_qty': 0}])
+    order = run(api, 'BUY', krw_budget=10000)
+    assert order.avg_price == 100.0
+    assert order.filled_cost == pytest.approx(order.filled_qty * 100.0)
+
+def test_sell_closed_by_the_exchange_reprices_only_the_unfilled_part():
+    api = ScriptedAPI([
+        lambda qty: {'status': 'canceled', 'qty': qty, 'remain_qty': qty - 20},
+        lambda qty: {'status': 'canceled', 'qty': qty, 'remain_qty': qty - 20},
+        lambda qty: {'status': 'filled', 'qty': qty, 'remain_qty': 0},
+    ])
+    order = run(api, 'SELL', coin_budget=50)
+    assert [qty for _, qty in api.placed] == [50, 30]
+    assert order.filled_qty == 50
+    assert order.remaining_coin == 0
+
+def test_unfilled_order_after_max_retries_reports_no_result():
+    api = ScriptedAPI([lambda qty: {'status': 'canceled', 'qty': qty, 'remain_qty': qty}] * 10)
+    order = run(api, 'BUY', krw_budget=10000)
+    assert order.result is None
+    assert len(api.placed) == order.max_retries
+
+class RecordedCoinone:
+    """ccxt Coinone client answering with the v2 query_order / complete_orders response layout."""
+    def v2PrivatePostOrderQueryOrder(self, params):
+        return {
+            "result": "success", "errorCode": "0", "status": "partially_filled",
+            "info": {"price": "1020.0", "qty": "100.0", "remainQty": "40.0", "feeRate": "0.002",
+                     "fee": "0", "orderId": params['order_id'], "timestamp": "1700000000",
+                     "type": "bid", "currency": "XRP"},
+        }
+
+    def v2PrivatePostOrderCompleteOrders(self, params):
+        return {
+            "result": "success", "errorCode": "0",
+            "completeOrders": [
+                {"timestamp": "1700000001", "price": "1004.0", "type": "bid", "qty": "20.0",
+                 "feeRate": "0.002", "fee": "0.04", "orderId": "a1b2c3d4-0000-4000-8000-000000000001"},
+                {"timestamp": "1700000002", "price": "1001.0", "type": "bid", "qty": "40.0",
+                 "feeRate": "0.002", "fee": "0.08", "orderId": "A1B2C3D4-0000-4000-8000-000000000001"},
+                {"timestamp": "1699999000", "price": "990.0", "type": "ask", "qty": "5.0",
+                 "feeRate": "0.002", "fee": "9.9", "orderId": "FFFFFFFF-0000-4000-8000-000000000009"},
+            ],
+        }
+
+def test_coinone_query_order_reports_the_average_executed_price():
+    api = object.__new__(CoinoneAPI)
+    api.exchange = RecordedCoinone()
+    status = api._query_order('XRP/KRW', "A1B2C3D4-0000-4000-8000-000000000001")
+    assert status['status'] == 'partially_filled'
+    assert status['qty'] - status['remain_qty'] == 60
+    assert status['avg_price'] == pytest.approx((20 * 1004 + 40 * 1001) / 60)
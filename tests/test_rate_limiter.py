@@ -0,0 +1,84 @@
+import types
+import pytest
+import rate_limiter
+from rate_limiter import (TokenBucket, RequestBudget, AdaptiveRateLimiter, RequestShed,
+                          PRIORITY_CRITICAL, PRIORITY_DISCOVERY)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock; sleep() advances it instead of blocking."""
+    clock = types.SimpleNamespace(now=1000.0, slept=[])
+
+    def sleep(seconds):
+        clock.slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limiter, 'time', types.SimpleNamespace(monotonic=lambda: clock.now, sleep=sleep))
+    return clock
+
+def test_bucket_refills_at_its_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    assert all(bucket.take() for _ in range(4))
+    assert not bucket.take()
+    assert bucket.wait_time() == pytest.approx(0.5)
+    clock.now += 1
+    assert bucket.available() == pytest.approx(2)
+    clock.now += 60
+    assert bucket.available() == 4
+
+def test_bucket_keeps_the_reserve_and_trusts_a_lower_server_count(clock):
+    bucket = TokenBucket(rate=1, capacity=10)
+    assert bucket.take(reserve=8)
+    assert not bucket.take(reserve=8.5)
+    bucket.clamp(3)
+    assert bucket.available() == 3
+    bucket.clamp(50)
+    assert bucket.available() == 3
+
+def test_discovery_is_shed_below_the_reserve_while_critical_calls_go_through(clock):
+    budget = RequestBudget("UPBIT", reserve_fraction=0.3)
+    # order: 8 per second, discovery keeps 2.4 of them
+    with budget.priority(PRIORITY_DISCOVERY):
+        taken = sum(budget.acquire("order") for _ in range(8))
+        assert not budget.discovery_allowed("order")
+        with pytest.raises(RequestShed):
+            budget.charge("order")
+    assert taken == 5
+    assert budget.stats()['shed'] == {"order": 4}
+    assert budget.acquire("order", PRIORITY_CRITICAL)
+    assert budget.acquire("unknown-group", PRIORITY_DISCOVERY)
+
+def test_critical_calls_wait_for_a_token_but_never_past_max_wait(clock):
+    budget = RequestBudget("UPBIT", reserve_fraction=0.3, max_wait=2.0)
+    for _ in range(8):
+        budget.acquire("order", PRIORITY_CRITICAL)
+    assert budget.acquire("order", PRIORITY_CRITICAL)
+    assert clock.slept and sum(clock.slept) <= 2.0
+    assert budget.stats(reset=True)['waited'] == {"order": 1}
+    budget.penalize("order")
+    clock.slept.clear()
+    budget.max_wait = 0.1
+    # The next token is further away than max_wait: the exchange gets the call and has the final say
+    assert budget.acquire("order", PRIORITY_CRITICAL)
+    assert clock.slept == []
+    assert budget.stats()['throttled'] == {"order": 1}
+
+def test_remaining_req_header_clamps_the_group_it_names(clock):
+    budget = RequestBudget("UPBIT")
+    budget.update_from_headers("chart", {'Remaining-Req': "group=candles; min=1800; sec=1"})
+    assert budget.stats()['available']["chart"] == 1
+    assert budget.stats()['available']["quotation"] == 10
+    budget.update_from_headers("chart", {'Remaining-Req': "group=unknown; min=1; sec=0"})
+    assert budget.stats()['available'] == {"quotation": 10, "chart": 1, "exchange": 30, "order": 8}
+
+def test_adaptive_limiter_spaces_calls_and_backs_off_on_429(clock):
+    limiter = AdaptiveRateLimiter(min_interval=1.0, max_interval=4.0, decay=0.5)
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == pytest.approx(1.0)
+    limiter.penalize()
+    limiter.penalize()
+    limiter.penalize()
+    assert limiter.interval == 4.0
+    assert limiter.wait_time() == pytest.approx(4.0)
+    limiter.success()
+    assert limiter.interval == 2.0
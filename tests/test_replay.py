@@ -0,0 +1,41 @@
+import types
+import numpy as np
+import pytest
+import indicators
+from replay import _Series
+from indicators import closed_history
+
+# Twenty 1m candles from t=0; candle i opens at 100 + i and closes at 100.5 + i
+TS = np.arange(0, 1200, 60)
+OPEN = 100.0 + np.arange(20)
+
+@pytest.fixture
+def series():
+    return _Series({'timestamp': TS, 'open': OPEN, 'high': OPEN + 1, 'low': OPEN - 1,
+                    'close': OPEN + 0.5, 'volume': np.ones(20)}, 60)
+
+def test_rows_end_with_the_forming_candle_at_the_current_price(series):
+    rows = series.rows(60, 5, now=1150)
+    assert [r[0] for r in rows] == [900, 960, 1020, 1080, 1140]
+    # 10s into candle 19: only its open has traded
+    assert rows[-1] == (1140, 119.0, 119.0, 119.0, 119.0, 0.0)
+    assert series.rows(60, 5, now=-1) is None
+
+def test_higher_timeframe_forming_candle_only_sees_closed_base_candles(series):
+    rows = series.rows(300, 3, now=1150)
+    assert rows[:2] == [(300, 105.0, 110.0, 104.0, 109.5, 5.0), (600, 110.0, 115.0, 109.0, 114.5, 5.0)]
+    # 5m candle from 900: base candles 15..18 closed, 19 forming at its open
+    assert rows[2] == (900, 115.0, 119.0, 114.0, 119.0, 4.0)
+
+def test_rows_before_to_are_the_page_preceding_it(series):
+    assert [r[0] for r in series.rows(60, 5, now=1150, to=600)] == [300, 360, 420, 480, 540]
+    assert [r[0] for r in series.rows(60, 5, now=1150, to=120)] == [0, 60]
+    # A `to` past the forming candle changes nothing
+    assert series.rows(60, 5, now=1150, to=2000) == series.rows(60, 5, now=1150)
+
+def test_closed_history_pages_through_the_whole_recording(series, monkeypatch):
+    monkeypatch.setattr(indicators, 'time', types.SimpleNamespace(time=lambda: 1150))
+    fetcher = lambda symbol, timeframe, limit, to=None: series.rows(60, limit, 1150, to=to)
+    rows = closed_history(fetcher, 'BTC/KRW', '1m', 15, page_size=4)
+    assert [r[0] for r in rows] == list(range(240, 1140, 60))
+    assert rows[-1][4] == 118.5
@@ -0,0 +1,144 @@
+import bisect
+import threading
+import time
+from collections import deque
+import database
+import trade_logger
+
+# Rolling windows kept up to date on every trade
+WINDOWS = {'1d': 86400, '3d': 3 * 86400, '7d': 7 * 86400}
+
+class _Totals:
+    __slots__ = ('trades', 'wins', 'net_pnl', 'fees', 'net_pct')
+
+    def __init__(self):
+        self.trades = 0
+        self.wins = 0
+        self.net_pnl = 0.0
+        self.fees = 0.0
+        self.net_pct = 0.0
+
+    def add(self, trade, sign=1):
+        self.trades += sign
+        self.wins += sign * (trade['net_pnl_krw'] > 0)
+        self.net_pnl += sign * trade['net_pnl_krw']
+        self.fees += sign * trade['fee_krw']
+        self.net_pct += sign * _net_pct(trade)
+        if not self.trades:
+            # Exact zero once the window is empty, so float drift never accumulates
+            self.net_pnl = self.fees = self.net_pct = 0.0
+
+def _net_pct(trade):
+    """Net return of one trade in % of the position's buy value."""
+    buy_value = trade['buy_price'] * trade['amount']
+    return trade['net_pnl_krw'] / buy_value * 100 if buy_value else 0.0
+
+class _Window:
+    """Trades of the last `seconds`, with overall and per-symbol totals adjusted as trades enter and leave."""
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.trades = deque()
+        self.total = _Totals()
+        self.by_symbol = {}
+
+    def add(self, trade):
+        self.trades.append(trade)
+        self.total.add(trade)
+        self.by_symbol.setdefault(trade['symbol'], _Totals()).add(trade)
+
+    def expire(self, now):
+        cutoff = now - self.seconds
+        while self.trades and self.trades[0]['timestamp'] < cutoff:
+            trade = self.trades.popleft()
+            self.total.add(trade, -1)
+            totals = self.by_symbol[trade['symbol']]
+            totals.add(trade, -1)
+            if not totals.trades:
+                del self.by_symbol[trade['symbol']]
+
+class TradeLedger:
+    """
+    Single entry point for finished trades. record() writes the trade to the SQLite history
+    (database) and the daily CSV (trade_logger) and updates the rolling 1d/3d/7d aggregates in
+    place: trade count, wins, net PnL and fees overall and per symbol, plus each symbol's current
+    win/loss streak. Readers (optimizer, AI prompt, dashboard) get them from stats() without
+    touching the history. The windows are rebuilt from the database's ts index on first use.
+    """
+    def __init__(self, windows=None):
+        self.windows = dict(windows or WINDOWS)
+        self._max_window = max(self.windows.values())
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drops the in-memory aggregates; they are reloaded from the database on the next call."""
+        self._windows = {name: _Window(seconds) for name, seconds in self.windows.items()}
+        # symbol -> (won, timestamps of the current streak's trades)
+        self._streaks = {}
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            for trade in database.load_trades_since(time.time() - self._max_window):
+                self._add(trade)
+
+    def _add(self, trade):
+        for window in self._windows.values():
+            window.add(trade)
+        won = trade['net_pnl_krw'] > 0
+        streak = self._streaks.get(trade['symbol'])
+        if streak is None or streak[0] != won:
+            streak = self._streaks[trade['symbol']] = (won, [])
+        times = streak[1]
+        times.append(trade['timestamp'])
+        # Streak trades older than the longest window are never counted
+        stale = bisect.bisect_left(times, trade['timestamp'] - self._max_window)
+        if stale:
+            del times[:stale]
+
+    def record(self, symbol, buy_price, sell_price, amount, features=None):
+        """Records one finished trade everywhere it is kept. Returns the stored record (None if the DB write failed)."""
+        with self._lock:
+            self._ensure_loaded()
+            trade = database.record_trade(symbol, buy_price, sell_price, amount, features)
+            if trade is not None:
+                self._add(trade)
+        trade_logger.log_trade(symbol, buy_price, sell_price, amount)
+        return trade
+
+    def stats(self, window='1d', symbol=None):
+        """
+        Aggregates over `window` ('1d', '3d', '7d'), for every trade or one symbol:
+        {'trades', 'wins', 'win_rate', 'net_pnl', 'fees', 'net_pct', 'streak'}. `net_pct` is the sum of
+        the trades' net returns in %. `streak` is the symbol's current run inside the window, positive
+        for wins and negative for losses (0 without symbol).
+        """
+        now = time.time()
+        with self._lock:
+            self._ensure_loaded()
+            rolling = self._windows[window]
+            rolling.expire(now)
+            totals = rolling.total if symbol is None else rolling.by_symbol.get(symbol, _Totals())
+            streak = 0
+            if symbol is not None and symbol in self._streaks:
+                won, times = self._streaks[symbol]
+                count = len(times) - bisect.bisect_left(times, now - rolling.seconds)
+                streak = count if won else -count
+            return {
+                'trades': totals.trades,
+                'wins': totals.wins,
+                'win_rate': totals.wins / totals.trades if totals.trades else 0.0,
+                'net_pnl': totals.net_pnl,
+                'fees': totals.fees,
+                'net_pct': totals.net_pct,
+                'streak': streak,
+            }
+
+ledger = TradeLedger()
+
+def record_trade(symbol, buy_price, sell_price, amount, features=None):
+    return ledger.record(symbol, buy_price, sell_price, amount, features)
+
+def stats(window='1d', symbol=None):
+    return ledger.stats(window, symbol)
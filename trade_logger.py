@@ -6,6 +6,17 @@ from logger import logger
 # KST timezone (UTC+9)
 KST = timezone(timedelta(hours=9))
 TRADE_DIR = "trades"
+# 코인원 왕복 수수료 기준 (매수 0.2%, 매도 0.2%)를 최악방어로 계산
+ESTIMATED_FEE_RATE = 0.002
+
+def estimate_pnl(buy_price, sell_price, amount):
+    """(invested KRW, estimated fee KRW, net PNL KRW, net PNL %) of one round trip."""
+    buy_value = buy_price * amount
+    sell_value = sell_price * amount
+    estimated_fee = (buy_value + sell_value) * ESTIMATED_FEE_RATE
+    net_pnl = sell_value - buy_value - estimated_fee
+    net_pnl_pct = (net_pnl / buy_value) * 100 if buy_value > 0 else 0
+    return buy_value, estimated_fee, net_pnl, net_pnl_pct
 
 def get_today_csv_path():
     """Generates the file path for today's trade log."""
@@ -26,15 +37,7 @@ def log_trade(symbol, buy_price, sell_price, amount):
         csv_path = get_today_csv_path()
         init_trade_logger(csv_path)
         
-        # 코인원 왕복 수수료 기준 (매수 0.2%, 매도 0.2%)를 최악방어로 계산
-        buy_value = buy_price * amount
-        sell_value = sell_price * amount
-        
-        estimated_fee = (buy_value * 0.002) + (sell_value * 0.002)
-        gross_pnl = sell_value - buy_value
-        net_pnl = gross_pnl - estimated_fee
-        
-        net_pnl_pct = (net_pnl / buy_value) * 100 if buy_value > 0 else 0
+        buy_value, estimated_fee, net_pnl, net_pnl_pct = estimate_pnl(buy_price, sell_price, amount)
         
         time_str = datetime.now(KST).strftime("%H:%M:%S")
         